@@ -1,147 +1,52 @@
-import torch
-import torch.nn as nn
-from torchvision import models, transforms
-from transformers import DistilBertModel, DistilBertTokenizer
-from PIL import Image
-from typing import List, Optional
-import io
+"""
+Content Performance API.
+
+The model architecture lives in model.py and its load / warmup / readiness in
+lifecycle.py; torch and the encoder libraries are only imported when the
+checkpoint is loaded at startup, so importing this module is fast.
+"""
+
+from typing import Optional
+import asyncio
+import os
+
+from batcher import BatcherFull, MicroBatcher
+from lifecycle import ModelLifecycle, NotReady
 
 # --- Backend API Setup (FastAPI) ---
-# To run this: pip install fastapi uvicorn torch torchvision transformers pillow
-# uvicorn backend:app --reload
+# To run this: pip install fastapi uvicorn torch torchvision transformers pillow safetensors
+# python lifecycle.py export --out checkpoints/content_predictor   (once, downloads the encoders)
+# CONTENT_MODEL_PATH=checkpoints/content_predictor uvicorn backend:app --reload
 
 try:
     from fastapi import FastAPI, UploadFile, File, Form, HTTPException
     from fastapi.middleware.cors import CORSMiddleware
+    from fastapi.responses import JSONResponse
     from pydantic import BaseModel
 except ImportError:
-    print("FastAPI or Pydantic not installed. This script defines the model architecture.")
+    print("FastAPI or Pydantic not installed. See model.py for the model architecture.")
     FastAPI = None
     CORSMiddleware = None
 
-# --- Model Configuration ---
-CONFIG = {
-    "bert_model": "distilbert-base-uncased",
-    "image_model": "resnet50",
-    "hidden_size": 256,
-    "dropout": 0.3,
-    "num_outputs": 3  # Views, CTR, Engagement Score
+# --- Serving Configuration ---
+SERVING = {
+    # Checkpoint directory written by `python lifecycle.py export`; unset serves mock predictions
+    "model_path": os.environ.get("CONTENT_MODEL_PATH") or None,
+    # Dynamic batching for /predict: a forward pass runs once this many requests
+    # are queued, or when the oldest has waited max_wait_ms
+    "max_batch": int(os.environ.get("PREDICT_MAX_BATCH", 16)),
+    "max_wait_ms": float(os.environ.get("PREDICT_MAX_WAIT_MS", 10)),
+    "max_queue": int(os.environ.get("PREDICT_MAX_QUEUE", 1024)),
 }
 
-# --- Multi-Modal Neural Network Architecture ---
-
-class TextEncoder(nn.Module):
-    """
-    Encodes the Title and Description using DistilBERT.
-    Freezes early layers to speed up training if needed.
-    """
-    def __init__(self, model_name=CONFIG["bert_model"]):
-        super(TextEncoder, self).__init__()
-        self.bert = DistilBertModel.from_pretrained(model_name)
-        
-    def forward(self, input_ids, attention_mask):
-        output = self.bert(input_ids=input_ids, attention_mask=attention_mask)
-        # Use the [CLS] token embedding (first token) as the sentence representation
-        return output.last_hidden_state[:, 0, :]
-
-class ImageEncoder(nn.Module):
-    """
-    Encodes the Thumbnail using a pre-trained ResNet.
-    Removes the final classification layer to get feature vectors.
-    """
-    def __init__(self, model_name=CONFIG["image_model"]):
-        super(ImageEncoder, self).__init__()
-        # Load pretrained ResNet
-        resnet = models.resnet50(pretrained=True)
-        # Remove the final fully connected layer
-        modules = list(resnet.children())[:-1]
-        self.resnet = nn.Sequential(*modules)
-        self.output_dim = 2048 # ResNet50 output size
-
-    def forward(self, images):
-        features = self.resnet(images)
-        # Flatten: (Batch, 2048, 1, 1) -> (Batch, 2048)
-        return features.view(features.size(0), -1)
-
-class ContentPredictor(nn.Module):
-    """
-    Fusion Network: Combines Text and Image features to predict performance.
-    """
-    def __init__(self):
-        super(ContentPredictor, self).__init__()
-        self.text_encoder = TextEncoder()
-        self.image_encoder = ImageEncoder()
-        
-        # Dimensions
-        text_dim = 768  # DistilBERT output
-        image_dim = 2048 # ResNet50 output
-        
-        # Fusion Layer (Concatenation + MLP)
-        self.fusion = nn.Sequential(
-            nn.Linear(text_dim + image_dim, 1024),
-            nn.BatchNorm1d(1024),
-            nn.ReLU(),
-            nn.Dropout(CONFIG["dropout"]),
-            nn.Linear(1024, CONFIG["hidden_size"]),
-            nn.ReLU()
-        )
-        
-        # Regression Heads for different metrics
-        self.views_head = nn.Linear(CONFIG["hidden_size"], 1)
-        self.ctr_head = nn.Linear(CONFIG["hidden_size"], 1)
-        self.score_head = nn.Linear(CONFIG["hidden_size"], 1)
-
-    def forward(self, input_ids, attention_mask, images):
-        # 1. Get Text Embeddings
-        text_features = self.text_encoder(input_ids, attention_mask)
-        
-        # 2. Get Image Embeddings
-        image_features = self.image_encoder(images)
-        
-        # 3. Fuse
-        combined = torch.cat((text_features, image_features), dim=1)
-        fused = self.fusion(combined)
-        
-        # 4. Predict
-        views = self.views_head(fused)
-        ctr = torch.sigmoid(self.ctr_head(fused)) * 100 # Scale to 0-100%
-        score = torch.sigmoid(self.score_head(fused)) * 100 # Scale 0-100
-        
-        return views, ctr, score
-
-# --- Inference Utilities ---
-
-def transform_image(image_bytes):
-    """Preprocess image for ResNet"""
-    my_transforms = transforms.Compose([
-        transforms.Resize(256),
-        transforms.CenterCrop(224),
-        transforms.ToTensor(),
-        transforms.Normalize(mean=[0.485, 0.456, 0.406], 
-                             std=[0.229, 0.224, 0.225])
-    ])
-    image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-    return my_transforms(image).unsqueeze(0) # Add batch dim
-
-def transform_text(text, tokenizer, max_len=128):
-    """Preprocess text for BERT"""
-    encoding = tokenizer(
-        text,
-        add_special_tokens=True,
-        max_length=max_len,
-        return_token_type_ids=False,
-        padding='max_length',
-        truncation=True,
-        return_attention_mask=True,
-        return_tensors='pt',
-    )
-    return encoding['input_ids'], encoding['attention_mask']
+# Loaded once at startup, warmed up with a single sample and a full batch
+lifecycle = ModelLifecycle(SERVING["model_path"], warmup_batches=(1, SERVING["max_batch"]))
 
 # --- API Implementation ---
 
 if FastAPI:
     app = FastAPI(title="Content Performance API")
-    
+
     # CORS middleware to allow frontend to call the API
     app.add_middleware(
         CORSMiddleware,
@@ -150,12 +55,37 @@ if FastAPI:
         allow_methods=["*"],
         allow_headers=["*"],
     )
-    
-    # Initialize model (In production, load weights here)
-    # device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-    # model = ContentPredictor().to(device)
-    # model.eval()
-    # tokenizer = DistilBertTokenizer.from_pretrained(CONFIG["bert_model"])
+
+    # Concurrent /predict calls share forward passes
+    batcher = MicroBatcher(
+        lifecycle.predict_batch,
+        max_batch=SERVING["max_batch"],
+        max_wait=SERVING["max_wait_ms"] / 1000,
+        max_queue=SERVING["max_queue"],
+    )
+    _loading: Optional[asyncio.Task] = None
+
+    @app.on_event("startup")
+    async def start_model():
+        """Load and warm up the model in the background; /health reports when it is ready"""
+        global _loading
+        batcher.start()
+        _loading = asyncio.get_running_loop().create_task(asyncio.to_thread(lifecycle.start))
+
+    @app.on_event("shutdown")
+    async def stop_batcher():
+        """Answer everything already queued before exiting"""
+        await batcher.stop()
+
+    @app.get("/health")
+    async def health():
+        """Readiness: 200 once the model is loaded and warmed up (or mocked), 503 while loading or after a failure"""
+        return JSONResponse(lifecycle.status(), status_code=200 if lifecycle.ready else 503)
+
+    @app.get("/metrics")
+    async def metrics():
+        """Batching metrics: queue depth, batch sizes, queueing delay and forward pass time"""
+        return {"batcher": batcher.stats(), "model": lifecycle.status()}
 
     @app.post("/predict")
     async def predict(
@@ -167,41 +97,35 @@ if FastAPI:
         """
         Endpoint to predict video performance based on multimodal input.
         """
+        if not lifecycle.ready:
+            raise HTTPException(status_code=503, detail=f"Model is {lifecycle.state}")
         try:
-            # 1. Process Image
+            # 1. Read Image
             image_data = await thumbnail.read()
-            # image_tensor = transform_image(image_data).to(device)
-            
-            # 2. Process Text (Combine title + desc + category)
+
+            # 2. Combine Text (title + desc + category)
             full_text = f"{category} : {title} . {description}"
-            # input_ids, attention_mask = transform_text(full_text, tokenizer)
-            # input_ids = input_ids.to(device)
-            # attention_mask = attention_mask.to(device)
-            
-            # 3. Inference
-            # with torch.no_grad():
-            #     views, ctr, score = model(input_ids, attention_mask, image_tensor)
-            
-            # MOCK RESPONSE (Since we don't have trained weights loaded)
-            import random
+
+            # 3. Inference, batched with concurrent requests (preprocessing runs in the batch too)
+            prediction = await batcher.submit((image_data, full_text))
             return {
-                "predicted_views": int(random.uniform(5000, 50000)),
-                "predicted_ctr": round(random.uniform(2.5, 12.0), 2),
-                "engagement_score": int(random.uniform(40, 95)),
+                **prediction,
                 "status": "success",
                 "meta": {
                     "text_length": len(full_text),
                     "image_size": len(image_data)
                 }
             }
-            
+
+        except (BatcherFull, NotReady) as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        except ValueError as e:
+            # This request's input was rejected (e.g. an unreadable thumbnail)
+            raise HTTPException(status_code=400, detail=str(e))
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
 
 if __name__ == "__main__":
-    # Example usage of the architecture
-    print("Initializing Multi-Modal Architecture...")
-    model = ContentPredictor()
-    print("Model Architecture Created Successfully.")
-    print(model)
-    print("\nReady for training or inference.")
\ No newline at end of file
+    # Loads the configured checkpoint offline and warms it up (see also `python lifecycle.py check`)
+    lifecycle.start()
+    print(lifecycle.status())
@@ -0,0 +1,166 @@
+"""
+Dynamic micro-batching for the Content Performance API.
+
+ContentPredictor scores a whole batch of thumbnails and texts in one forward
+pass, which on CPU costs far less than the same samples one at a time.
+MicroBatcher sits between the request handlers and the model:
+- each request awaits `submit(sample)`
+- one worker task collects queued samples until `max_batch` are waiting or
+  the oldest has waited `max_wait` seconds, runs `run_batch(samples)` once
+  off the event loop, and hands every caller its own result
+- samples that arrive during a forward pass form the next batch, so batches
+  grow with load and stay small (low latency) when traffic is light
+
+Only the standard library is needed, so the scheduler can be used and
+tested without torch.
+"""
+
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+import asyncio
+import time
+
+
+class BatcherFull(Exception):
+    """Too many samples queued; the caller should shed load"""
+
+
+class MicroBatcher:
+    """
+    Collects concurrent `submit` calls into batches for `run_batch`.
+
+    `run_batch(samples)` must return one result per sample, in order. A
+    result that is an exception is raised to that sample's caller only (e.g.
+    one unreadable input); if `run_batch` itself raises, every caller in the
+    batch gets the exception.
+    """
+
+    def __init__(self, run_batch: Callable[[List[Any]], List[Any]], max_batch: int = 16,
+                 max_wait: float = 0.01, max_queue: int = 1024):
+        self.run_batch = run_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+
+        # Metrics
+        self.batches = 0
+        self.samples = 0
+        self.rejected = 0
+        self.cancelled = 0
+        self.failed_batches = 0
+        self.max_queue_depth = 0
+        self.batch_sizes: Dict[int, int] = {}
+        self.wait_seconds = 0.0
+        self.run_seconds = 0.0
+
+        self._pending: Deque[Tuple[Any, asyncio.Future, float]] = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._busy = False
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._pending)
+
+    async def submit(self, sample: Any) -> Any:
+        """Queue one sample and wait for its result"""
+        if len(self._pending) >= self.max_queue:
+            self.rejected += 1
+            raise BatcherFull(f"{len(self._pending)} samples queued")
+        self.start()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((sample, future, loop.time()))
+        self.max_queue_depth = max(self.max_queue_depth, len(self._pending))
+        self._wakeup.set()
+        return await future
+
+    async def _collect(self) -> List[Tuple[Any, asyncio.Future, float]]:
+        """Wait for the next batch: `max_batch` samples, or whatever is queued when the oldest times out"""
+        loop = asyncio.get_running_loop()
+        while not self._pending:
+            self._wakeup.clear()
+            await self._wakeup.wait()
+        deadline = self._pending[0][2] + self.max_wait
+        while len(self._pending) < self.max_batch:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), remaining)
+            except asyncio.TimeoutError:
+                break
+        batch = [self._pending.popleft() for _ in range(min(self.max_batch, len(self._pending)))]
+        # Callers that went away (client disconnected, request timed out) are not computed
+        live = [entry for entry in batch if not entry[1].done()]
+        self.cancelled += len(batch) - len(live)
+        return live
+
+    async def _run_one(self, batch: List[Tuple[Any, asyncio.Future, float]]) -> None:
+        self._busy = True
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        self.wait_seconds += sum(started - enqueued for _, _, enqueued in batch)
+        clock = time.perf_counter()
+        try:
+            results = await asyncio.to_thread(self.run_batch, [sample for sample, _, _ in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(f"run_batch returned {len(results)} results for {len(batch)} samples")
+        except Exception as e:
+            self.failed_batches += 1
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for (_, future, _), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, BaseException):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+        finally:
+            self._busy = False
+            self.run_seconds += time.perf_counter() - clock
+            self.batches += 1
+            self.samples += len(batch)
+            self.batch_sizes[len(batch)] = self.batch_sizes.get(len(batch), 0) + 1
+
+    async def run(self) -> None:
+        while True:
+            batch = await self._collect()
+            if batch:
+                await self._run_one(batch)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self) -> None:
+        """Finish what is queued, then stop the worker"""
+        if self._task is None:
+            return
+        # Cancelling mid-batch would strand its callers, so wait until the worker is idle
+        while self._pending or self._busy:
+            await asyncio.sleep(max(self.max_wait, 0.001))
+        self._task.cancel()
+        self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": len(self._pending),
+            "max_queue_depth": self.max_queue_depth,
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000,
+            "batches": self.batches,
+            "samples": self.samples,
+            "mean_batch_size": self.samples / self.batches if self.batches else 0.0,
+            "batch_sizes": dict(sorted(self.batch_sizes.items())),
+            "mean_wait_ms": 1000 * self.wait_seconds / self.samples if self.samples else 0.0,
+            "mean_batch_ms": 1000 * self.run_seconds / self.batches if self.batches else 0.0,
+            "rejected": self.rejected,
+            "cancelled": self.cancelled,
+            "failed_batches": self.failed_batches,
+        }
@@ -0,0 +1,88 @@
+"""
+Batched vs unbatched /predict serving.
+
+Drives `predict_batch` through a MicroBatcher with N concurrent clients for
+each --max-batch value and reports latency percentiles and throughput.
+--max-batch 1 is unbatched serving (one forward pass per request, still
+off the event loop), the baseline the others are compared against.
+
+The model is loaded and warmed up from a checkpoint like the API does (see
+lifecycle.py).
+
+Usage:
+    python benchmark.py checkpoints/content_predictor --clients 32 --requests 256 --max-batch 1 8 16 32
+"""
+
+import argparse
+import asyncio
+import io
+import time
+
+import numpy as np
+
+from batcher import MicroBatcher
+from lifecycle import ModelLifecycle
+
+
+def make_samples(count: int, seed: int = 0):
+    """(JPEG thumbnail bytes, text) pairs of realistic size"""
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    words = ["how", "to", "build", "the", "best", "budget", "gaming", "pc", "in", "2024", "review",
+             "tutorial", "vlog", "travel", "tokyo", "recipe", "easy", "pasta", "top", "10"]
+    samples = []
+    for i in range(count):
+        pixels = rng.integers(0, 256, (360, 640, 3), dtype=np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(pixels).save(buffer, format="JPEG")
+        text = " ".join(rng.choice(words, int(rng.integers(8, 60))))
+        samples.append((buffer.getvalue(), f"Tech : {text}"))
+    return samples
+
+
+async def drive(batcher: MicroBatcher, samples, requests: int, clients: int):
+    latencies = []
+    next_request = iter(range(requests))
+
+    async def client():
+        for i in next_request:
+            started = time.perf_counter()
+            await batcher.submit(samples[i % len(samples)])
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[client() for _ in range(clients)])
+    elapsed = time.perf_counter() - started
+    await batcher.stop()
+    return latencies, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark batched /predict inference")
+    parser.add_argument("checkpoint", help="Checkpoint directory written by `python lifecycle.py export`")
+    parser.add_argument("--clients", type=int, default=32, help="Concurrent requests in flight")
+    parser.add_argument("--requests", type=int, default=256, help="Requests per configuration")
+    parser.add_argument("--max-batch", type=int, nargs="+", default=[1, 8, 16, 32])
+    parser.add_argument("--max-wait-ms", type=float, default=10.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print("Loading model...")
+    lifecycle = ModelLifecycle(args.checkpoint, warmup_batches=(1, max(args.max_batch)))
+    lifecycle.start()
+    if not lifecycle.ready:
+        raise SystemExit(f"Model failed to load: {lifecycle.error}")
+    samples = make_samples(64, args.seed)
+
+    print(f"{'max_batch':>9} {'mean batch':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>8}")
+    for max_batch in args.max_batch:
+        batcher = MicroBatcher(lifecycle.predict_batch, max_batch=max_batch, max_wait=args.max_wait_ms / 1000)
+        latencies, elapsed = asyncio.run(drive(batcher, samples, args.requests, args.clients))
+        p50, p95, p99 = np.percentile(np.asarray(latencies) * 1000, [50, 95, 99])
+        print(f"{max_batch:>9} {batcher.stats()['mean_batch_size']:>10.1f} {p50:>9.1f} {p95:>9.1f} {p99:>9.1f} "
+              f"{len(latencies) / elapsed:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Multi-modal architecture and preprocessing for the Content Performance Predictor.
+
+Only torch is imported with this module. transformers, torchvision and PIL are
+imported when an encoder is built or an input is preprocessed, so code that
+just needs CONFIG or the class definitions loads quickly.
+
+Encoders are built from their architecture alone by default (no weights are
+downloaded); trained weights come from a checkpoint (see lifecycle.py).
+`pretrained=True` starts from the published DistilBERT / ResNet50 weights
+instead and needs network access, which only exporting or training should.
+"""
+
+import io
+
+import torch
+import torch.nn as nn
+
+# --- Model Configuration ---
+CONFIG = {
+    "bert_model": "distilbert-base-uncased",
+    "image_model": "resnet50",
+    "hidden_size": 256,
+    "dropout": 0.3,
+    "num_outputs": 3,  # Views, CTR, Engagement Score
+    "max_len": 128,
+}
+
+# --- Multi-Modal Neural Network Architecture ---
+
+class TextEncoder(nn.Module):
+    """
+    Encodes the Title and Description using DistilBERT.
+    `config` is a DistilBertConfig (distilbert-base-uncased's when omitted).
+    """
+    def __init__(self, model_name=CONFIG["bert_model"], pretrained=False, config=None):
+        super(TextEncoder, self).__init__()
+        from transformers import DistilBertConfig, DistilBertModel
+
+        if pretrained:
+            self.bert = DistilBertModel.from_pretrained(model_name)
+        else:
+            self.bert = DistilBertModel(config or DistilBertConfig())
+
+    def forward(self, input_ids, attention_mask):
+        output = self.bert(input_ids=input_ids, attention_mask=attention_mask)
+        # Use the [CLS] token embedding (first token) as the sentence representation
+        return output.last_hidden_state[:, 0, :]
+
+class ImageEncoder(nn.Module):
+    """
+    Encodes the Thumbnail using a ResNet.
+    Removes the final classification layer to get feature vectors.
+    """
+    def __init__(self, model_name=CONFIG["image_model"], pretrained=False):
+        super(ImageEncoder, self).__init__()
+        from torchvision import models
+
+        # IMAGENET1K_V1 is what the original `resnet50(pretrained=True)` loaded
+        resnet = models.resnet50(weights=models.ResNet50_Weights.IMAGENET1K_V1 if pretrained else None)
+        # Remove the final fully connected layer
+        modules = list(resnet.children())[:-1]
+        self.resnet = nn.Sequential(*modules)
+        self.output_dim = 2048 # ResNet50 output size
+
+    def forward(self, images):
+        features = self.resnet(images)
+        # Flatten: (Batch, 2048, 1, 1) -> (Batch, 2048)
+        return features.view(features.size(0), -1)
+
+class ContentPredictor(nn.Module):
+    """
+    Fusion Network: Combines Text and Image features to predict performance.
+    """
+    def __init__(self, pretrained=False, text_config=None):
+        super(ContentPredictor, self).__init__()
+        self.text_encoder = TextEncoder(pretrained=pretrained, config=text_config)
+        self.image_encoder = ImageEncoder(pretrained=pretrained)
+
+        # Dimensions
+        text_dim = 768  # DistilBERT output
+        image_dim = 2048 # ResNet50 output
+
+        # Fusion Layer (Concatenation + MLP)
+        self.fusion = nn.Sequential(
+            nn.Linear(text_dim + image_dim, 1024),
+            nn.BatchNorm1d(1024),
+            nn.ReLU(),
+            nn.Dropout(CONFIG["dropout"]),
+            nn.Linear(1024, CONFIG["hidden_size"]),
+            nn.ReLU()
+        )
+
+        # Regression Heads for different metrics
+        self.views_head = nn.Linear(CONFIG["hidden_size"], 1)
+        self.ctr_head = nn.Linear(CONFIG["hidden_size"], 1)
+        self.score_head = nn.Linear(CONFIG["hidden_size"], 1)
+
+    def forward(self, input_ids, attention_mask, images):
+        # 1. Get Text Embeddings
+        text_features = self.text_encoder(input_ids, attention_mask)
+
+        # 2. Get Image Embeddings
+        image_features = self.image_encoder(images)
+
+        # 3. Fuse
+        combined = torch.cat((text_features, image_features), dim=1)
+        fused = self.fusion(combined)
+
+        # 4. Predict
+        views = self.views_head(fused)
+        ctr = torch.sigmoid(self.ctr_head(fused)) * 100 # Scale to 0-100%
+        score = torch.sigmoid(self.score_head(fused)) * 100 # Scale 0-100
+
+        return views, ctr, score
+
+# --- Inference Utilities ---
+
+_image_transform = None
+
+def transform_image(image_bytes):
+    """Preprocess image for ResNet"""
+    global _image_transform
+    from PIL import Image
+    from torchvision import transforms
+
+    if _image_transform is None:
+        _image_transform = transforms.Compose([
+            transforms.Resize(256),
+            transforms.CenterCrop(224),
+            transforms.ToTensor(),
+            transforms.Normalize(mean=[0.485, 0.456, 0.406],
+                                 std=[0.229, 0.224, 0.225])
+        ])
+    image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+    return _image_transform(image).unsqueeze(0) # Add batch dim
+
+def transform_text(text, tokenizer, max_len=CONFIG["max_len"]):
+    """Preprocess text (one string or a list) for BERT"""
+    encoding = tokenizer(
+        text,
+        add_special_tokens=True,
+        max_length=max_len,
+        return_token_type_ids=False,
+        padding='max_length',
+        truncation=True,
+        return_attention_mask=True,
+        return_tensors='pt',
+    )
+    return encoding['input_ids'], encoding['attention_mask']
+
+if __name__ == "__main__":
+    # Example usage of the architecture
+    print("Initializing Multi-Modal Architecture...")
+    model = ContentPredictor()
+    print("Model Architecture Created Successfully.")
+    print(model)
+    print("\nReady for training or inference.")
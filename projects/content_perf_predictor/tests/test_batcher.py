@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+
+from batcher import BatcherFull, MicroBatcher
+
+
+class Unreadable(ValueError):
+    pass
+
+
+def score(samples):
+    """Batch function: doubles each sample, with an exception result for negative ones"""
+    return [Unreadable(f"sample {s}") if s < 0 else s * 2 for s in samples]
+
+
+async def gather(batcher, samples):
+    results = await asyncio.gather(*(batcher.submit(s) for s in samples), return_exceptions=True)
+    await batcher.stop()
+    return results
+
+
+def test_concurrent_samples_share_one_batch():
+    batcher = MicroBatcher(score, max_batch=8, max_wait=0.05)
+    assert asyncio.run(gather(batcher, [1, 2, 3])) == [2, 4, 6]
+    assert batcher.stats()["batch_sizes"] == {3: 1}
+
+
+def test_max_batch_splits_the_queue():
+    batcher = MicroBatcher(score, max_batch=2, max_wait=0.05)
+    assert asyncio.run(gather(batcher, [1, 2, 3, 4, 5])) == [2, 4, 6, 8, 10]
+    assert batcher.stats()["batch_sizes"] == {1: 1, 2: 2}
+
+
+def test_sample_error_reaches_only_its_caller():
+    batcher = MicroBatcher(score, max_batch=8, max_wait=0.05)
+    results = asyncio.run(gather(batcher, [1, -1, 3]))
+    assert results[0] == 2 and results[2] == 6
+    assert isinstance(results[1], Unreadable)
+    assert batcher.stats()["failed_batches"] == 0
+
+
+def test_batch_error_reaches_every_caller():
+    def broken(samples):
+        raise RuntimeError("model crashed")
+
+    batcher = MicroBatcher(broken, max_batch=8, max_wait=0.05)
+    results = asyncio.run(gather(batcher, [1, 2]))
+    assert [str(r) for r in results] == ["model crashed", "model crashed"]
+    assert batcher.stats()["failed_batches"] == 1
+
+
+def test_wrong_result_count_fails_the_batch():
+    batcher = MicroBatcher(lambda samples: samples[:-1], max_batch=8, max_wait=0.05)
+    results = asyncio.run(gather(batcher, [1, 2]))
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+def test_full_queue_rejects_new_samples():
+    async def main():
+        batcher = MicroBatcher(score, max_batch=8, max_wait=0.05, max_queue=2)
+        waiting = [asyncio.ensure_future(batcher.submit(s)) for s in (1, 2)]
+        await asyncio.sleep(0)
+        with pytest.raises(BatcherFull):
+            await batcher.submit(3)
+        assert await asyncio.gather(*waiting) == [2, 4]
+        await batcher.stop()
+        return batcher.stats()["rejected"]
+
+    assert asyncio.run(main()) == 1
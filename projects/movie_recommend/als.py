@@ -0,0 +1,266 @@
+"""
+Implicit-feedback ALS trainer for the Movie Recommendation Engine
+
+Learns user and movie factor matrices from watch / rating data (Hu, Koren &
+Volinsky, "Collaborative Filtering for Implicit Feedback Datasets") and writes
+them as versioned .npy sets that the API hot-swaps at runtime.
+
+Usage:
+    python als.py --out models/als --factors 32 --iterations 15 --workers 4
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import argparse
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+from ann import IVFIndex
+
+CURRENT_FILE = "CURRENT"
+
+# ============== Interaction Matrix ==============
+
+class Interactions:
+    """
+    User-item interactions in CSR form, plus the transposed (item-major) CSR
+    needed for the item half-step.
+    """
+
+    def __init__(self, rows: Dict[int, Dict[int, float]]):
+        self.user_ids = np.array(sorted(rows), dtype=np.int64)
+        self.item_ids = np.array(sorted({item for row in rows.values() for item in row}), dtype=np.int64)
+
+        indptr, indices, data = [0], [], []
+        for user_id in self.user_ids.tolist():
+            row = sorted(rows[user_id].items())
+            indices.extend(item for item, _ in row)
+            data.extend(value for _, value in row)
+            indptr.append(len(indices))
+        self.indptr = np.array(indptr, dtype=np.int64)
+        self.indices = np.searchsorted(self.item_ids, np.array(indices, dtype=np.int64))
+        self.data = np.array(data, dtype=np.float64)
+
+        # Transpose: item -> users
+        user_of_entry = np.repeat(np.arange(len(self.user_ids)), np.diff(self.indptr))
+        order = np.argsort(self.indices, kind="stable")
+        self.t_indptr = np.searchsorted(self.indices[order], np.arange(len(self.item_ids) + 1))
+        self.t_indices = user_of_entry[order]
+        self.t_data = self.data[order]
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return len(self.user_ids), len(self.item_ids)
+
+# ============== ALS Trainer ==============
+
+class ImplicitALS:
+    """
+    Alternating least squares with confidence weighting c = 1 + alpha * r.
+
+    Each half-step solves one regularised least-squares system per row. Rows
+    are split into blocks that a thread pool solves with batched
+    `np.linalg.solve`; NumPy releases the GIL inside BLAS/LAPACK, so blocks run
+    on all cores.
+    """
+
+    def __init__(
+        self,
+        factors: int = 32,
+        regularization: float = 0.05,
+        alpha: float = 4.0,
+        iterations: int = 15,
+        workers: int = None,
+        block_size: int = 512,
+        seed: int = 42
+    ):
+        self.factors = factors
+        self.regularization = regularization
+        self.alpha = alpha
+        self.iterations = iterations
+        self.workers = workers or os.cpu_count() or 1
+        self.block_size = block_size
+        self.seed = seed
+        self.user_factors: Optional[np.ndarray] = None
+        self.item_factors: Optional[np.ndarray] = None
+
+    def fit(self, interactions: Interactions) -> "ImplicitALS":
+        n_users, n_items = interactions.shape
+        rng = np.random.default_rng(self.seed)
+        self.user_factors = rng.normal(0, 0.01, (n_users, self.factors))
+        self.item_factors = rng.normal(0, 0.01, (n_items, self.factors))
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for _ in range(self.iterations):
+                self._half_step(pool, self.user_factors, self.item_factors,
+                                interactions.indptr, interactions.indices, interactions.data)
+                self._half_step(pool, self.item_factors, self.user_factors,
+                                interactions.t_indptr, interactions.t_indices, interactions.t_data)
+        return self
+
+    def _half_step(self, pool, target, fixed, indptr, indices, data) -> None:
+        """Solve every row of `target` against the `fixed` factors"""
+        gram = fixed.T @ fixed
+        blocks = range(0, len(target), self.block_size)
+        list(pool.map(lambda start: self._solve_block(
+            start, min(start + self.block_size, len(target)), target, fixed, gram, indptr, indices, data
+        ), blocks))
+
+    def _solve_block(self, start, stop, target, fixed, gram, indptr, indices, data) -> None:
+        eye = self.regularization * np.eye(self.factors)
+        lhs = np.empty((stop - start, self.factors, self.factors))
+        rhs = np.zeros((stop - start, self.factors))
+        for row in range(start, stop):
+            lo, hi = indptr[row], indptr[row + 1]
+            other = fixed[indices[lo:hi]]
+            confidence = 1.0 + self.alpha * data[lo:hi]
+            # (Y^T Y + Y^T (C - I) Y + reg I) x = Y^T C p, with p = 1 for observed items
+            lhs[row - start] = gram + (other.T * (confidence - 1.0)) @ other + eye
+            rhs[row - start] = other.T @ confidence
+        target[start:stop] = np.linalg.solve(lhs, rhs[..., None])[..., 0]
+
+# ============== Versioned Storage ==============
+
+def save_factors(
+    root: str,
+    user_ids: np.ndarray,
+    item_ids: np.ndarray,
+    user_factors: np.ndarray,
+    item_factors: np.ndarray,
+    meta: Dict = None,
+    ann_index: IVFIndex = None
+) -> str:
+    """
+    Write a new factor version under `root` and point CURRENT at it.
+
+    The version directory is fully written before it is renamed into place,
+    and CURRENT is replaced atomically, so readers never see a partial set.
+    An ANN index over the item factors, if given, is saved inside the version
+    so servers can memory-map it instead of rebuilding.
+    """
+    os.makedirs(root, exist_ok=True)
+    version = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    staging = os.path.join(root, f".{version}.tmp")
+    os.makedirs(staging)
+
+    np.save(os.path.join(staging, "user_ids.npy"), user_ids.astype(np.int64))
+    np.save(os.path.join(staging, "item_ids.npy"), item_ids.astype(np.int64))
+    np.save(os.path.join(staging, "user_factors.npy"), user_factors.astype(np.float32))
+    np.save(os.path.join(staging, "item_factors.npy"), item_factors.astype(np.float32))
+    with open(os.path.join(staging, "meta.json"), "w") as f:
+        json.dump({"version": version, **(meta or {})}, f, indent=2)
+    if ann_index is not None:
+        ann_index.save(os.path.join(staging, "ann"))
+
+    os.rename(staging, os.path.join(root, version))
+    pointer = os.path.join(root, f".{CURRENT_FILE}.tmp")
+    with open(pointer, "w") as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(pointer, os.path.join(root, CURRENT_FILE))
+    return version
+
+def current_version(root: str) -> Optional[str]:
+    """Version name CURRENT points at, or None when nothing was trained yet"""
+    try:
+        with open(os.path.join(root, CURRENT_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def load_factors(root: str, version: str = None) -> Optional[Dict[str, np.ndarray]]:
+    """Memory-map one factor version (CURRENT by default)"""
+    version = version or current_version(root)
+    if not version:
+        return None
+    path = os.path.join(root, version)
+    arrays = {
+        name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+        for name in ("user_ids", "item_ids", "user_factors", "item_factors")
+    }
+    with open(os.path.join(path, "meta.json")) as f:
+        arrays["meta"] = json.load(f)
+    arrays["path"] = path
+    return arrays
+
+def prune_versions(root: str, keep: int = 3) -> List[str]:
+    """Delete all but the newest `keep` versions (never the current one)"""
+    current = current_version(root)
+    versions = sorted(
+        name for name in os.listdir(root)
+        if not name.startswith(".") and os.path.isdir(os.path.join(root, name))
+    )
+    removed = [v for v in versions[:-keep] if v != current] if keep else []
+    for version in removed:
+        shutil.rmtree(os.path.join(root, version), ignore_errors=True)
+    return removed
+
+# ============== CLI ==============
+
+def train_from_profiles(profiles, **params) -> Tuple[Interactions, ImplicitALS]:
+    """Fit ALS on the backend's user profiles (ratings scaled to 0-1)"""
+    from backend import ItemSimilarityModel
+
+    rows = {
+        user_id: {item: value / 10.0 for item, value in ItemSimilarityModel.profile_ratings(profile).items()}
+        for user_id, profile in profiles.items()
+    }
+    interactions = Interactions({user_id: row for user_id, row in rows.items() if row})
+    return interactions, ImplicitALS(**params).fit(interactions)
+
+def main():
+    parser = argparse.ArgumentParser(description="Train implicit ALS factors for the recommender")
+    parser.add_argument("--out", default=os.environ.get("MOVIE_MODEL_DIR", "models/als"))
+    parser.add_argument("--factors", type=int, default=32)
+    parser.add_argument("--iterations", type=int, default=15)
+    parser.add_argument("--regularization", type=float, default=0.05)
+    parser.add_argument("--alpha", type=float, default=4.0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--keep", type=int, default=3, help="Number of versions to keep on disk")
+    parser.add_argument("--ann-min-items", type=int, default=5000,
+                        help="Build an IVF index over item factors once the catalog has this many items")
+    parser.add_argument("--ann-lists", type=int, default=None)
+    args = parser.parse_args()
+
+    # Read profiles and the feedback log without taking them over from a running server
+    os.environ.setdefault("MOVIE_FEEDBACK_READONLY", "1")
+    import backend
+
+    started = time.time()
+    interactions, model = train_from_profiles(
+        backend.USER_PROFILES,
+        factors=args.factors,
+        iterations=args.iterations,
+        regularization=args.regularization,
+        alpha=args.alpha,
+        workers=args.workers
+    )
+    ann_index = None
+    if interactions.shape[1] >= args.ann_min_items:
+        ann_index = IVFIndex.build(interactions.item_ids, model.item_factors, n_lists=args.ann_lists)
+    version = save_factors(
+        args.out, interactions.user_ids, interactions.item_ids,
+        model.user_factors, model.item_factors,
+        meta={
+            "factors": args.factors,
+            "iterations": args.iterations,
+            "regularization": args.regularization,
+            "alpha": args.alpha,
+            "users": int(interactions.shape[0]),
+            "items": int(interactions.shape[1]),
+            "nnz": int(len(interactions.data)),
+            "train_seconds": round(time.time() - started, 3),
+        },
+        ann_index=ann_index
+    )
+    prune_versions(args.out, args.keep)
+    print(f"Trained {interactions.shape[0]} users x {interactions.shape[1]} items -> {args.out}/{version}")
+
+if __name__ == "__main__":
+    main()
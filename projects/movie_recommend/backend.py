@@ -1,16 +1,46 @@
 """
 Movie Recommendation Engine - FastAPI Backend
 Production-grade recommendation system with multiple algorithms
+
+To run this: pip install fastapi uvicorn numpy
+uvicorn backend:app --port 8001
+Several workers sharing one copy of the model state: python serve.py --workers 4
 """
 
 from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Optional, Dict
+from pydantic import BaseModel, Field
+from typing import Callable, List, Optional, Dict, Iterable, Iterator, Mapping
+import asyncio
+import hashlib
+import heapq
+import json
+import os
 import random
+import threading
+import time
+import numpy as np
+from collections import OrderedDict, deque
 from datetime import datetime
 from enum import Enum
 
+from als import current_version, load_factors
+from ann import IVFIndex
+from bitset import RowBitset
+import payloads
+from cache import ResponseCache, create_cache
+from columnar import MovieTable
+from executor import BoundedExecutor, DeadlineExceeded, Overloaded, SharedExclusiveLock
+from feedback_log import FeedbackLog, FeedbackPipeline, LogRecord, LogTail
+import metrics
+from precompute import RecommendationTable
+from profile_store import CompactProfile, ProfileStore
+from search_index import SearchIndex, Suggester
+import shared
+from shards import ShardError, ShardPool
+from trending import create_trending
+
 # ============== FastAPI App Setup ==============
 
 app = FastAPI(
@@ -27,6 +57,41 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# ============== Process Role ==============
+
+# "standalone" (default) owns all state. serve.py runs one "owner" process that
+# does every write and N "worker" processes that serve requests from snapshots
+# in MOVIE_SHARED_DIR and forward feedback to the owner (see shared.py).
+ROLE = os.environ.get("MOVIE_ROLE", "standalone")
+SHARED_DIR = os.environ.get("MOVIE_SHARED_DIR")
+if ROLE == "worker" and not SHARED_DIR:
+    raise RuntimeError("MOVIE_ROLE=worker needs MOVIE_SHARED_DIR (start workers with serve.py)")
+
+# ============== Metrics ==============
+
+# Stage timers cost ~1.5us each (~15us per ensemble request); MOVIE_STAGE_TIMERS=0 removes them.
+# MOVIE_TRACE_SAMPLE_RATE (0-1) records a per-stage breakdown for that
+# fraction of requests (Server-Timing header, /metrics/traces).
+METRICS = metrics.Registry()
+REQUEST_SECONDS = METRICS.histogram(
+    "movie_request_duration_seconds", "HTTP request latency", ("method", "route", "status")
+)
+STAGES = metrics.StageTimers(
+    METRICS.histogram("movie_stage_duration_seconds", "Recommendation pipeline stage latency", ("stage",)),
+    enabled=os.environ.get("MOVIE_STAGE_TIMERS", "1") != "0"
+)
+CANDIDATES = METRICS.histogram(
+    "movie_candidates", "Candidates produced per ensemble request, by source", ("source",), metrics.SIZE_BUCKETS
+)
+TRACES: deque = deque(maxlen=int(os.environ.get("MOVIE_TRACE_KEEP", "256")))
+
+app.add_middleware(
+    metrics.MetricsMiddleware,
+    requests=REQUEST_SECONDS,
+    sample_rate=float(os.environ.get("MOVIE_TRACE_SAMPLE_RATE", "0")),
+    traces=TRACES
+)
+
 # ============== Data Models ==============
 
 class Genre(str, Enum):
@@ -69,6 +134,21 @@ class MovieRecommendation(BaseModel):
     algorithm: str
     diversity_tag: str  # "similar", "diverse", "trending", "new"
 
+class RecommendationQuery(BaseModel):
+    user_id: Optional[int] = None
+    mood: Optional[str] = None
+    genres: Optional[List[str]] = None
+    exclude_ids: Optional[List[int]] = None
+    limit: int = Field(20, ge=1, le=50)
+
+class BatchRecommendationRequest(BaseModel):
+    requests: List[RecommendationQuery]
+
+class BatchRecommendationResult(BaseModel):
+    index: int  # position in the request list
+    user_id: Optional[int]
+    recommendations: List[MovieRecommendation]
+
 class FeedbackRequest(BaseModel):
     user_id: int
     movie_id: int
@@ -76,6 +156,12 @@ class FeedbackRequest(BaseModel):
     rating: Optional[float] = None
     watch_time: Optional[int] = None
 
+class Suggestion(BaseModel):
+    text: str
+    kind: str  # "title", "person"
+    movie_ids: List[int]
+    popularity: float
+
 class UserProfile(BaseModel):
     user_id: int
     preferred_genres: List[str]
@@ -314,18 +400,617 @@ MOVIES_DB: List[Movie] = [
           runtime=114, popularity=97.0, release_date="2023-07-21"),
 ]
 
-# ============== User Profiles (Simulated) ==============
-
-USER_PROFILES: Dict[int, UserProfile] = {
-    1: UserProfile(user_id=1, preferred_genres=["Action", "Sci-Fi", "Thriller"],
-                   watch_history=[1, 2, 5, 7], ratings={1: 9.0, 2: 8.5, 5: 9.0, 7: 8.0}),
-    2: UserProfile(user_id=2, preferred_genres=["Romance", "Comedy", "Drama"],
-                   watch_history=[12, 13, 9, 22], ratings={12: 9.0, 13: 8.0, 9: 8.5, 22: 9.0}),
-    3: UserProfile(user_id=3, preferred_genres=["Horror", "Thriller"],
-                   watch_history=[18, 19, 15, 16], ratings={18: 8.0, 19: 7.5, 15: 8.5, 16: 9.0}),
-    4: UserProfile(user_id=4, preferred_genres=["Animation", "Adventure"],
-                   watch_history=[25, 26, 27, 28], ratings={25: 9.0, 26: 9.5, 27: 8.5, 28: 9.0}),
-}
+# ============== Movie Catalog ==============
+
+class CatalogColumns:
+    """
+    Column-oriented snapshot of the catalog used by the vectorized scorers.
+
+    Row i is the i-th movie in id order of a MovieTable (in memory or
+    memory-mapped). Genres are held per row as a bitmask code, deduplicated
+    into the distinct genre combinations so a request's genre overlap is one
+    small matrix-vector product. Rows of each combination are presorted by
+    their quality term, which lets top-k merge the best combinations instead of
+    touching every row. Movie models are only built for rows that are returned.
+
+    Derived arrays (INDEX_ARRAYS) come from the table's persisted indexes when
+    present, so opening a large catalog does not recompute them.
+    """
+
+    INDEX_ARRAYS = (
+        "content_quality", "popularity_score", "row_combo", "combo_codes", "combo_rows", "combo_offsets",
+        "popularity_rows", "year_rows", "year_sorted", "rating_rows", "rating_sorted",
+        "genre_rows", "genre_offsets",
+    )
+
+    def __init__(self, table: MovieTable, movie_cache_size: int = 4096):
+        self.table = table
+        self._movies: Dict[int, Movie] = {}  # row -> built model, reset when full
+        self.movie_cache_size = movie_cache_size
+        self._fingerprint: Optional[str] = None
+        self.ids = table.ids
+        self.genre_vocab: List[str] = table.vocab("genres")
+        self.genre_pos: Dict[str, int] = {g: i for i, g in enumerate(self.genre_vocab)}
+        self.rating = table["rating"]
+        self.popularity = table["popularity"]
+        self.year = table["year"]
+
+        if all(name in table.indexes for name in self.INDEX_ARRAYS):
+            for name in self.INDEX_ARRAYS:
+                setattr(self, name, table.indexes[name])
+        else:
+            self._build_indexes()
+        bits = np.arange(len(self.genre_vocab), dtype=np.int64)
+        self.combo_matrix = ((np.asarray(self.combo_codes)[:, None] >> bits) & 1).astype(np.float32)
+        # Cosine similarity between genre combinations (non-empty rows have norm >= 1), for the MMR re-rank
+        combo_unit = self.combo_matrix / np.maximum(np.linalg.norm(self.combo_matrix, axis=1, keepdims=True), 1.0)
+        self.combo_similarity = combo_unit @ combo_unit.T
+
+    def _build_indexes(self) -> None:
+        n = len(self.ids)
+        rows = np.arange(n)
+        if len(self.genre_vocab) > 63:
+            raise ValueError("Genre bitmasks support at most 63 distinct genres")
+
+        # Score terms that only depend on the movie
+        self.content_quality = (self.rating / 10.0) * 0.4
+        recency_boost = np.where(self.year >= 2022, 1.0, np.where(self.year >= 2020, 0.9, 0.8))
+        self.popularity_score = (self.popularity / 100.0) * recency_boost
+
+        # One bitmask per row (duplicate genres collapse), then distinct combinations;
+        # rows grouped by combination, best quality first
+        genres = self.table["genres"]
+        codes = np.asarray(genres.items.codes, dtype=np.int64)
+        entry_rows = np.repeat(rows, np.diff(genres.offsets))
+        row_codes = np.zeros(n, dtype=np.int64)
+        np.bitwise_or.at(row_codes, entry_rows, np.left_shift(1, codes))
+        self.combo_codes, self.row_combo = np.unique(row_codes, return_inverse=True)
+        self.combo_rows = np.lexsort((rows, -self.content_quality, self.row_combo))
+        self.combo_offsets = np.searchsorted(self.row_combo[self.combo_rows], np.arange(len(self.combo_codes) + 1))
+
+        # Popularity ranking is query independent
+        self.popularity_rows = np.lexsort((rows, -self.popularity_score))
+
+        # Query indexes: rows ordered by (value, id), and genre -> rows postings
+        self.year_rows = np.lexsort((rows, self.year))
+        self.year_sorted = self.year[self.year_rows]
+        self.rating_rows = np.lexsort((rows, self.rating))
+        self.rating_sorted = self.rating[self.rating_rows]
+        pairs = np.unique(codes * n + entry_rows) if n else np.empty(0, dtype=np.int64)
+        self.genre_rows = pairs % max(n, 1)
+        self.genre_offsets = np.searchsorted(pairs // max(n, 1), np.arange(len(self.genre_vocab) + 1))
+
+    def index_arrays(self) -> Dict[str, np.ndarray]:
+        """Derived arrays to persist next to the table's columns"""
+        return {name: getattr(self, name) for name in self.INDEX_ARRAYS}
+
+    @property
+    def fingerprint(self) -> str:
+        """Digest of every column ranking reads (ids, rating, popularity, year, genres), computed once"""
+        if self._fingerprint is None:
+            digest = hashlib.blake2b(json.dumps(self.genre_vocab).encode(), digest_size=16)
+            row_codes = np.asarray(self.combo_codes, dtype=np.int64)[self.row_combo]
+            for column, dtype in ((self.ids, np.int64), (self.rating, np.float64), (self.popularity, np.float64),
+                                  (self.year, np.int64), (row_codes, np.int64)):
+                digest.update(np.ascontiguousarray(column, dtype=dtype).tobytes())
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def popularity_offsets(self) -> np.ndarray:
+        return np.array([0, len(self.ids)])
+
+    def movie(self, row: int) -> Movie:
+        """Movie model for one row (columns were validated when written)"""
+        row = int(row)
+        movie = self._movies.get(row)
+        if movie is None:
+            if len(self._movies) >= self.movie_cache_size:
+                self._movies.clear()
+            movie = self._movies[row] = Movie.model_construct(**self.table.record(row))
+        return movie
+
+    def genres(self) -> List[str]:
+        """Genres with at least one movie"""
+        return [g for g, size in zip(self.genre_vocab, np.diff(self.genre_offsets)) if size]
+
+    def genre_vector(self, genres: List[str]) -> np.ndarray:
+        """Multi-hot query vector; genres outside the vocabulary are ignored"""
+        vector = np.zeros(len(self.genre_vocab), dtype=np.float32)
+        for genre in genres:
+            pos = self.genre_pos.get(genre)
+            if pos is not None:
+                vector[pos] = 1.0
+        return vector
+
+    def rows_of(self, movie_ids) -> np.ndarray:
+        """Row indices for the given movie ids (unknown ids are dropped)"""
+        if not movie_ids or not len(self.ids):
+            return np.empty(0, dtype=np.intp)
+        wanted = np.asarray(list(movie_ids), dtype=np.int64)
+        rows = np.minimum(np.searchsorted(self.ids, wanted), len(self.ids) - 1)
+        return rows[self.ids[rows] == wanted]
+    
+    def lookup_rows(self, movie_ids: np.ndarray) -> np.ndarray:
+        """Row of each movie id, aligned with the input (-1 where unknown)"""
+        movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        if not len(self.ids):
+            return np.full(len(movie_ids), -1, dtype=np.int64)
+        rows = np.minimum(np.searchsorted(self.ids, movie_ids), len(self.ids) - 1)
+        return np.where(self.ids[rows] == movie_ids, rows, -1)
+    
+    def exclusion(self, exclude_ids: List[int] = None, exclude: RowBitset = None) -> Optional[RowBitset]:
+        """Rows to skip: `exclude` (e.g. a user's seen rows, left unmodified) plus the rows of `exclude_ids`"""
+        rows = self.rows_of(exclude_ids)
+        if exclude is None:
+            return RowBitset.from_rows(len(self.ids), rows) if len(rows) else None
+        return exclude.with_rows(rows) if len(rows) else exclude
+
+
+def top_k_rows(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Rows of the k best finite scores, ordered by score descending then row.
+
+    argpartition selects the candidates so only they get sorted; ties at the
+    cut are kept whole so the result matches a stable full sort.
+    """
+    valid = np.isfinite(scores)
+    if k <= 0 or not valid.any():
+        return np.empty(0, dtype=np.intp)
+    if k < valid.sum():
+        masked = np.where(valid, scores, -np.inf)
+        threshold = masked[np.argpartition(-masked, k - 1)[k - 1]]
+        picked = np.flatnonzero(valid & (scores >= threshold))
+    else:
+        picked = np.flatnonzero(valid)
+    return picked[np.argsort(-scores[picked], kind="stable")[:k]]
+
+
+def top_k_grouped(
+    group_scores: np.ndarray,
+    rows: np.ndarray,
+    offsets: np.ndarray,
+    row_scores: np.ndarray,
+    k: int,
+    exclude: RowBitset = None
+) -> List[tuple]:
+    """
+    Top-k (row, score) pairs where score = group_scores[g] + row_scores[row],
+    skipping rows in `exclude`.
+
+    `rows[offsets[g]:offsets[g + 1]]` lists group g's rows sorted by row score
+    descending, then row. The best k rows can only come from the groups whose
+    first rows are among the best k + (excluded heads) heads, so argpartition
+    picks those groups and a heap merges them; excluded rows are skipped with an
+    O(1) bit test, so a long exclusion list costs nothing up front. Ordering is
+    score descending then row, identical to a stable full sort.
+    """
+    excluded = exclude if exclude is not None else ()
+    sizes = np.diff(offsets)
+    groups = np.flatnonzero(sizes > 0)
+    if k <= 0 or not len(groups):
+        return []
+
+    head_rows = rows[offsets[groups]]
+    heads = group_scores[groups] + row_scores[head_rows]
+    needed = k + (int(exclude.contains(head_rows).sum()) if exclude is not None else 0)
+    if needed < len(groups):
+        threshold = heads[np.argpartition(-heads, needed - 1)[needed - 1]]
+        keep = heads >= threshold
+        groups, heads = groups[keep], heads[keep]
+
+    heap = [(-float(score), int(rows[offsets[g]]), int(g), int(offsets[g])) for g, score in zip(groups, heads)]
+    heapq.heapify(heap)
+    results = []
+    while heap and len(results) < k:
+        neg_score, row, g, pos = heapq.heappop(heap)
+        if row not in excluded:
+            results.append((row, -neg_score))
+        pos += 1
+        if pos < offsets[g + 1]:
+            nxt = int(rows[pos])
+            heapq.heappush(heap, (-float(group_scores[g] + row_scores[nxt]), nxt, g, pos))
+    return results
+
+
+def content_top_k(cols: CatalogColumns, user_genres: List[str], limit: int,
+                  exclude: RowBitset = None) -> List[tuple]:
+    """(row, score) of the best genre matches: genre overlap * 0.6 + rating / 10 * 0.4"""
+    # Genre overlap for every genre combination in one matrix-vector product
+    overlap = (cols.combo_matrix @ cols.genre_vector(user_genres)).astype(np.float64)
+    genre_score = overlap / max(len(user_genres), 1)
+    return top_k_grouped(
+        genre_score * 0.6, cols.combo_rows, cols.combo_offsets,
+        cols.content_quality, limit, exclude
+    )
+
+
+def popularity_top_k(cols: CatalogColumns, limit: int, exclude: RowBitset = None) -> List[tuple]:
+    """(row, score) of the most popular movies, with a recency boost"""
+    return top_k_grouped(
+        np.zeros(1), cols.popularity_rows, cols.popularity_offsets,
+        cols.popularity_score, limit, exclude
+    )
+
+
+def mmr_order(
+    relevance: np.ndarray,
+    groups: np.ndarray,
+    group_similarity: np.ndarray,
+    k: int,
+    lam: float
+) -> np.ndarray:
+    """
+    Maximal Marginal Relevance: positions of k candidates, each pick
+    maximizing lam * relevance - (1 - lam) * (max similarity to the picks so far).
+
+    Candidate i is described by group groups[i] (its genre combination) and
+    the similarity of two candidates is group_similarity[groups[i], groups[j]].
+    Candidates of one group share their penalty, so only each group's best
+    remaining candidate can win: a pick is an argmax over the G distinct groups
+    plus one row of their (G x G) similarity block folded into the running
+    max, O(k * G) with G <= C. Negative groups (loners) are similar to nothing,
+    not even each other, so they share one extra group that is never
+    penalized. Ties go to the earlier candidate within a group and the group
+    seen first across groups, loners last.
+    """
+    relevance = np.asarray(relevance, dtype=np.float64)
+    k = min(k, len(relevance))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    positions = np.arange(len(relevance))
+    loners = groups < 0
+    # Groups numbered by first appearance, so ties across groups favour earlier candidates
+    distinct, first, inverse = np.unique(groups[~loners], return_index=True, return_inverse=True)
+    by_first = np.argsort(first)
+    distinct = distinct[by_first]
+    members = np.full(len(relevance), len(distinct), dtype=np.intp)
+    members[~loners] = np.argsort(by_first)[inverse]
+    
+    # The last row and column (loners) stay zero
+    penalty_block = np.zeros((len(distinct) + 1, len(distinct) + 1))
+    penalty_block[:-1, :-1] = (1.0 - lam) * group_similarity[np.ix_(distinct, distinct)].astype(np.float64)
+    
+    # Candidates grouped, best first within each group; heads[g] is group g's best remaining score
+    order = np.lexsort((positions, -relevance, members))
+    offsets = np.searchsorted(members[order], np.arange(len(penalty_block) + 1))
+    base = lam * relevance[order]
+    heads = np.where(offsets[:-1] < offsets[1:], base[np.minimum(offsets[:-1], len(base) - 1)], -np.inf)
+    nexts = offsets[:-1].copy()
+    penalty = np.zeros(len(penalty_block))
+    scores = np.empty(len(penalty_block))
+    picked = np.empty(k, dtype=np.intp)
+    for i in range(k):
+        g = int(np.subtract(heads, penalty, out=scores).argmax())
+        picked[i] = order[nexts[g]]
+        nexts[g] += 1
+        heads[g] = base[nexts[g]] if nexts[g] < offsets[g + 1] else -np.inf
+        np.maximum(penalty, penalty_block[g], out=penalty)
+    return picked
+
+
+class MovieCatalog:
+    """
+    Indexed movie store over a columnar MovieTable.
+
+    The base table is immutable and may be memory-mapped from disk, so startup
+    cost and resident memory do not grow with the catalog; Movie models are
+    built per returned row. Added / replaced movies live in a small overlay
+    (`_added`, `_dropped`) until the next columnar snapshot merges them.
+    Lookups are binary searches over the id column, and filters use the
+    snapshot's sorted year / rating orders and genre postings, so they cost
+    O(log N + result size) instead of a scan over the whole catalog.
+    """
+
+    def __init__(self, movies: List[Movie] = None, table: MovieTable = None, payload_cache_size: int = 100_000):
+        self._base = table if table is not None else MovieTable.from_records(m.model_dump() for m in movies or [])
+        self._added: Dict[int, Movie] = {}
+        self._dropped: set = set()  # base ids removed or replaced
+        self._columns: Optional[CatalogColumns] = None
+        self._listeners: List[Callable[[str, Movie], None]] = []
+        self._payloads: Dict[int, bytes] = {}
+        self.payload_cache_size = payload_cache_size
+
+    def __len__(self) -> int:
+        return len(self._base) - len(self._dropped) + len(self._added)
+
+    def __iter__(self) -> Iterator[Movie]:
+        cols = self.columns
+        for row in range(len(cols)):
+            yield cols.movie(row)
+
+    def __contains__(self, movie_id: int) -> bool:
+        if movie_id in self._added:
+            return True
+        return movie_id not in self._dropped and self._base.row_of(movie_id) is not None
+
+    def get(self, movie_id: int) -> Optional[Movie]:
+        """Primary-key lookup"""
+        movie = self._added.get(movie_id)
+        if movie is not None or movie_id in self._dropped:
+            return movie
+        if self._columns is not None:
+            # Reuse the snapshot's Movie cache (feedback looks up the same titles repeatedly)
+            row = self._columns.table.row_of(movie_id)
+            return None if row is None else self._columns.movie(row)
+        row = self._base.row_of(movie_id)
+        return None if row is None else Movie.model_construct(**self._base.record(row))
+
+    def genres(self) -> List[str]:
+        """All genres present in the catalog"""
+        return self.columns.genres()
+
+    def payload(self, movie: Movie) -> bytes:
+        """The movie's JSON, encoded once and reused until the movie changes"""
+        data = self._payloads.get(movie.id)
+        if data is None:
+            if len(self._payloads) >= self.payload_cache_size:
+                self._payloads.clear()
+            data = self._payloads[movie.id] = payloads.encode(movie.model_dump(mode="json"))
+        return data
+
+    def subscribe(self, listener: Callable[[str, Movie], None]) -> None:
+        """Register a callback(event, movie) fired on "add" / "remove" so derived indexes stay in sync"""
+        self._listeners.append(listener)
+
+    def _notify(self, event: str, movie: Movie) -> None:
+        for listener in self._listeners:
+            listener(event, movie)
+
+    @property
+    def columns(self) -> CatalogColumns:
+        """Columnar snapshot for vectorized scoring, rebuilt after mutations"""
+        if self._columns is None:
+            table = self._base
+            if self._added or self._dropped:
+                keep = np.flatnonzero(~np.isin(table.ids, np.fromiter(self._dropped, dtype=np.int64)))
+                delta = MovieTable.from_records(m.model_dump() for m in self._added.values())
+                table = table.take(keep).concat(delta)
+            self._columns = CatalogColumns(table)
+        return self._columns
+
+    def add(self, movie: Movie) -> None:
+        """Insert or replace a movie"""
+        if movie.id in self:
+            self.remove(movie.id)
+        self._added[movie.id] = movie
+        self._columns = None
+        self._payloads.pop(movie.id, None)
+        self._notify("add", movie)
+
+    def remove(self, movie_id: int) -> Optional[Movie]:
+        """Drop a movie from the store"""
+        movie = self.get(movie_id)
+        if movie is None:
+            return None
+        if self._added.pop(movie_id, None) is None:
+            self._dropped.add(movie_id)
+        self._columns = None
+        self._payloads.pop(movie_id, None)
+        self._notify("remove", movie)
+        return movie
+
+    def query(
+        self,
+        genre: Optional[str] = None,
+        year_min: Optional[int] = None,
+        year_max: Optional[int] = None,
+        rating_min: Optional[float] = None,
+        after_id: Optional[int] = None,
+        offset: int = 0,
+        limit: int = 50
+    ) -> List[Movie]:
+        """
+        Filtered, id-ordered page of movies.
+
+        The most selective index drives the scan; remaining filters are checked
+        on growing blocks of candidate rows at once. `after_id` is a keyset
+        cursor: the page starts right after that id, so deep pages cost no more
+        than the first one.
+        """
+        cols = self.columns
+        n = len(cols)
+
+        # Each candidate source is (size, lazy sorter over index rows)
+        drivers = []
+        genre_pos = cols.genre_pos.get(genre, -1)
+        if genre is not None:
+            postings = cols.genre_rows[cols.genre_offsets[genre_pos]:cols.genre_offsets[genre_pos + 1]] \
+                if genre_pos >= 0 else np.empty(0, dtype=np.int64)
+            drivers.append((len(postings), lambda: postings))
+        if year_min is not None or year_max is not None:
+            lo = 0 if year_min is None else int(np.searchsorted(cols.year_sorted, year_min, "left"))
+            hi = n if year_max is None else int(np.searchsorted(cols.year_sorted, year_max, "right"))
+            hi = max(lo, hi)
+            drivers.append((hi - lo, lambda: np.sort(cols.year_rows[lo:hi])))
+        if rating_min is not None:
+            r_lo = int(np.searchsorted(cols.rating_sorted, rating_min, "left"))
+            drivers.append((n - r_lo, lambda: np.sort(cols.rating_rows[r_lo:])))
+
+        rows = min(drivers, key=lambda d: d[0])[1]() if drivers else None
+        start = 0 if after_id is None else int(np.searchsorted(cols.ids, after_id, "right"))
+        if rows is not None:
+            rows = rows[np.searchsorted(rows, start):]
+        total = n - start if rows is None else len(rows)
+
+        picked: List[int] = []
+        needed = offset + limit
+        begin, block_size = 0, max(needed, 64)
+        while begin < total and len(picked) < needed:
+            block = np.arange(start + begin, start + min(begin + block_size, total)) if rows is None \
+                else np.asarray(rows[begin:begin + block_size])
+            keep = np.ones(len(block), dtype=bool)
+            if genre is not None:
+                keep &= ((cols.combo_codes[cols.row_combo[block]] >> genre_pos) & 1) > 0
+            if year_min is not None:
+                keep &= cols.year[block] >= year_min
+            if year_max is not None:
+                keep &= cols.year[block] <= year_max
+            if rating_min is not None:
+                keep &= cols.rating[block] >= rating_min
+            picked.extend(block[keep].tolist())
+            begin += len(block)
+            block_size *= 2
+        return [cols.movie(row) for row in picked[offset:needed]]
+
+
+# Columnar catalog written by columnar.py (memory-mapped); the built-in sample otherwise
+CATALOG_PATH = os.environ.get("MOVIE_CATALOG_PATH")
+CATALOG = MovieCatalog(table=MovieTable.open(CATALOG_PATH)) if CATALOG_PATH else MovieCatalog(MOVIES_DB)
+
+# Full-text index over title / cast / director / description and the
+# title / people autocomplete. Both are built on first use (so startup does not
+# scale with the catalog) and then kept in sync with it.
+_SEARCH_LOCK = threading.Lock()
+_SEARCH_INDEXES: Optional[tuple] = None
+
+def search_indexes() -> tuple:
+    """(SearchIndex, Suggester) over the current catalog"""
+    global _SEARCH_INDEXES
+    if _SEARCH_INDEXES is None:
+        with _SEARCH_LOCK:
+            if _SEARCH_INDEXES is None:
+                _SEARCH_INDEXES = (SearchIndex.build(CATALOG), Suggester.build(CATALOG))
+    return _SEARCH_INDEXES
+
+def _sync_search_indexes(event: str, movie: Movie) -> None:
+    with _SEARCH_LOCK:
+        if _SEARCH_INDEXES is None:
+            return
+        search_index, suggester = _SEARCH_INDEXES
+        if event == "add":
+            search_index.add(movie)
+            suggester.add(movie)
+        else:
+            search_index.remove(movie.id)
+            suggester.remove(movie.id)
+
+CATALOG.subscribe(_sync_search_indexes)
+
+# ============== Catalog Shards ==============
+
+# MOVIE_SHARDS=N splits the catalog across N worker processes (see shards.py):
+# content, mood and popularity candidates and /search fan out to all of them
+# and merge the shards' top-k. The pool serves the snapshot it was started
+# with; after a catalog change requests use the local indexes again.
+SHARD_COUNT = int(os.environ.get("MOVIE_SHARDS", "0"))
+SHARDS: Optional[ShardPool] = None
+
+def catalog_shards(cols: CatalogColumns) -> Optional[ShardPool]:
+    """The shard pool, if it serves this catalog snapshot and all its shards are up"""
+    pool = SHARDS
+    return pool if pool is not None and pool.columns is cols and not pool.broken else None
+
+def search_hits(query: str, limit: int) -> List[tuple]:
+    """Top `limit` (movie_id, score) BM25 matches, from the shards when they serve the catalog"""
+    pool = catalog_shards(CATALOG.columns)
+    if pool is not None:
+        return pool.search(query, limit)
+    return search_indexes()[0].search(query, limit)
+
+# ============== User Profiles ==============
+
+# Sample users, written to the store the first time it starts empty
+SAMPLE_PROFILES: List[UserProfile] = [
+    UserProfile(user_id=1, preferred_genres=["Action", "Sci-Fi", "Thriller"],
+                watch_history=[1, 2, 5, 7], ratings={1: 9.0, 2: 8.5, 5: 9.0, 7: 8.0}),
+    UserProfile(user_id=2, preferred_genres=["Romance", "Comedy", "Drama"],
+                watch_history=[12, 13, 9, 22], ratings={12: 9.0, 13: 8.0, 9: 8.5, 22: 9.0}),
+    UserProfile(user_id=3, preferred_genres=["Horror", "Thriller"],
+                watch_history=[18, 19, 15, 16], ratings={18: 8.0, 19: 7.5, 15: 8.5, 16: 9.0}),
+    UserProfile(user_id=4, preferred_genres=["Animation", "Adventure"],
+                watch_history=[25, 26, 27, 28], ratings={25: 9.0, 26: 9.5, 27: 8.5, 28: 9.0}),
+]
+
+# Profiles persist in SQLite (MOVIE_PROFILE_DB, ":memory:" for a throwaway store)
+# with the hottest MOVIE_PROFILE_CACHE_SIZE users held in memory
+USER_PROFILES = ProfileStore(
+    os.environ.get("MOVIE_PROFILE_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "profiles.db")),
+    vocab=[genre.value for genre in Genre],
+    cache_size=int(os.environ.get("MOVIE_PROFILE_CACHE_SIZE", "10000")),
+    max_items=int(os.environ.get("MOVIE_PROFILE_MAX_ITEMS", "5000"))
+)
+USER_PROFILES.seed(USER_PROFILES.from_fields(**profile.model_dump()) for profile in SAMPLE_PROFILES)
+
+class SeenItems:
+    """
+    Per-user bitset of seen (watched or rated) catalog rows, so generators can
+    drop a user's history with a mask instead of rebuilding id lists per call.
+
+    Sets are built from the profile's history on first use, kept current by
+    feedback (`record`), and tied to the catalog snapshot they index: a new
+    snapshot renumbers rows, so its sets are rebuilt lazily. The hottest users'
+    sets are kept up to `max_bytes`. Safe to read from several threads.
+    """
+
+    def __init__(self, profiles: ProfileStore, max_bytes: int = 64 << 20):
+        self.profiles = profiles
+        self.max_bytes = max_bytes
+        self._sets: "OrderedDict[int, tuple]" = OrderedDict()  # user_id -> (columns, bitset)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: int, cols: "CatalogColumns") -> Optional[RowBitset]:
+        """The user's seen rows in `cols` (None for unknown users); callers must not modify it"""
+        with self._lock:
+            entry = self._sets.get(user_id)
+            if entry is not None and entry[0] is cols:
+                self.hits += 1
+                self._sets.move_to_end(user_id)
+                return entry[1]
+        profile = self.profiles.get(user_id)
+        if not profile:
+            return None
+        self.misses += 1
+        seen = RowBitset.from_rows(len(cols), cols.rows_of(profile.recent))
+        with self._lock:
+            self._discard(user_id)
+            self._sets[user_id] = (cols, seen)
+            self._bytes += seen.nbytes
+            while self._bytes > self.max_bytes and len(self._sets) > 1:
+                _, (_, evicted) = self._sets.popitem(last=False)
+                self._bytes -= evicted.nbytes
+        return seen
+
+    def record(self, user_id: int, movie_id: int, profile: CompactProfile) -> None:
+        """Mirror one applied feedback event into the user's cached set"""
+        with self._lock:
+            entry = self._sets.get(user_id)
+            if entry is None:
+                return
+            if len(profile.recent) >= profile.max_items:
+                # History is trimming its oldest items, which a set cannot follow incrementally
+                self._discard(user_id)
+            elif profile.has_watched(movie_id) or profile.rating_of(movie_id) is not None:
+                cols, seen = entry
+                seen.add_rows(cols.rows_of([movie_id]))
+
+    def discard(self, user_id: int) -> None:
+        with self._lock:
+            self._discard(user_id)
+
+    def _discard(self, user_id: int) -> None:
+        entry = self._sets.pop(user_id, None)
+        if entry is not None:
+            self._bytes -= entry[1].nbytes
+
+    def clear(self) -> None:
+        with self._lock:
+            self._sets.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {"users": len(self._sets), "bytes": self._bytes, "max_bytes": self.max_bytes,
+                "hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0}
+
+SEEN_ITEMS = SeenItems(USER_PROFILES, max_bytes=int(os.environ.get("MOVIE_SEEN_SET_BYTES", str(64 << 20))))
+CATALOG.subscribe(lambda event, movie: SEEN_ITEMS.clear())
 
 # Mood to genre mapping
 MOOD_GENRE_MAP = {
@@ -336,93 +1021,539 @@ MOOD_GENRE_MAP = {
     "thrilling": ["Thriller", "Horror", "Action"],
 }
 
+# ============== Collaborative Model ==============
+
+DEFAULT_WATCH_RATING = 7.5  # implied rating for watched but unrated movies
+CF_MIN_RATING = 7.5         # minimum predicted rating for a collaborative pick
+
+GENRE_VOCAB: List[str] = [genre.value for genre in Genre]
+GENRE_POS: Dict[str, int] = {genre: i for i, genre in enumerate(GENRE_VOCAB)}
+
+class ItemSimilarityModel:
+    """
+    Item-item collaborative filtering over a sparse user-item rating matrix.
+
+    Ratings are held in CSR form (indptr / indices / data, one row per user,
+    columns are movie ids). Training accumulates item co-occurrence dot
+    products and item norms, from which each item keeps its top-N cosine
+    neighbours. Scoring a user is then a sparse lookup over their own history:
+    O(history * N) regardless of how many users exist.
+
+    Feedback is applied incrementally with `update`: rows touched since the
+    last build live in a per-user overlay on top of the CSR base, and the
+    co-occurrence counts, norms, affected similarity rows and the user's
+    genre-affinity vector are patched in O(history). `compare` checks that
+    state against a from-scratch rebuild. Batched writers pass `defer=True`
+    and call `refresh_stale` once, so neighbour rows touched by many events
+    are recomputed once per batch.
+    """
+
+    def __init__(self, n_neighbors: int = 50):
+        self.n_neighbors = n_neighbors
+        self.user_ids = np.empty(0, dtype=np.int64)
+        self.indptr = np.zeros(1, dtype=np.int64)
+        self.indices = np.empty(0, dtype=np.int64)
+        self.data = np.empty(0, dtype=np.float64)
+        self.cooccurrence: Dict[int, Dict[int, float]] = {}
+        self.norms: Dict[int, float] = {}
+        self.neighbors: Dict[int, np.ndarray] = {}
+        self.similarities: Dict[int, np.ndarray] = {}
+        self.row_updates: Dict[int, Dict[int, float]] = {}
+        self.genre_affinity: Dict[int, np.ndarray] = {}
+        self._stale_rows: set = set()
+        self._stale_entries: Dict[int, set] = {}
+
+    @staticmethod
+    def profile_ratings(profile: CompactProfile) -> Dict[int, float]:
+        """A profile's implicit + explicit ratings keyed by movie id"""
+        ratings = {movie_id: DEFAULT_WATCH_RATING for movie_id in profile.watch_history}
+        ratings.update(profile.ratings)
+        return ratings
+
+    @staticmethod
+    def genre_weights(genres: List[str]) -> np.ndarray:
+        """Fixed-width multi-hot vector over the Genre enum"""
+        vector = np.zeros(len(GENRE_VOCAB), dtype=np.float64)
+        for genre in genres:
+            pos = GENRE_POS.get(genre)
+            if pos is not None:
+                vector[pos] = 1.0
+        return vector
+
+    @classmethod
+    def build(
+        cls,
+        profiles: Iterable[CompactProfile],
+        catalog: "MovieCatalog",
+        n_neighbors: int = 50
+    ) -> "ItemSimilarityModel":
+        """Train from scratch on user profiles, streamed in user id order (as `ProfileStore.scan` yields them)"""
+        model = cls(n_neighbors)
+
+        user_ids, indptr, indices, data = [], [0], [], []
+        for profile in profiles:
+            row = sorted(cls.profile_ratings(profile).items())
+            user_ids.append(profile.user_id)
+            indices.extend(movie_id for movie_id, _ in row)
+            data.extend(rating for _, rating in row)
+            indptr.append(len(indices))
+        model.user_ids = np.array(user_ids, dtype=np.int64)
+        model.indptr = np.array(indptr, dtype=np.int64)
+        model.indices = np.array(indices, dtype=np.int64)
+        model.data = np.array(data, dtype=np.float64)
+
+        for u in range(len(model.user_ids)):
+            lo, hi = model.indptr[u], model.indptr[u + 1]
+            items = model.indices[lo:hi].tolist()
+            values = model.data[lo:hi].tolist()
+            model.genre_affinity[int(model.user_ids[u])] = sum(
+                (value / 10.0 * model._movie_genres(catalog, item) for item, value in zip(items, values)),
+                np.zeros(len(GENRE_VOCAB))
+            )
+            for a, (item_a, value_a) in enumerate(zip(items, values)):
+                model.norms[item_a] = model.norms.get(item_a, 0.0) + value_a * value_a
+                row_a = model.cooccurrence.setdefault(item_a, {})
+                for item_b, value_b in zip(items[a + 1:], values[a + 1:]):
+                    row_a[item_b] = row_a.get(item_b, 0.0) + value_a * value_b
+                    row_b = model.cooccurrence.setdefault(item_b, {})
+                    row_b[item_a] = row_b.get(item_a, 0.0) + value_a * value_b
+
+        for item in model.cooccurrence:
+            model.refresh_neighbors(item)
+        return model
+
+    @classmethod
+    def _movie_genres(cls, catalog: "MovieCatalog", movie_id: int) -> np.ndarray:
+        movie = catalog.get(movie_id)
+        return cls.genre_weights(movie.genres if movie else [])
+
+    def user_row(self, user_id: int) -> Dict[int, float]:
+        """The user's current row: incremental overlay if touched, else the CSR base"""
+        if user_id in self.row_updates:
+            return self.row_updates[user_id]
+        u = int(np.searchsorted(self.user_ids, user_id))
+        if u >= len(self.user_ids) or self.user_ids[u] != user_id:
+            return {}
+        lo, hi = self.indptr[u], self.indptr[u + 1]
+        return dict(zip(self.indices[lo:hi].tolist(), self.data[lo:hi].tolist()))
+
+    def refresh_neighbors(self, item: int) -> None:
+        """Recompute one item's top-N cosine neighbours from co-occurrence counts"""
+        row = self.cooccurrence.get(item)
+        if not row:
+            self.neighbors.pop(item, None)
+            self.similarities.pop(item, None)
+            return
+        others = np.fromiter(row.keys(), dtype=np.int64, count=len(row))
+        dots = np.fromiter(row.values(), dtype=np.float64, count=len(row))
+        other_norms = np.fromiter((self.norms[o] for o in row), dtype=np.float64, count=len(row))
+        sims = dots / np.sqrt(self.norms[item] * other_norms)
+        order = np.lexsort((others, -sims))[:self.n_neighbors]
+        self.neighbors[item] = others[order]
+        self.similarities[item] = sims[order]
+
+    def update(self, user_id: int, movie_id: int, value: float, genres: List[str], defer: bool = False) -> None:
+        """
+        Set one user's rating for a movie and patch the model in O(history).
+
+        Co-occurrence with every other item in the user's row moves by
+        (value - old) * rating, the movie's norm by value^2 - old^2, and the
+        genre-affinity vector by the movie's genres. The movie's own neighbour
+        row is recomputed; every history item only needs its similarity to this
+        movie refreshed, since their norms did not change.
+        """
+        if user_id not in self.row_updates:
+            self.row_updates[user_id] = dict(self.user_row(user_id))
+        row = self.row_updates[user_id]
+        old = row.get(movie_id, 0.0)
+        delta = value - old
+        if delta == 0:
+            return
+
+        for item, rating in row.items():
+            if item == movie_id:
+                continue
+            row_movie = self.cooccurrence.setdefault(movie_id, {})
+            row_movie[item] = row_movie.get(item, 0.0) + delta * rating
+            row_item = self.cooccurrence.setdefault(item, {})
+            row_item[movie_id] = row_item.get(movie_id, 0.0) + delta * rating
+        self.norms[movie_id] = self.norms.get(movie_id, 0.0) + value * value - old * old
+        row[movie_id] = value
+
+        affinity = self.genre_affinity.setdefault(user_id, np.zeros(len(GENRE_VOCAB)))
+        affinity += delta / 10.0 * self.genre_weights(genres)
+
+        if defer:
+            self._stale_rows.add(movie_id)
+            for item in row:
+                if item != movie_id:
+                    self._stale_entries.setdefault(item, set()).add(movie_id)
+            return
+        self.refresh_neighbors(movie_id)
+        for item in row:
+            if item != movie_id:
+                self._patch_neighbors(item, [movie_id])
+
+    def refresh_stale(self) -> None:
+        """Apply the neighbour-row work deferred by `update(..., defer=True)`"""
+        for item in self._stale_rows:
+            self.refresh_neighbors(item)
+        for item, others in self._stale_entries.items():
+            if item not in self._stale_rows:
+                self._patch_neighbors(item, list(others))
+        self._stale_rows, self._stale_entries = set(), {}
+
+    def _patch_neighbors(self, item: int, others: List[int]) -> None:
+        """Refresh the given entries of an item's top-N neighbour row"""
+        row = self.cooccurrence[item]
+        others = np.asarray(others, dtype=np.int64)
+        dots = np.fromiter((row[o] for o in others.tolist()), dtype=np.float64, count=len(others))
+        other_norms = np.fromiter((self.norms[o] for o in others.tolist()), dtype=np.float64, count=len(others))
+        ids = self.neighbors.get(item, np.empty(0, dtype=np.int64))
+        sims = self.similarities.get(item, np.empty(0, dtype=np.float64))
+        keep = ~np.isin(ids, others)
+        ids = np.concatenate([ids[keep], others])
+        sims = np.concatenate([sims[keep], dots / np.sqrt(self.norms[item] * other_norms)])
+        order = np.lexsort((ids, -sims))[:self.n_neighbors]
+        self.neighbors[item] = ids[order]
+        self.similarities[item] = sims[order]
+
+    def compare(self, other: "ItemSimilarityModel", tolerance: float = 1e-9, max_drift: float = 0.1) -> Dict:
+        """
+        Consistency report against another model, typically a rebuild.
+
+        Rating rows, co-occurrence counts, norms and genre-affinity vectors must
+        agree within `tolerance` (`state_consistent`). Neighbour rows are also
+        maintained exactly for touched items, but items merely co-occurring with
+        an updated movie keep their previous similarity until rebuilt, so
+        `consistent` additionally allows a similarity drift of up to `max_drift`.
+        """
+        def close(a: float, b: float) -> bool:
+            return abs(a - b) <= tolerance * max(1.0, abs(a), abs(b))
+
+        users = set(self.user_ids.tolist()) | set(self.row_updates)
+        users |= set(other.user_ids.tolist()) | set(other.row_updates)
+        row_mismatches = [u for u in users if self.user_row(u) != other.user_row(u)]
+
+        cooc_mismatches = 0
+        for item in set(self.cooccurrence) | set(other.cooccurrence):
+            mine = self.cooccurrence.get(item, {})
+            theirs = other.cooccurrence.get(item, {})
+            for key in set(mine) | set(theirs):
+                if not close(mine.get(key, 0.0), theirs.get(key, 0.0)):
+                    cooc_mismatches += 1
+
+        norm_mismatches = sum(
+            1 for item in set(self.norms) | set(other.norms)
+            if not close(self.norms.get(item, 0.0), other.norms.get(item, 0.0))
+        )
+
+        zero = np.zeros(len(GENRE_VOCAB))
+        affinity_mismatches = sum(
+            1 for u in set(self.genre_affinity) | set(other.genre_affinity)
+            if not np.allclose(self.genre_affinity.get(u, zero), other.genre_affinity.get(u, zero),
+                               rtol=tolerance, atol=tolerance)
+        )
+
+        def neighbor_row(model: "ItemSimilarityModel", item: int) -> Dict[int, float]:
+            if item not in model.neighbors:
+                return {}
+            return dict(zip(model.neighbors[item].tolist(), model.similarities[item].tolist()))
+
+        max_drift_seen = 0.0
+        stale_rows = 0
+        for item in set(self.neighbors) | set(other.neighbors):
+            mine, theirs = neighbor_row(self, item), neighbor_row(other, item)
+            if set(mine) != set(theirs):
+                stale_rows += 1
+            for key in set(mine) & set(theirs):
+                max_drift_seen = max(max_drift_seen, abs(mine[key] - theirs[key]))
+
+        state_consistent = not (row_mismatches or cooc_mismatches or norm_mismatches or affinity_mismatches)
+        return {
+            "consistent": state_consistent and max_drift_seen <= max_drift,
+            "state_consistent": state_consistent,
+            "users": len(users),
+            "row_mismatches": len(row_mismatches),
+            "cooccurrence_mismatches": cooc_mismatches,
+            "norm_mismatches": norm_mismatches,
+            "affinity_mismatches": affinity_mismatches,
+            "neighbor_rows_differing": stale_rows,
+            "max_similarity_drift": max_drift_seen,
+        }
+
+    def predict(self, history: Dict[int, float]) -> List[tuple]:
+        """Predicted ratings for unseen neighbours of the history items (see `predict_from_neighbors`)"""
+        items = [item for item in history if item in self.neighbors]
+        return predict_from_neighbors(
+            history, items, [self.neighbors[i] for i in items], [self.similarities[i] for i in items]
+        )
+
+    def neighbor_arrays(self) -> Dict[str, np.ndarray]:
+        """Neighbour rows as CSR arrays over sorted item ids, for SharedNeighbors"""
+        items = np.array(sorted(self.neighbors), dtype=np.int64)
+        lengths = np.fromiter((len(self.neighbors[i]) for i in items.tolist()), dtype=np.int64, count=len(items))
+        offsets = np.zeros(len(items) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        empty_ids, empty_sims = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        return {
+            "item_ids": items,
+            "offsets": offsets,
+            "neighbors": np.concatenate([self.neighbors[i] for i in items.tolist()] or [empty_ids]),
+            "similarities": np.concatenate([self.similarities[i] for i in items.tolist()] or [empty_sims]),
+        }
+
+
+def predict_from_neighbors(
+    history: Dict[int, float],
+    items: List[int],
+    neighbors: List[np.ndarray],
+    similarities: List[np.ndarray]
+) -> List[tuple]:
+    """
+    Predicted ratings for unseen neighbours of the history items.
+
+    `neighbors[j]` / `similarities[j]` is the neighbour row of `items[j]`.
+    Each candidate's prediction is the similarity-weighted average of the
+    user's ratings on the history items that list it as a neighbour.
+    """
+    if not items:
+        return []
+    candidates = np.concatenate(neighbors)
+    sims = np.concatenate(similarities)
+    weights = np.concatenate([np.full(len(row), history[i]) for i, row in zip(items, neighbors)])
+
+    unique, inverse = np.unique(candidates, return_inverse=True)
+    numerator = np.bincount(inverse, weights=sims * weights, minlength=len(unique))
+    denominator = np.bincount(inverse, weights=sims, minlength=len(unique))
+    valid = denominator > 0
+    return [
+        (int(movie_id), float(pred))
+        for movie_id, pred in zip(unique[valid], numerator[valid] / denominator[valid])
+        if int(movie_id) not in history
+    ]
+
+
+class SharedNeighbors:
+    """
+    Read-only neighbour table a worker serves collaborative picks from.
+
+    The owner's ItemSimilarityModel keeps the mutable training state
+    (co-occurrence, norms) and publishes its neighbour rows as CSR arrays;
+    workers memory-map them, so one copy backs every worker. Predictions match
+    the model they were published from.
+    """
+
+    def __init__(self, arrays: Dict):
+        self.version: str = arrays["meta"]["version"]
+        self.n_neighbors: int = arrays["meta"]["n_neighbors"]
+        self.item_ids: np.ndarray = arrays["item_ids"]
+        self.offsets: np.ndarray = arrays["offsets"]
+        self.neighbors: np.ndarray = arrays["neighbors"]
+        self.similarities: np.ndarray = arrays["similarities"]
+
+    def predict(self, history: Dict[int, float]) -> List[tuple]:
+        if not len(self.item_ids):
+            return []
+        wanted = np.fromiter(history, dtype=np.int64, count=len(history))
+        rows = np.minimum(np.searchsorted(self.item_ids, wanted), len(self.item_ids) - 1)
+        found = self.item_ids[rows] == wanted
+        items = wanted[found].tolist()
+        spans = [(self.offsets[row], self.offsets[row + 1]) for row in rows[found].tolist()]
+        return predict_from_neighbors(
+            history, items, [self.neighbors[lo:hi] for lo, hi in spans], [self.similarities[lo:hi] for lo, hi in spans]
+        )
+
+
+# Workers map the owner's published neighbour table; everything else trains in process
+SIMILARITY_DIR = os.path.join(SHARED_DIR, "similarity") if SHARED_DIR else None
+CF_MODEL = SharedNeighbors(shared.open_snapshot(SIMILARITY_DIR)) if ROLE == "worker" \
+    else ItemSimilarityModel.build(USER_PROFILES.scan(), CATALOG)
+
+# ============== Factor Model Serving ==============
+
+MODEL_DIR = os.environ.get("MOVIE_MODEL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "als"))
+MODEL_POLL_SECONDS = float(os.environ.get("MOVIE_MODEL_POLL_SECONDS", "60"))
+ANN_MIN_ITEMS = int(os.environ.get("MOVIE_ANN_MIN_ITEMS", "5000"))  # below this, exact scoring is faster
+ANN_NPROBE = int(os.environ.get("MOVIE_ANN_NPROBE", "16"))
+
+class FactorModel:
+    """
+    One immutable, versioned set of ALS factors (memory-mapped from disk).
+
+    Large item sets are served through an IVF index over the item factors:
+    the one saved with the version if present, otherwise built on load.
+    """
+
+    def __init__(self, arrays: Dict):
+        self.version: str = arrays["meta"]["version"]
+        self.meta: Dict = arrays["meta"]
+        self.user_ids: np.ndarray = arrays["user_ids"]
+        self.item_ids: np.ndarray = arrays["item_ids"]
+        self.user_factors: np.ndarray = arrays["user_factors"]
+        self.item_factors: np.ndarray = arrays["item_factors"]
+
+        self.ann: Optional[IVFIndex] = None
+        ann_path = os.path.join(arrays.get("path", ""), "ann")
+        if os.path.isdir(ann_path):
+            self.ann = IVFIndex.load(ann_path)
+        elif len(self.item_ids) >= ANN_MIN_ITEMS:
+            self.ann = IVFIndex.build(self.item_ids, self.item_factors)
+        if self.ann:
+            self.ann.nprobe = ANN_NPROBE
+
+    def _row(self, ids: np.ndarray, key: int) -> Optional[int]:
+        pos = int(np.searchsorted(ids, key))
+        return pos if pos < len(ids) and ids[pos] == key else None
+
+    def user_vector(self, user_id: int) -> Optional[np.ndarray]:
+        row = self._row(self.user_ids, user_id)
+        return None if row is None else np.asarray(self.user_factors[row])
+
+    def item_rows(self, movie_ids) -> np.ndarray:
+        """Item rows for the given movie ids (unknown ids are dropped)"""
+        if not movie_ids or not len(self.item_ids):
+            return np.empty(0, dtype=np.intp)
+        wanted = np.asarray(list(movie_ids), dtype=np.int64)
+        rows = np.minimum(np.searchsorted(self.item_ids, wanted), len(self.item_ids) - 1)
+        return rows[self.item_ids[rows] == wanted]
+
+    def item_vector(self, movie_id: int) -> Optional[np.ndarray]:
+        row = self._row(self.item_ids, movie_id)
+        return None if row is None else np.asarray(self.item_factors[row])
+
+    def nearest(self, vector: np.ndarray, k: int, exclude=None,
+                skip: Callable[[np.ndarray], np.ndarray] = None) -> List[tuple]:
+        """
+        Top-k (movie_id, score) by dot product: ANN when indexed, exact otherwise.
+
+        `exclude` is a few movie ids; `skip(movie_ids) -> bool mask` filters a
+        large set (a user's history) by over-fetching and testing only the
+        fetched candidates, doubling the fetch until k survive.
+        """
+        if not self.ann:
+            scores = (self.item_factors @ vector).astype(np.float64)
+            scores[self.item_rows(exclude)] = -np.inf
+        fetch = 2 * k if skip is not None else k
+        while True:
+            if self.ann:
+                ids, top = self.ann.search(vector, fetch, exclude=exclude)
+            else:
+                rows = top_k_rows(scores, fetch)
+                ids, top = self.item_ids[rows], scores[rows]
+            if skip is not None:
+                keep = ~skip(ids)
+                if keep.sum() < k and len(ids) >= fetch:
+                    fetch *= 2
+                    continue
+                ids, top = ids[keep], top[keep]
+            return list(zip(ids[:k].tolist(), top[:k].tolist()))
+
+
+class FactorModelRegistry:
+    """
+    Holds the factor set being served.
+
+    A reload builds the new FactorModel completely and then replaces the
+    reference in one assignment, so in-flight requests keep scoring against
+    the set they started with and new requests pick up the new one.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.model: Optional[FactorModel] = None
+
+    def reload(self) -> bool:
+        """Swap in the version CURRENT points at; returns True if it changed"""
+        version = current_version(self.root)
+        if not version or (self.model and self.model.version == version):
+            return False
+        self.model = FactorModel(load_factors(self.root, version))
+        return True
+
+
+FACTOR_MODELS = FactorModelRegistry(MODEL_DIR)
+
 # ============== Recommendation Algorithms ==============
 
+# Relevance / diversity trade-off of the final re-rank (see mmr_order):
+# 1.0 ranks by score alone, lower values push genre variety harder. The
+# re-rank draws from the best MOVIE_MMR_CANDIDATES candidates (at least
+# `limit`), so a precomputed top-N with N >= that reproduces it exactly.
+MMR_LAMBDA = float(os.environ.get("MOVIE_MMR_LAMBDA", "0.8"))
+MMR_CANDIDATES = int(os.environ.get("MOVIE_MMR_CANDIDATES", "50"))
+
 class RecommendationEngine:
     """Multi-algorithm recommendation engine with ensemble ranking"""
     
     @staticmethod
+    @STAGES.timed("content_based")
     def content_based_filter(
         user_genres: List[str], 
         exclude_ids: List[int] = None,
-        limit: int = 20
+        limit: int = 20,
+        exclude: RowBitset = None
     ) -> List[tuple]:
         """
         Content-Based Filtering: Recommend movies based on genre preferences
         """
-        exclude_ids = exclude_ids or []
-        scored_movies = []
-        
-        for movie in MOVIES_DB:
-            if movie.id in exclude_ids:
-                continue
-            
-            # Calculate genre overlap score
-            genre_overlap = len(set(movie.genres) & set(user_genres))
-            genre_score = genre_overlap / max(len(user_genres), 1)
-            
-            # Weight by movie rating
-            quality_score = movie.rating / 10.0
-            
-            # Combined score
-            final_score = (genre_score * 0.6) + (quality_score * 0.4)
-            scored_movies.append((movie, final_score, "content_based"))
-        
-        # Sort by score
-        scored_movies.sort(key=lambda x: x[1], reverse=True)
-        return scored_movies[:limit]
+        cols = CATALOG.columns
+        excluded = cols.exclusion(exclude_ids, exclude)
+        pool = catalog_shards(cols)
+        if pool is not None:
+            top = pool.content(user_genres, limit, excluded)
+        else:
+            top = content_top_k(cols, user_genres, limit, excluded)
+        return [(cols.movie(row), score, "content_based") for row, score in top]
     
     @staticmethod
+    @STAGES.timed("collaborative")
     def collaborative_filter(
         user_id: int,
         exclude_ids: List[int] = None,
-        limit: int = 20
+        limit: int = 20,
+        shared: "SharedCandidates" = None,
+        exclude: RowBitset = None
     ) -> List[tuple]:
         """
-        Collaborative Filtering: Recommend based on similar users' preferences
+        Collaborative Filtering: Recommend movies similar to the user's history,
+        where similarity comes from co-watching across all users (item-item)
         """
-        exclude_ids = exclude_ids or []
+        source = shared or RecommendationEngine
+        cols = CATALOG.columns
+        excluded = cols.exclusion(exclude_ids, exclude)
         user_profile = USER_PROFILES.get(user_id)
         
         if not user_profile:
             # Cold start: return popular movies
-            return RecommendationEngine.popularity_based(exclude_ids, limit)
+            return source.popularity_based(None, limit, exclude=excluded)
         
-        # Find similar users (users with overlapping watch history)
-        similar_user_movies = []
-        for other_id, other_profile in USER_PROFILES.items():
-            if other_id == user_id:
-                continue
-            
-            overlap = set(user_profile.watch_history) & set(other_profile.watch_history)
-            if len(overlap) >= 1:
-                # Get movies this similar user liked that current user hasn't seen
-                for movie_id in other_profile.watch_history:
-                    if movie_id not in user_profile.watch_history and movie_id not in exclude_ids:
-                        rating = other_profile.ratings.get(movie_id, 7.5)
-                        if rating >= 7.5:
-                            similar_user_movies.append((movie_id, rating))
+        # Sparse item-item lookup over the user's own history
+        history = ItemSimilarityModel.profile_ratings(user_profile)
+        predictions = CF_MODEL.predict(history)
+        movie_ids = np.fromiter((movie_id for movie_id, _ in predictions), dtype=np.int64, count=len(predictions))
+        predicted = np.fromiter((value for _, value in predictions), dtype=np.float64, count=len(predictions))
+        rows = cols.lookup_rows(movie_ids)
+        keep = (rows >= 0) & (predicted >= CF_MIN_RATING)
+        if excluded is not None:
+            keep &= ~excluded.contains(rows)
         
-        # Get movie objects and score
         scored_movies = []
-        seen_ids = set()
-        for movie_id, sim_rating in similar_user_movies:
-            if movie_id in seen_ids:
-                continue
-            seen_ids.add(movie_id)
-            
-            movie = next((m for m in MOVIES_DB if m.id == movie_id), None)
-            if movie:
-                score = (sim_rating / 10.0) * 0.7 + (movie.rating / 10.0) * 0.3
-                scored_movies.append((movie, score, "collaborative"))
+        for row, value in zip(rows[keep].tolist(), predicted[keep].tolist()):
+            movie = cols.movie(row)
+            score = (value / 10.0) * 0.7 + (movie.rating / 10.0) * 0.3
+            scored_movies.append((movie, score, "collaborative"))
         
         if len(scored_movies) < limit:
-            # Supplement with content-based
+            # Supplement with content-based, skipping what CF already picked
             user_genres = user_profile.preferred_genres
-            supplement = RecommendationEngine.content_based_filter(
+            picked = rows[keep]
+            supplement = source.content_based_filter(
                 user_genres, 
-                exclude_ids + list(seen_ids),
-                limit - len(scored_movies)
+                None,
+                limit - len(scored_movies),
+                exclude=excluded.with_rows(picked) if excluded is not None
+                else RowBitset.from_rows(len(cols), picked) if len(picked) else None
             )
             scored_movies.extend(supplement)
         
@@ -430,43 +1561,69 @@ class RecommendationEngine:
         return scored_movies[:limit]
     
     @staticmethod
+    @STAGES.timed("popularity")
     def popularity_based(
         exclude_ids: List[int] = None,
-        limit: int = 20
+        limit: int = 20,
+        exclude: RowBitset = None
     ) -> List[tuple]:
         """
         Popularity-Based: Recommend trending/popular movies
         """
-        exclude_ids = exclude_ids or []
+        cols = CATALOG.columns
+        excluded = cols.exclusion(exclude_ids, exclude)
         
-        # Sort by popularity and recency
-        popular_movies = []
-        for movie in MOVIES_DB:
-            if movie.id in exclude_ids:
-                continue
-            
-            # Boost recent movies
-            recency_boost = 1.0 if movie.year >= 2022 else (0.9 if movie.year >= 2020 else 0.8)
-            score = (movie.popularity / 100.0) * recency_boost
-            popular_movies.append((movie, score, "popularity"))
+        # Popularity with recency boost, presorted per catalog snapshot
+        pool = catalog_shards(cols)
+        top = pool.popularity(limit, excluded) if pool is not None else popularity_top_k(cols, limit, excluded)
+        return [(cols.movie(row), score, "popularity") for row, score in top]
+    
+    @staticmethod
+    @STAGES.timed("matrix_factorization")
+    def factor_based(
+        user_id: int,
+        exclude_ids: List[int] = None,
+        limit: int = 20,
+        exclude: RowBitset = None
+    ) -> List[tuple]:
+        """
+        Matrix Factorization: Rank movies by ALS user/movie factor dot products
+        """
+        model = FACTOR_MODELS.model
+        vector = model.user_vector(user_id) if model else None
+        if vector is None:
+            return []
         
-        popular_movies.sort(key=lambda x: x[1], reverse=True)
-        return popular_movies[:limit]
+        # Never re-recommend what the user has already seen (watched or rated)
+        cols = CATALOG.columns
+        if exclude is None:
+            exclude = SEEN_ITEMS.get(user_id, cols)
+        excluded = cols.exclusion(exclude_ids, exclude)
+        skip = (lambda movie_ids: excluded.contains(cols.lookup_rows(movie_ids))) if excluded is not None else None
+        
+        results = []
+        for movie_id, score in model.nearest(vector, limit, skip=skip):
+            movie = CATALOG.get(movie_id)
+            if movie:
+                results.append((movie, score, "matrix_factorization"))
+        return results
     
     @staticmethod
+    @STAGES.timed("mood")
     def mood_based_filter(
         mood: str,
         exclude_ids: List[int] = None,
-        limit: int = 20
+        limit: int = 20,
+        exclude: RowBitset = None
     ) -> List[tuple]:
         """
         Mood-Based Filtering: Recommend based on user's current mood
         """
         preferred_genres = MOOD_GENRE_MAP.get(mood, ["Drama", "Comedy"])
-        return RecommendationEngine.content_based_filter(preferred_genres, exclude_ids, limit)
+        return RecommendationEngine.content_based_filter(preferred_genres, exclude_ids, limit, exclude)
     
     @staticmethod
-    def generate_explanation(movie: Movie, algorithm: str, user_profile: UserProfile = None) -> str:
+    def generate_explanation(movie: Movie, algorithm: str, user_profile: CompactProfile = None) -> str:
         """Generate human-readable explanation for recommendation"""
         
         if algorithm == "collaborative":
@@ -489,6 +1646,9 @@ class RecommendationEngine:
         elif algorithm == "mood":
             return "Perfect for your mood"
         
+        elif algorithm == "matrix_factorization":
+            return "Based on your viewing patterns"
+        
         return "Recommended for you"
     
     @staticmethod
@@ -503,61 +1663,125 @@ class RecommendationEngine:
         return "diverse"
     
     @staticmethod
+    @STAGES.timed("ensemble")
     def ensemble_recommend(
         user_id: int = None,
         mood: str = None,
         genres: List[str] = None,
         exclude_ids: List[int] = None,
-        limit: int = 20
+        limit: int = 20,
+        shared: "SharedCandidates" = None
     ) -> List[MovieRecommendation]:
         """
         Ensemble Ranking: Combine multiple algorithms with weighted scoring
+
+        `shared` lets a batch of requests reuse content / popularity candidate
+        lists; results are the same as without it.
+        """
+        ranked = RecommendationEngine.ensemble_candidates(user_id, mood, genres, exclude_ids, shared)
+        user_profile = USER_PROFILES.get(user_id) if user_id else None
+        return RecommendationEngine.build_recommendations(ranked, limit, user_profile)
+    
+    @staticmethod
+    def ensemble_candidates(
+        user_id: int = None,
+        mood: str = None,
+        genres: List[str] = None,
+        exclude_ids: List[int] = None,
+        shared: "SharedCandidates" = None
+    ) -> List[tuple]:
+        """
+        Every ensemble candidate as (movie, score, algorithm), best first.
+        The list does not depend on the requested limit.
         """
-        exclude_ids = exclude_ids or []
+        source = shared or RecommendationEngine
+        cols = CATALOG.columns
         user_profile = USER_PROFILES.get(user_id) if user_id else None
         
+        # One row mask for every generator: the user's history plus explicit exclusions
+        seen = SEEN_ITEMS.get(user_id, cols) if user_profile else None
+        excluded = cols.exclusion(exclude_ids, seen)
+        
         # Get candidates from all algorithms
         candidates = []
         
         # 1. Collaborative filtering (if user exists)
         if user_profile:
-            cf_results = RecommendationEngine.collaborative_filter(user_id, exclude_ids, 15)
+            cf_results = RecommendationEngine.collaborative_filter(user_id, None, 15, shared, exclude=excluded)
+            CANDIDATES.observe(len(cf_results), ("collaborative",))
             for movie, score, algo in cf_results:
                 candidates.append((movie, score * 1.2, algo))  # Boost CF results
         
-        # 2. Content-based (using mood or explicit genres)
+        # 2. Matrix factorization (if the served factor set knows the user)
+        if user_id:
+            mf_results = RecommendationEngine.factor_based(user_id, None, 15, exclude=excluded)
+            CANDIDATES.observe(len(mf_results), ("matrix_factorization",))
+            candidates.extend(mf_results)
+        
+        # 3. Content-based (using mood or explicit genres)
         if mood:
-            mood_results = RecommendationEngine.mood_based_filter(mood, exclude_ids, 15)
+            mood_results = source.mood_based_filter(mood, None, 15, exclude=excluded)
+            CANDIDATES.observe(len(mood_results), ("mood",))
             for movie, score, _ in mood_results:
                 candidates.append((movie, score * 1.1, "mood"))
         elif genres:
-            cb_results = RecommendationEngine.content_based_filter(genres, exclude_ids, 15)
+            cb_results = source.content_based_filter(genres, None, 15, exclude=excluded)
+            CANDIDATES.observe(len(cb_results), ("content_based",))
             candidates.extend(cb_results)
         elif user_profile:
-            cb_results = RecommendationEngine.content_based_filter(
-                user_profile.preferred_genres, exclude_ids, 15
+            cb_results = source.content_based_filter(
+                user_profile.preferred_genres, None, 15, exclude=excluded
             )
+            CANDIDATES.observe(len(cb_results), ("content_based",))
             candidates.extend(cb_results)
         
-        # 3. Popularity (always include some)
-        pop_results = RecommendationEngine.popularity_based(exclude_ids, 10)
+        # 4. Popularity (always include some)
+        pop_results = source.popularity_based(None, 10, exclude=excluded)
+        CANDIDATES.observe(len(pop_results), ("popularity",))
         for movie, score, algo in pop_results:
             candidates.append((movie, score * 0.9, algo))
         
         # Deduplicate and aggregate scores
-        movie_scores: Dict[int, tuple] = {}
-        for movie, score, algo in candidates:
-            if movie.id in movie_scores:
-                existing_score = movie_scores[movie.id][1]
-                movie_scores[movie.id] = (movie, max(existing_score, score), algo)
-            else:
-                movie_scores[movie.id] = (movie, score, algo)
-        
-        # Sort by score and create recommendations
-        sorted_movies = sorted(movie_scores.values(), key=lambda x: x[1], reverse=True)
+        with STAGES.time("dedupe"):
+            movie_scores: Dict[int, tuple] = {}
+            for movie, score, algo in candidates:
+                if movie.id in movie_scores:
+                    existing_score = movie_scores[movie.id][1]
+                    movie_scores[movie.id] = (movie, max(existing_score, score), algo)
+                else:
+                    movie_scores[movie.id] = (movie, score, algo)
+            
+            # Sort by score
+            ranked = sorted(movie_scores.values(), key=lambda x: x[1], reverse=True)
+        CANDIDATES.observe(len(ranked), ("ensemble",))
+        return ranked
+    
+    @staticmethod
+    @STAGES.timed("rerank")
+    def build_recommendations(
+        ranked: List[tuple],
+        limit: int,
+        user_profile: CompactProfile = None,
+        mmr_lambda: float = None,
+        candidates: int = None
+    ) -> List[MovieRecommendation]:
+        """
+        `limit` of the ranked candidates as recommendations, re-ranked for
+        genre diversity with Maximal Marginal Relevance over the best
+        `candidates` of them
+        """
+        lam = MMR_LAMBDA if mmr_lambda is None else mmr_lambda
+        if lam < 1.0 and len(ranked) > 1:
+            ranked = ranked[:max(limit, MMR_CANDIDATES if candidates is None else candidates)]
+            cols = CATALOG.columns
+            rows = cols.lookup_rows(np.fromiter((movie.id for movie, _, _ in ranked), dtype=np.int64, count=len(ranked)))
+            groups = np.full(len(rows), -1, dtype=np.int64)
+            groups[rows >= 0] = cols.row_combo[rows[rows >= 0]]
+            relevance = np.fromiter((score for _, score, _ in ranked), dtype=np.float64, count=len(ranked))
+            ranked = [ranked[i] for i in mmr_order(relevance, groups, cols.combo_similarity, limit, lam)]
         
         recommendations = []
-        for movie, score, algorithm in sorted_movies[:limit]:
+        for movie, score, algorithm in ranked[:limit]:
             rec = MovieRecommendation(
                 movie=movie,
                 score=min(score, 1.0),
@@ -567,24 +1791,478 @@ class RecommendationEngine:
             )
             recommendations.append(rec)
         
-        # Inject diversity if too homogeneous
-        if len(recommendations) >= 5:
-            seen_genres = set()
-            for rec in recommendations[:5]:
-                seen_genres.update(rec.movie.genres)
-            
-            # If top 5 are too similar, swap in a diverse pick
-            if len(seen_genres) <= 3:
-                for rec in recommendations[5:]:
-                    new_genres = set(rec.movie.genres) - seen_genres
-                    if new_genres:
-                        # Move this diverse movie up
-                        recommendations.remove(rec)
-                        recommendations.insert(4, rec)
-                        break
-        
         return recommendations
 
+
+class SharedCandidates:
+    """
+    Candidate lists shared by the requests of one batch.
+
+    Offers the same content / mood / popularity calls as RecommendationEngine.
+    Genre scores for every distinct genre list in the batch come from a single
+    (combinations x lists) matrix product, and each (genres, exclusions, limit)
+    candidate list is computed once no matter how many requests need it.
+    Lists filtered by a per-user row mask (`exclude`) are specific to that
+    request and are not memoized.
+    """
+
+    def __init__(self, queries: List[RecommendationQuery] = ()):
+        self.cols = CATALOG.columns
+        self._genre_scores: Dict[tuple, np.ndarray] = {}
+        self._lists: Dict[tuple, List[tuple]] = {}
+        
+        # Genre lists the ensemble will ask for (mirrors ensemble_recommend)
+        wanted = []
+        for query in queries:
+            profile = USER_PROFILES.get(query.user_id) if query.user_id else None
+            if profile:
+                wanted.append(profile.preferred_genres)
+            if query.mood:
+                wanted.append(MOOD_GENRE_MAP.get(query.mood, ["Drama", "Comedy"]))
+            elif query.genres:
+                wanted.append(query.genres)
+        keys = list(dict.fromkeys(tuple(genres) for genres in wanted))
+        if keys:
+            vectors = np.stack([self.cols.genre_vector(key) for key in keys], axis=1)
+            overlap = (self.cols.combo_matrix @ vectors).astype(np.float64)
+            for j, key in enumerate(keys):
+                self._genre_scores[key] = overlap[:, j] / max(len(key), 1) * 0.6
+
+    def _genre_score(self, genres: tuple) -> np.ndarray:
+        score = self._genre_scores.get(genres)
+        if score is None:
+            overlap = (self.cols.combo_matrix @ self.cols.genre_vector(genres)).astype(np.float64)
+            score = self._genre_scores[genres] = overlap / max(len(genres), 1) * 0.6
+        return score
+
+    @STAGES.timed("content_based")
+    def content_based_filter(self, user_genres: List[str], exclude_ids: List[int] = None, limit: int = 20,
+                             exclude: RowBitset = None) -> List[tuple]:
+        key = ("content", tuple(user_genres), tuple(exclude_ids or ()), limit)
+        if exclude is not None or key not in self._lists:
+            cols = self.cols
+            top = top_k_grouped(
+                self._genre_score(key[1]), cols.combo_rows, cols.combo_offsets,
+                cols.content_quality, limit, cols.exclusion(exclude_ids, exclude)
+            )
+            results = [(cols.movie(row), score, "content_based") for row, score in top]
+            if exclude is not None:
+                return results
+            self._lists[key] = results
+        return self._lists[key]
+
+    def mood_based_filter(self, mood: str, exclude_ids: List[int] = None, limit: int = 20,
+                          exclude: RowBitset = None) -> List[tuple]:
+        return self.content_based_filter(MOOD_GENRE_MAP.get(mood, ["Drama", "Comedy"]), exclude_ids, limit, exclude)
+
+    def popularity_based(self, exclude_ids: List[int] = None, limit: int = 20,
+                         exclude: RowBitset = None) -> List[tuple]:
+        if exclude is not None:
+            return RecommendationEngine.popularity_based(exclude_ids, limit, exclude)
+        key = ("popularity", tuple(exclude_ids or ()), limit)
+        if key not in self._lists:
+            self._lists[key] = RecommendationEngine.popularity_based(exclude_ids, limit)
+        return self._lists[key]
+
+# ============== Feedback Processing ==============
+
+def apply_feedback(profiles: Mapping[int, CompactProfile], feedback: FeedbackRequest) -> CompactProfile:
+    """Apply one feedback event to a set of user profiles (written back through the mapping)"""
+    user_profile = profiles.get(feedback.user_id)
+    if not user_profile:
+        # Create new user profile
+        user_profile = USER_PROFILES.create(feedback.user_id)
+    
+    if feedback.feedback_type == "watch":
+        user_profile.watch(feedback.movie_id)
+        
+        # Update genre preferences based on watched movie
+        movie = CATALOG.get(feedback.movie_id)
+        if movie:
+            user_profile.add_genres(movie.genres)
+    
+    if feedback.rating:
+        user_profile.rate(feedback.movie_id, feedback.rating)
+    
+    profiles[feedback.user_id] = user_profile
+    return user_profile
+
+def effective_rating(profile: CompactProfile, movie_id: int) -> float:
+    """Explicit rating, the implied watch rating, or 0 when the movie is unknown to the user"""
+    rating = profile.rating_of(movie_id)
+    if rating is not None:
+        return rating
+    return DEFAULT_WATCH_RATING if profile.has_watched(movie_id) else 0.0
+
+
+# ============== Response Cache ==============
+
+# Recommendation results keyed by request, tagged per user so feedback only
+# invalidates that user's entries. MOVIE_CACHE_BACKEND=redis shares the cache
+# between workers through a Redis-compatible server at MOVIE_CACHE_URL.
+RESPONSE_CACHE = create_cache(
+    backend=os.environ.get("MOVIE_CACHE_BACKEND", "local"),
+    url=os.environ.get("MOVIE_CACHE_URL"),
+    max_entries=int(os.environ.get("MOVIE_CACHE_SIZE", "10000")),
+    ttl=float(os.environ.get("MOVIE_CACHE_TTL", "300"))
+)
+
+def user_cache_tag(user_id: int) -> str:
+    return f"user:{user_id}"
+
+# Catalog changes affect every cached list
+CATALOG.subscribe(lambda event, movie: RESPONSE_CACHE.clear())
+
+# ============== Trending ==============
+
+# Watch / like events decay with a half-life; MOVIE_TRENDING_MODE=sketch keeps
+# memory bounded (count-min sketch + heavy hitters) for very large catalogs.
+TRENDING = create_trending(
+    mode=os.environ.get("MOVIE_TRENDING_MODE", "window"),
+    half_life=float(os.environ.get("MOVIE_TRENDING_HALF_LIFE", str(6 * 3600))),
+    k=int(os.environ.get("MOVIE_TRENDING_K", "100")),
+    snapshot_interval=float(os.environ.get("MOVIE_TRENDING_REFRESH_SECONDS", "10"))
+)
+
+# ============== Precomputed Recommendations ==============
+
+class PrecomputedRecommendations:
+    """
+    Serves plain per-user recommendations from a table written by precompute.py.
+
+    A user is scored live instead when their feedback is newer than the table
+    (seen in the feedback log past the table's sequence number, or applied
+    since), when the limit exceeds the table's N, or when the served factor
+    set, or the catalog, differs from the one the table was computed with.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.table: Optional[RecommendationTable] = None
+        self.stale_users: set = set()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def reload(self) -> bool:
+        """Open the table on disk if it is newer than the one served; returns True if it changed"""
+        if not os.path.exists(os.path.join(self.path, "meta.json")):
+            return False
+        table = RecommendationTable.open(self.path)
+        if self.table is not None and table.meta.get("created") == self.table.meta.get("created"):
+            return False
+        if table.meta.get("catalog_fingerprint") != CATALOG.columns.fingerprint:
+            print(f"Ignoring precomputed table {self.path}: computed for a different catalog")
+            return False
+        if table.feedback_seq + 1 < FEEDBACK_LOG.first_seq:
+            print(f"Ignoring precomputed table {self.path}: feedback since it was built was pruned from the log")
+            return False
+        stale, scanned = set(), table.feedback_seq
+        for record in FEEDBACK_LOG.replay(scanned):
+            stale.add(record.user_id)
+            scanned = record.seq
+        with self._lock:
+            # Pick up whatever was logged while scanning, then swap
+            stale.update(record.user_id for record in FEEDBACK_LOG.replay(scanned))
+            self.stale_users, self.table = stale, table
+        return True
+
+    def invalidate(self) -> None:
+        self.table = None
+
+    def mark_stale(self, records: List[LogRecord]) -> None:
+        """Route these users to live scoring once their feedback is applied"""
+        with self._lock:
+            if self.table is not None:
+                self.stale_users.update(r.user_id for r in records if r.seq > self.table.feedback_seq)
+
+    @STAGES.timed("precomputed")
+    def lookup(self, user_id: int, limit: int) -> Optional[List[MovieRecommendation]]:
+        """Recommendations equal to ensemble_recommend(user_id, limit=limit) as of the table, or None"""
+        table = self.table
+        model = FACTOR_MODELS.model
+        ranked = None
+        if (table is not None and max(limit, MMR_CANDIDATES) <= table.top_n and user_id not in self.stale_users
+                and table.factor_version == (model.version if model else None)
+                and table.meta.get("catalog_fingerprint") == CATALOG.columns.fingerprint):
+            entries = table.lookup(user_id)
+            if entries is not None:
+                ranked = [(CATALOG.get(movie_id), score, algorithm) for movie_id, score, algorithm in entries]
+                if any(movie is None for movie, _, _ in ranked):
+                    ranked = None
+        if ranked is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return RecommendationEngine.build_recommendations(ranked, limit, USER_PROFILES.get(user_id))
+
+    def stats(self) -> Dict:
+        table = self.table
+        total = self.hits + self.misses
+        return {
+            "loaded": table is not None,
+            "users": len(table) if table is not None else 0,
+            "top_n": table.top_n if table is not None else None,
+            "feedback_seq": table.feedback_seq if table is not None else None,
+            "factor_version": table.factor_version if table is not None else None,
+            "stale_users": len(self.stale_users),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+PRECOMPUTED = PrecomputedRecommendations(
+    os.environ.get("MOVIE_PRECOMPUTED_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "precomputed"))
+)
+CATALOG.subscribe(lambda event, movie: PRECOMPUTED.invalidate())
+
+# ============== Request Execution ==============
+
+# Recommendation, search and catalog-page work runs on a bounded thread pool
+# (see executor.py) so the event loop keeps serving /health and cheap
+# endpoints while it computes. Past MOVIE_EXECUTOR_MAX_PENDING pending calls
+# requests get 503, past MOVIE_REQUEST_DEADLINE_SECONDS they get 504, and
+# identical concurrent requests share one computation. Feedback is applied
+# on a worker thread while holding STATE_LOCK exclusively, so pooled calls
+# never see a half-applied batch; handlers must read profiles and models
+# through the pool too, never directly on the loop.
+STATE_LOCK = SharedExclusiveLock()
+EXECUTOR = BoundedExecutor(
+    workers=int(os.environ.get("MOVIE_EXECUTOR_THREADS", str(min(4, os.cpu_count() or 1)))),
+    max_pending=int(os.environ.get("MOVIE_EXECUTOR_MAX_PENDING", "64")),
+    lock=STATE_LOCK
+)
+REQUEST_DEADLINE_SECONDS = float(os.environ.get("MOVIE_REQUEST_DEADLINE_SECONDS", "5"))
+
+async def offload(fn: Callable, *args, key=None):
+    """Run fn(*args) on EXECUTOR, coalescing on `key`, with the API's overload / deadline responses"""
+    try:
+        return await EXECUTOR.run(fn, *args, key=key, timeout=REQUEST_DEADLINE_SECONDS)
+    except Overloaded:
+        raise HTTPException(status_code=503, detail="Server is busy, retry shortly", headers={"Retry-After": "1"})
+    except DeadlineExceeded:
+        raise HTTPException(status_code=504, detail="Request deadline exceeded")
+
+# ============== Feedback Ingestion ==============
+
+# /feedback only enqueues. A background writer appends each batch to a
+# checksummed, segmented log (MOVIE_FEEDBACK_LOG_DIR) with one fsync per batch,
+# then applies it to profiles and models. The profile store records the last
+# applied sequence number in the same transaction, so a restart replays only
+# the log tail past it. MOVIE_FEEDBACK_READONLY=1 (offline jobs running next to
+# a server) only reads the log and leaves a persistent store untouched.
+FEEDBACK_READONLY = ROLE == "worker" or os.environ.get("MOVIE_FEEDBACK_READONLY", "0") == "1"
+FEEDBACK_LOG = FeedbackLog(
+    os.environ.get("MOVIE_FEEDBACK_LOG_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "feedback")),
+    segment_bytes=int(os.environ.get("MOVIE_FEEDBACK_SEGMENT_BYTES", str(64 << 20))),
+    fsync=os.environ.get("MOVIE_FEEDBACK_FSYNC", "1") != "0",
+    readonly=FEEDBACK_READONLY
+)
+TRENDING_REPLAY_SECONDS = float(os.environ.get("MOVIE_TRENDING_REPLAY_SECONDS", "86400"))
+
+def apply_feedback_batch(records: List[LogRecord]) -> None:
+    """
+    Apply logged events to profiles (one store transaction), models, trending
+    and cache. The transaction, and with it the applied seq, only commits
+    once everything else succeeded; on failure the touched profiles are
+    dropped from memory so they reload as last committed.
+    """
+    if not records:
+        return
+    touched = {}
+    try:
+        with USER_PROFILES.batch():
+            for record in records:
+                touched[record.user_id, record.movie_id] = apply_feedback(USER_PROFILES, record)
+                TRENDING.record(record.movie_id, record.feedback_type, record.timestamp)
+            
+            # Keep the collaborative model fresh without a full retrain. Its state only
+            # depends on each (user, movie) pair's final rating, so repeats in a batch
+            # collapse into one update and neighbour rows are refreshed once.
+            for (user_id, movie_id), profile in touched.items():
+                SEEN_ITEMS.record(user_id, movie_id, profile)
+                value = effective_rating(profile, movie_id)
+                if value:
+                    movie = CATALOG.get(movie_id)
+                    CF_MODEL.update(user_id, movie_id, value, movie.genres if movie else [], defer=True)
+            CF_MODEL.refresh_stale()
+            PRECOMPUTED.mark_stale(records)
+            for user_id in {record.user_id for record in records}:
+                RESPONSE_CACHE.invalidate_tag(user_cache_tag(user_id))
+            USER_PROFILES.set_meta("feedback_seq", records[-1].seq)
+    except BaseException:
+        user_ids = {record.user_id for record in records}
+        USER_PROFILES.evict(user_ids)
+        for user_id in user_ids:
+            SEEN_ITEMS.discard(user_id)
+            RESPONSE_CACHE.invalidate_tag(user_cache_tag(user_id))
+        raise
+
+def replay_feedback() -> int:
+    """Bring profiles up to the end of the log and warm trending from its recent tail"""
+    applied_seq = USER_PROFILES.get_meta("feedback_seq", 0)
+    FEEDBACK_LOG.advance_to(applied_seq)
+    horizon = time.time() - TRENDING_REPLAY_SECONDS
+    pending: List[LogRecord] = []
+    replayed = 0
+    for record in FEEDBACK_LOG.replay():
+        if record.seq > applied_seq:
+            pending.append(record)
+            if len(pending) >= 4096:
+                apply_feedback_batch(pending)
+                replayed += len(pending)
+                pending = []
+        elif record.timestamp >= horizon:
+            TRENDING.record(record.movie_id, record.feedback_type, record.timestamp)
+    apply_feedback_batch(pending)
+    replayed += len(pending)
+    if USER_PROFILES.path != ":memory:" and not FEEDBACK_READONLY:
+        # Older segments are already reflected in the persisted profiles
+        FEEDBACK_LOG.prune(USER_PROFILES.get_meta("feedback_seq", 0), horizon)
+    return replayed
+
+def follow_feedback_batch(records: List[LogRecord]) -> None:
+    """
+    Worker side of apply_feedback_batch: the owner already wrote profiles and
+    the collaborative model, so only this process's copies are refreshed.
+    """
+    user_ids = {record.user_id for record in records}
+    USER_PROFILES.evict(user_ids)
+    for record in records:
+        TRENDING.record(record.movie_id, record.feedback_type, record.timestamp)
+    for user_id in user_ids:
+        SEEN_ITEMS.discard(user_id)
+        RESPONSE_CACHE.invalidate_tag(user_cache_tag(user_id))
+    PRECOMPUTED.mark_stale(records)
+
+def warm_trending(upto_seq: int) -> None:
+    """Trending from the recent log tail up to `upto_seq` (a worker's starting point)"""
+    horizon = time.time() - TRENDING_REPLAY_SECONDS
+    for record in FEEDBACK_LOG.replay():
+        if record.seq > upto_seq:
+            break
+        if record.timestamp >= horizon:
+            TRENDING.record(record.movie_id, record.feedback_type, record.timestamp)
+
+FEEDBACK_FOLLOWER: Optional[shared.FeedbackFollower] = None
+if ROLE == "worker":
+    # The owner (serve.py) logs and applies feedback; this worker forwards it
+    # there and follows whatever the owner has committed to the profile store
+    committed_seq = lambda: USER_PROFILES.get_meta("feedback_seq", 0)
+    STARTUP_SEQ = committed_seq()
+    warm_trending(STARTUP_SEQ)
+    FEEDBACK_FOLLOWER = shared.FeedbackFollower(
+        LogTail(FEEDBACK_LOG.directory, STARTUP_SEQ), committed_seq, follow_feedback_batch,
+        interval=float(os.environ.get("MOVIE_FOLLOW_SECONDS", "0.05")),
+        exclusive=STATE_LOCK.exclusive
+    )
+    FEEDBACK_PIPELINE = shared.OwnerClient(
+        os.path.join(SHARED_DIR, "owner.sock"), FEEDBACK_FOLLOWER,
+        max_batch=int(os.environ.get("MOVIE_FEEDBACK_MAX_BATCH", "4096")),
+        max_queue=int(os.environ.get("MOVIE_FEEDBACK_MAX_QUEUE", "100000"))
+    )
+else:
+    if not FEEDBACK_READONLY or USER_PROFILES.path == ":memory:":
+        replay_feedback()
+
+    # Events applied since startup are reported by the consistency check
+    STARTUP_SEQ = USER_PROFILES.get_meta("feedback_seq", 0)
+
+    FEEDBACK_PIPELINE = FeedbackPipeline(
+        FEEDBACK_LOG, apply_feedback_batch,
+        max_batch=int(os.environ.get("MOVIE_FEEDBACK_MAX_BATCH", "4096")),
+        max_queue=int(os.environ.get("MOVIE_FEEDBACK_MAX_QUEUE", "100000")),
+        exclusive=STATE_LOCK.exclusive
+    )
+
+# ============== Shared State ==============
+
+# Run by the owner under serve.py: publish the arrays workers map instead of
+# rebuilding privately. The catalog (columns plus scoring / query indexes) is
+# written once, unless MOVIE_CATALOG_PATH already carries its indexes; the
+# collaborative neighbour table is republished as feedback changes it, and
+# workers swap versions without a restart.
+SHARED_POLL_SECONDS = float(os.environ.get("MOVIE_SHARED_POLL_SECONDS", "1"))
+
+def publish_catalog() -> str:
+    """Catalog directory for workers to memory-map"""
+    table = CATALOG.columns.table
+    if table.path and all(name in table.indexes for name in CatalogColumns.INDEX_ARRAYS):
+        return table.path
+    path = os.path.join(SHARED_DIR, "catalog")
+    table.save(path, CATALOG.columns.index_arrays())
+    return path
+
+def publish_similarity(keep: int = 3) -> str:
+    """Snapshot the collaborative neighbour rows as of the last applied feedback"""
+    version = shared.publish_snapshot(
+        SIMILARITY_DIR, f"{USER_PROFILES.get_meta('feedback_seq', 0):020d}", CF_MODEL.neighbor_arrays(),
+        {"n_neighbors": CF_MODEL.n_neighbors}
+    )
+    shared.prune_snapshots(SIMILARITY_DIR, keep)
+    return version
+
+def reload_similarity() -> bool:
+    """Worker: swap in the neighbour table the owner published last; True if it changed"""
+    global CF_MODEL
+    version = shared.current_snapshot(SIMILARITY_DIR)
+    if not version or version == CF_MODEL.version:
+        return False
+    CF_MODEL = SharedNeighbors(shared.open_snapshot(SIMILARITY_DIR, version))
+    return True
+
+# ============== Response Encoding ==============
+
+# Hot endpoints return pre-encoded bytes (see payloads.py); the declared
+# response models still document the schema, which the bytes match exactly.
+
+@STAGES.timed("serialize")
+def encode_movies(movies: List[Movie]) -> bytes:
+    return payloads.array(CATALOG.payload(movie) for movie in movies)
+
+@STAGES.timed("serialize")
+def encode_recommendations(recommendations: List[MovieRecommendation]) -> bytes:
+    return payloads.array(
+        payloads.recommendation(CATALOG.payload(rec.movie), rec.score, rec.explanation, rec.algorithm, rec.diversity_tag)
+        for rec in recommendations
+    )
+
+# ============== Service Metrics ==============
+
+# Read from the components' own counters when /metrics is scraped
+def _cache_counts(field: str) -> Dict[tuple, float]:
+    return {
+        ("response",): getattr(RESPONSE_CACHE, field),
+        ("profiles",): getattr(USER_PROFILES, field),
+        ("precomputed",): getattr(PRECOMPUTED, field),
+        ("seen_items",): getattr(SEEN_ITEMS, field),
+    }
+
+def _cache_hit_ratio() -> Dict[tuple, float]:
+    hits, misses = _cache_counts("hits"), _cache_counts("misses")
+    return {key: hits[key] / (hits[key] + misses[key]) if hits[key] + misses[key] else 0.0 for key in hits}
+
+METRICS.callback("movie_cache_hits_total", "Cache hits", lambda: _cache_counts("hits"), "counter", ("cache",))
+METRICS.callback("movie_cache_misses_total", "Cache misses", lambda: _cache_counts("misses"), "counter", ("cache",))
+METRICS.callback("movie_cache_hit_ratio", "Cache hit ratio since start", _cache_hit_ratio, "gauge", ("cache",))
+METRICS.callback("movie_response_cache_entries", "Cached response bodies", lambda: len(RESPONSE_CACHE.backend))
+METRICS.callback("movie_catalog_movies", "Movies in the catalog", lambda: len(CATALOG))
+METRICS.callback("movie_feedback_queued", "Feedback events waiting for the writer",
+                 lambda: FEEDBACK_PIPELINE.queue.qsize())
+METRICS.callback("movie_feedback_events_total", "Feedback events logged and applied",
+                 lambda: FEEDBACK_PIPELINE.events, "counter")
+METRICS.callback("movie_feedback_batches_total", "Feedback group commits",
+                 lambda: FEEDBACK_PIPELINE.batches, "counter")
+METRICS.callback("movie_executor_pending", "Calls queued or running on the request executor",
+                 lambda: EXECUTOR.pending)
+METRICS.callback("movie_executor_calls_total", "Request executor calls by outcome", lambda: {
+    ("completed",): EXECUTOR.completed,
+    ("coalesced",): EXECUTOR.coalesced,
+    ("rejected",): EXECUTOR.rejected,
+    ("deadline_exceeded",): EXECUTOR.expired,
+}, "counter", ("outcome",))
+
 # ============== API Endpoints ==============
 
 @app.get("/")
@@ -598,7 +2276,10 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    """Health check endpoint"""
+    """Health check endpoint (degraded once the feedback writer halted on a failed batch)"""
+    halted = getattr(FEEDBACK_PIPELINE, "error", None)
+    if halted is not None:
+        return {"status": "degraded", "feedback": halted, "timestamp": datetime.now().isoformat()}
     return {"status": "healthy", "timestamp": datetime.now().isoformat()}
 
 @app.get("/movies", response_model=List[Movie])
@@ -608,29 +2289,56 @@ async def get_movies(
     year_max: Optional[int] = Query(None, description="Maximum release year"),
     rating_min: Optional[float] = Query(None, description="Minimum rating"),
     limit: int = Query(50, ge=1, le=100, description="Number of results"),
-    offset: int = Query(0, ge=0, description="Offset for pagination")
+    cursor: Optional[int] = Query(None, description="Keyset cursor: return movies after this movie id"),
+    offset: int = Query(0, ge=0, description="Offset for pagination (prefer cursor)")
 ):
-    """Get all movies with optional filters"""
-    filtered = MOVIES_DB
-    
-    if genre:
-        filtered = [m for m in filtered if genre in m.genres]
-    if year_min:
-        filtered = [m for m in filtered if m.year >= year_min]
-    if year_max:
-        filtered = [m for m in filtered if m.year <= year_max]
-    if rating_min:
-        filtered = [m for m in filtered if m.rating >= rating_min]
+    """Get all movies with optional filters, paginated by keyset cursor"""
+    def compute() -> tuple:
+        page = CATALOG.query(
+            genre=genre,
+            year_min=year_min,
+            year_max=year_max,
+            rating_min=rating_min,
+            after_id=cursor,
+            offset=offset,
+            limit=limit
+        )
+        return encode_movies(page), page[-1].id if len(page) == limit else None
     
-    return filtered[offset:offset + limit]
+    data, next_cursor = await offload(
+        compute, key=("movies", genre, year_min, year_max, rating_min, cursor, offset, limit)
+    )
+    body = payloads.JSONBytesResponse(data)
+    if next_cursor is not None:
+        body.headers["X-Next-Cursor"] = str(next_cursor)
+    return body
 
 @app.get("/movies/{movie_id}", response_model=Movie)
 async def get_movie(movie_id: int):
     """Get a specific movie by ID"""
-    movie = next((m for m in MOVIES_DB if m.id == movie_id), None)
+    movie = CATALOG.get(movie_id)
     if not movie:
         raise HTTPException(status_code=404, detail="Movie not found")
-    return movie
+    return payloads.JSONBytesResponse(CATALOG.payload(movie))
+
+@app.get("/movies/{movie_id}/similar", response_model=List[Movie])
+async def get_similar_movies(
+    movie_id: int,
+    limit: int = Query(10, ge=1, le=50, description="Number of similar movies")
+):
+    """Movies closest to this one in factor space (genre similarity before a model is trained)"""
+    movie = CATALOG.get(movie_id)
+    if not movie:
+        raise HTTPException(status_code=404, detail="Movie not found")
+    
+    model = FACTOR_MODELS.model
+    vector = model.item_vector(movie_id) if model else None
+    if vector is None:
+        similar = RecommendationEngine.content_based_filter(movie.genres, [movie_id], limit)
+        return payloads.JSONBytesResponse(encode_movies([m for m, _, _ in similar]))
+    
+    neighbours = model.nearest(vector, limit, exclude={movie_id})
+    return payloads.JSONBytesResponse(encode_movies([m for m in (CATALOG.get(mid) for mid, _ in neighbours) if m]))
 
 @app.get("/recommendations", response_model=List[MovieRecommendation])
 async def get_recommendations(
@@ -642,107 +2350,343 @@ async def get_recommendations(
     """Get personalized movie recommendations"""
     genre_list = genres.split(",") if genres else None
     
-    recommendations = RecommendationEngine.ensemble_recommend(
-        user_id=user_id,
-        mood=mood,
-        genres=genre_list,
-        limit=limit
-    )
+    def compute() -> bytes:
+        recommendations = None
+        if user_id and not mood and not genre_list:
+            recommendations = PRECOMPUTED.lookup(user_id, limit)
+        if recommendations is None:
+            recommendations = RecommendationEngine.ensemble_recommend(
+                user_id=user_id,
+                mood=mood,
+                genres=genre_list,
+                limit=limit
+            )
+        return encode_recommendations(recommendations)
+    
+    # Encoded response bodies are cached, so a hit costs no serialization and
+    # no trip through the executor. Concurrent misses for the same key compute
+    # once; the cache version keeps a result computed across a feedback
+    # invalidation out of the cache and away from later requests.
+    key = ResponseCache.make_key("recs.json", user_id, mood, tuple(genre_list or ()), limit)
+    tags = [user_cache_tag(user_id)] if user_id is not None else []
+    body = RESPONSE_CACHE.get(key)
+    if body is None:
+        version = RESPONSE_CACHE.version(tags)
+        
+        def compute_and_store() -> bytes:
+            body = compute()
+            RESPONSE_CACHE.put(key, body, tags, version)
+            return body
+        
+        body = await offload(compute_and_store, key=(key, version))
     
-    return recommendations
+    return payloads.JSONBytesResponse(body)
+
+BATCH_MAX_REQUESTS = int(os.environ.get("MOVIE_BATCH_MAX_REQUESTS", "10000"))
+# Requests computed per executor call; the event loop only streams finished chunks
+BATCH_CHUNK = int(os.environ.get("MOVIE_BATCH_CHUNK", "64"))
+
+@app.post("/recommendations/batch")
+async def batch_recommendations(batch: BatchRecommendationRequest):
+    """
+    Recommendations for many requests at once, streamed as NDJSON: one
+    BatchRecommendationResult per line, in request order. Each result equals
+    what /recommendations computes for the same user / mood / genres.
+    
+    Lines are computed in chunks on the executor, each with its own deadline.
+    Overload or a missed deadline on the first chunk answers 503 / 504; on a
+    later one the stream ends early, with fewer lines than requests.
+    """
+    if len(batch.requests) > BATCH_MAX_REQUESTS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_REQUESTS} requests per batch")
+    shared: List[SharedCandidates] = []
+    
+    def compute(start: int) -> bytes:
+        if not shared:
+            shared.append(SharedCandidates(batch.requests))
+        lines = []
+        for index in range(start, min(start + BATCH_CHUNK, len(batch.requests))):
+            query = batch.requests[index]
+            recommendations = RecommendationEngine.ensemble_recommend(
+                user_id=query.user_id,
+                mood=query.mood,
+                genres=query.genres,
+                exclude_ids=query.exclude_ids,
+                limit=query.limit,
+                shared=shared[0]
+            )
+            lines.append(b"".join((
+                b'{"index":', str(index).encode("ascii"),
+                b',"user_id":', payloads.encode_optional_int(query.user_id),
+                b',"recommendations":', encode_recommendations(recommendations),
+                b"}\n",
+            )))
+        return b"".join(lines)
+    
+    # The first chunk is computed before the response starts, so its errors keep their status codes
+    first = await offload(compute, 0) if batch.requests else b""
+    
+    async def chunks():
+        yield first
+        for start in range(BATCH_CHUNK, len(batch.requests), BATCH_CHUNK):
+            try:
+                yield await offload(compute, start)
+            except HTTPException as e:
+                print(f"Batch stream ended at request {start}: {e.detail}")
+                return
+    
+    return StreamingResponse(chunks(), media_type="application/x-ndjson")
 
 @app.get("/search", response_model=List[Movie])
 async def search_movies(
     query: str = Query(..., min_length=1, description="Search query"),
     limit: int = Query(20, ge=1, le=50, description="Number of results")
 ):
-    """Search movies by title, description, cast, or director"""
-    query_lower = query.lower()
-    results = []
-    
-    for movie in MOVIES_DB:
-        # Search in title, description, director, and cast
-        if (query_lower in movie.title.lower() or
-            query_lower in movie.description.lower() or
-            query_lower in movie.director.lower() or
-            any(query_lower in actor.lower() for actor in movie.cast)):
-            results.append(movie)
+    """Search movies by title, description, cast, or director (BM25 relevance)"""
+    def compute() -> bytes:
+        hits = search_hits(query, limit)
+        return encode_movies([CATALOG.get(movie_id) for movie_id, _ in hits])
     
-    # Sort by relevance (title matches first, then by rating)
-    results.sort(key=lambda m: (
-        query_lower in m.title.lower(),
-        m.rating
-    ), reverse=True)
+    return payloads.JSONBytesResponse(await offload(compute, key=("search", query, limit)))
+
+@app.get("/search/suggest", response_model=List[Suggestion])
+async def suggest(
+    query: str = Query(..., min_length=1, description="Partial title or name as typed"),
+    limit: int = Query(8, ge=1, le=10, description="Number of suggestions")
+):
+    """Autocomplete titles and people by prefix, tolerating typos"""
+    def compute() -> List[Suggestion]:
+        return [
+            Suggestion(
+                text=entry.text,
+                kind=entry.kind,
+                movie_ids=sorted(entry.movies, key=entry.movies.get, reverse=True)[:5],
+                popularity=entry.weight
+            )
+            for entry in search_indexes()[1].suggest(query, limit)
+        ]
     
-    return results[:limit]
+    # The first call builds the indexes, so like /search this runs on the pool
+    return await offload(compute, key=("suggest", query, limit))
 
 @app.get("/trending", response_model=List[MovieRecommendation])
 async def get_trending(
     limit: int = Query(10, ge=1, le=20, description="Number of trending movies")
 ):
     """Get currently trending movies"""
-    trending = RecommendationEngine.popularity_based(limit=limit)
-    
-    recommendations = []
-    for movie, score, algo in trending:
-        rec = MovieRecommendation(
-            movie=movie,
-            score=score,
-            explanation="Trending now" if movie.year >= 2022 else "All-time favorite",
-            algorithm="popularity",
-            diversity_tag="trending" if movie.year >= 2022 else "similar"
-        )
-        recommendations.append(rec)
+    items = []
+    trending = [(CATALOG.get(movie_id), score) for movie_id, score in TRENDING.top(limit)]
+    trending = [(movie, score) for movie, score in trending if movie is not None]
+    if trending:
+        top_score = trending[0][1]
+        for movie, score in trending:
+            items.append(payloads.recommendation(
+                CATALOG.payload(movie), score / top_score, "Trending now", "trending", "trending"
+            ))
+    
+    # Too little recent activity: fill with the static popularity ranking
+    if len(items) < limit:
+        seen = [movie.id for movie, _ in trending]
+        for movie, score, algo in RecommendationEngine.popularity_based(seen, limit - len(items)):
+            items.append(payloads.recommendation(
+                CATALOG.payload(movie),
+                score,
+                "Trending now" if movie.year >= 2022 else "All-time favorite",
+                algo,
+                "trending" if movie.year >= 2022 else "similar"
+            ))
     
-    return recommendations
+    return payloads.JSONBytesResponse(payloads.array(items))
 
 @app.get("/genres", response_model=List[str])
 async def get_genres():
     """Get all available genres"""
-    all_genres = set()
-    for movie in MOVIES_DB:
-        all_genres.update(movie.genres)
-    return sorted(list(all_genres))
+    return sorted(CATALOG.genres())
 
 @app.post("/feedback")
 async def submit_feedback(feedback: FeedbackRequest):
-    """Submit user feedback for a movie"""
-    # In production, this would update the user profile and trigger model retraining
-    
-    user_profile = USER_PROFILES.get(feedback.user_id)
-    if not user_profile:
-        # Create new user profile
-        USER_PROFILES[feedback.user_id] = UserProfile(
-            user_id=feedback.user_id,
-            preferred_genres=[],
-            watch_history=[],
-            ratings={}
-        )
-        user_profile = USER_PROFILES[feedback.user_id]
-    
-    if feedback.feedback_type == "watch":
-        if feedback.movie_id not in user_profile.watch_history:
-            user_profile.watch_history.append(feedback.movie_id)
-        
-        # Update genre preferences based on watched movie
-        movie = next((m for m in MOVIES_DB if m.id == feedback.movie_id), None)
-        if movie:
-            for genre in movie.genres:
-                if genre not in user_profile.preferred_genres:
-                    user_profile.preferred_genres.append(genre)
+    """Submit user feedback for a movie (logged and applied by the background writer)"""
+    if not FEEDBACK_PIPELINE.submit(feedback):
+        raise HTTPException(status_code=503, detail="Feedback queue is full")
+    return {"status": "success", "message": "Feedback recorded"}
+
+# `state_consistent` is the invariant: the incremental rating rows, co-occurrence
+# counts, norms and genre affinities equal a rebuild's. Neighbour similarities of
+# items that only co-occur with updated movies are refreshed lazily, so
+# `consistent` also requires max_similarity_drift <= max_drift.
+CONSISTENCY_MAX_DRIFT = float(os.environ.get("MOVIE_CONSISTENCY_MAX_DRIFT", "0.1"))
+
+@app.get("/model/consistency")
+async def model_consistency(
+    max_drift: float = Query(CONSISTENCY_MAX_DRIFT, ge=0, description="Largest neighbour similarity drift still reported as consistent")
+):
+    """
+    Compare the incrementally updated CF model against a rebuild from the
+    stored profiles, which the feedback writer commits together with the
+    model updates (so both reflect the same applied seq)
+    """
+    if ROLE == "worker":
+        raise HTTPException(status_code=409, detail="The collaborative model is maintained by the owner process")
+    await FEEDBACK_PIPELINE.flush()
     
-    if feedback.rating:
-        user_profile.ratings[feedback.movie_id] = feedback.rating
+    def check() -> Dict:
+        # Shared hold: no feedback batch is applied between the rebuild and the comparison
+        with STATE_LOCK.shared():
+            rebuilt = ItemSimilarityModel.build(USER_PROFILES.scan(), CATALOG, CF_MODEL.n_neighbors)
+            report = CF_MODEL.compare(rebuilt, max_drift=max_drift)
+            report["feedback_seq"] = USER_PROFILES.get_meta("feedback_seq", 0)
+        report["events"] = report["feedback_seq"] - STARTUP_SEQ
+        return report
     
-    return {"status": "success", "message": "Feedback recorded"}
+    # A full rebuild can outlast the request deadline, so it bypasses the executor
+    return await asyncio.to_thread(check)
+
+@app.get("/feedback/stats")
+async def feedback_stats():
+    """Feedback queue depth, group-commit batch sizes and log position"""
+    return FEEDBACK_PIPELINE.stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Request, stage and candidate histograms plus cache / queue counters (Prometheus text format)"""
+    return PlainTextResponse(METRICS.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/metrics/traces")
+async def recent_traces(limit: int = Query(50, ge=1, le=1000)):
+    """Most recent sampled per-request stage breakdowns (MOVIE_TRACE_SAMPLE_RATE), newest first"""
+    return list(TRACES)[::-1][:limit]
+
+@app.get("/precomputed/stats")
+async def precomputed_stats():
+    """Precomputed table in use, stale users and hit rate"""
+    return PRECOMPUTED.stats()
+
+@app.get("/executor/stats")
+async def executor_stats():
+    """Request executor load: pending calls, coalesced waiters, 503 / 504 counts"""
+    return EXECUTOR.stats()
+
+@app.get("/shards/stats")
+async def shard_stats():
+    """Catalog shards: rows per shard, fan-out calls and their mean latency"""
+    if SHARDS is None:
+        return {"shards": 0}
+    return {**SHARDS.stats(), "serving": catalog_shards(CATALOG.columns) is not None}
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Recommendation cache size, hit rate and invalidations"""
+    return RESPONSE_CACHE.stats()
 
 @app.get("/user/{user_id}/profile", response_model=UserProfile)
 async def get_user_profile(user_id: int):
     """Get user profile"""
-    profile = USER_PROFILES.get(user_id)
-    if not profile:
+    # Read on the executor: the feedback writer holds the store while it applies a batch
+    def compute() -> Optional[Dict]:
+        profile = USER_PROFILES.get(user_id)
+        return profile.as_dict() if profile else None
+    
+    fields = await offload(compute)
+    if not fields:
         raise HTTPException(status_code=404, detail="User not found")
-    return profile
+    return UserProfile(**fields)
+
+@app.get("/profiles/stats")
+async def profile_stats():
+    """Profile store size, LRU hit rate and load latency"""
+    return await asyncio.to_thread(USER_PROFILES.stats)
+
+@app.post("/model/reload")
+async def reload_model():
+    """Hot-swap the latest trained factor set without dropping requests"""
+    changed = await asyncio.to_thread(FACTOR_MODELS.reload)
+    if changed:
+        RESPONSE_CACHE.clear()
+    model = FACTOR_MODELS.model
+    return {
+        "reloaded": changed,
+        "version": model.version if model else None,
+        "meta": model.meta if model else None
+    }
+
+@app.on_event("startup")
+async def start_catalog_shards():
+    """
+    Fork the catalog shard workers (MOVIE_SHARDS > 0) and wait until they have built their indexes.
+    Registered first and run on the loop thread, so the fork happens before any startup hook or
+    request starts a thread; without fork, requests keep using the local indexes.
+    """
+    global SHARDS
+    if SHARD_COUNT > 0 and SHARDS is None:
+        try:
+            SHARDS = ShardPool(CATALOG.columns, SHARD_COUNT, content_top_k, popularity_top_k)
+        except ShardError as e:
+            print(f"Catalog shards disabled: {e}")
+
+@app.on_event("startup")
+async def start_model_watcher():
+    """Load the current factor set and precomputed table, and poll for new versions in the background"""
+    await asyncio.to_thread(FACTOR_MODELS.reload)
+    await asyncio.to_thread(PRECOMPUTED.reload)
+
+    async def watch():
+        while True:
+            await asyncio.sleep(MODEL_POLL_SECONDS)
+            try:
+                if await asyncio.to_thread(FACTOR_MODELS.reload):
+                    RESPONSE_CACHE.clear()
+                await asyncio.to_thread(PRECOMPUTED.reload)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Factor model reload failed: {e}")
+
+    if MODEL_POLL_SECONDS > 0:
+        asyncio.get_running_loop().create_task(watch())
+
+@app.on_event("startup")
+async def start_trending_refresh():
+    """Rematerialize the trending top-K on a fixed interval, off the event loop"""
+    async def refresh():
+        while True:
+            await asyncio.to_thread(TRENDING.refresh)
+            await asyncio.sleep(TRENDING.snapshot_interval)
+
+    asyncio.get_running_loop().create_task(refresh())
+
+@app.on_event("startup")
+async def start_feedback_writer():
+    """Drain queued feedback into the log and profiles (or to the owner) in the background"""
+    FEEDBACK_PIPELINE.start()
+    if FEEDBACK_FOLLOWER is not None:
+        FEEDBACK_FOLLOWER.start()
+
+@app.on_event("startup")
+async def start_shared_state_watcher():
+    """Worker: pick up neighbour tables the owner publishes"""
+    if ROLE != "worker":
+        return
+
+    async def watch():
+        while True:
+            await asyncio.sleep(SHARED_POLL_SECONDS)
+            try:
+                await asyncio.to_thread(reload_similarity)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Neighbour table reload failed: {e}")
+
+    asyncio.get_running_loop().create_task(watch())
+
+@app.on_event("shutdown")
+async def stop_feedback_writer():
+    """Commit whatever is still queued before exiting"""
+    await FEEDBACK_PIPELINE.stop()
+    EXECUTOR.shutdown()
+
+@app.on_event("shutdown")
+async def stop_catalog_shards():
+    global SHARDS
+    if SHARDS is not None:
+        SHARDS.close()
+        SHARDS = None
 
 # ============== Run Server ==============
 
@@ -750,5 +2694,5 @@ if __name__ == "__main__":
     import uvicorn
     print("Starting Movie Recommendation Engine API...")
     print("Model: Ensemble (Collaborative + Content-Based + Popularity)")
-    print("Movies in database:", len(MOVIES_DB))
+    print("Movies in database:", len(CATALOG))
     uvicorn.run(app, host="0.0.0.0", port=8001)
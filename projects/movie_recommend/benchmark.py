@@ -0,0 +1,369 @@
+"""
+Micro-benchmarks and load harness for the Movie Recommendation Engine
+
+Run against generated data (see synthetic.py) so results reflect a catalog
+and user base of realistic size and skew:
+
+    python synthetic.py --out data/synthetic --movies 100000 --users 50000 --ratings 2000000
+    export MOVIE_CATALOG_PATH=data/synthetic/catalog MOVIE_PROFILE_DB=data/synthetic/profiles.db
+
+micro: times each RecommendationEngine method and search in-process, and the
+       MMR re-rank against the swap it replaced (1000 candidates, top 50).
+load:  drives the ASGI app in-process over httpx with N concurrent clients and
+       reports p50 / p95 / p99 latency and throughput per endpoint.
+shards: sharded candidate generation and search (see shards.py) for each
+       --shard-counts value (0 = unsharded), with --concurrency calling
+       threads like the request executor. Gains need a core per shard.
+
+Either mode can save its report as a baseline (--save) and compare a later
+run against one (--baseline); the exit status is 1 when any benchmark's p95
+grows or its throughput drops by more than --tolerance.
+
+The load mix includes POST /feedback, which is logged and applied like in
+production: point MOVIE_PROFILE_DB / MOVIE_FEEDBACK_LOG_DIR at generated data,
+not at a live deployment's files.
+
+Usage:
+    python benchmark.py micro --iterations 200 --save data/bench/micro.json
+    python benchmark.py load --concurrency 32 --requests 500 --baseline data/bench/load.json
+    python benchmark.py shards --shard-counts 0 2 4 --concurrency 4 --iterations 400
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# ============== Reporting ==============
+
+def summarize(latencies: List[float], elapsed: float, errors: int = 0) -> Dict[str, float]:
+    """Latency percentiles (ms) and throughput (ops/s) for one benchmark"""
+    ms = np.asarray(latencies, dtype=np.float64) * 1000.0
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99]) if len(ms) else (0.0, 0.0, 0.0)
+    return {
+        "count": len(ms),
+        "errors": errors,
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "mean_ms": round(float(ms.mean()), 3) if len(ms) else 0.0,
+        "throughput": round(len(ms) / elapsed, 1) if elapsed > 0 else 0.0,
+    }
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"{'benchmark':<32} {'count':>7} {'err':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'ops/s':>10}")
+    for name, row in report["results"].items():
+        print(f"{name:<32} {row['count']:>7} {row['errors']:>5} {row['p50_ms']:>9.3f} {row['p95_ms']:>9.3f} "
+              f"{row['p99_ms']:>9.3f} {row['throughput']:>10.1f}")
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Regressions of `report` against `baseline`: p95 or throughput worse by more than `tolerance`"""
+    regressions = []
+    for name, base in baseline["results"].items():
+        row = report["results"].get(name)
+        if row is None:
+            continue
+        if base["p95_ms"] > 0 and row["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {row['p95_ms']:.3f} ms vs baseline {base['p95_ms']:.3f} ms")
+        if base["throughput"] > 0 and row["throughput"] < base["throughput"] * (1 - tolerance):
+            regressions.append(f"{name}: {row['throughput']:.1f} ops/s vs baseline {base['throughput']:.1f} ops/s")
+        if row["errors"] > base.get("errors", 0):
+            regressions.append(f"{name}: {row['errors']} errors vs baseline {base.get('errors', 0)}")
+    return regressions
+
+def environment(backend) -> Dict[str, Any]:
+    return {
+        "catalog_movies": len(backend.CATALOG),
+        "users": len(backend.USER_PROFILES),
+        "python": sys.version.split()[0],
+        "created": time.time(),
+    }
+
+# ============== Micro-benchmarks ==============
+
+def time_calls(fn: Callable[[int], Any], iterations: int, warmup: int = 5) -> Dict[str, float]:
+    """Call fn(i) `iterations` times (after `warmup` untimed calls)"""
+    for i in range(warmup):
+        fn(i)
+    latencies = []
+    started = time.perf_counter()
+    for i in range(iterations):
+        call_started = time.perf_counter()
+        fn(i)
+        latencies.append(time.perf_counter() - call_started)
+    return summarize(latencies, time.perf_counter() - started)
+
+_loop = None
+
+def run_coroutine(coro) -> Any:
+    """Result of an endpoint coroutine, run on one reused event loop (endpoints await the executor)"""
+    global _loop
+    if _loop is None:
+        _loop = asyncio.new_event_loop()
+    return _loop.run_until_complete(coro)
+
+def swap_rerank(backend, ranked: List[tuple], limit: int) -> list:
+    """The re-rank MMR replaced, kept as a reference: move one new-genre pick into the top 5"""
+    engine = backend.RecommendationEngine
+    recommendations = [
+        backend.MovieRecommendation(movie=movie, score=min(score, 1.0), algorithm=algorithm,
+                                    explanation=engine.generate_explanation(movie, algorithm, None),
+                                    diversity_tag=engine.get_diversity_tag(movie, algorithm))
+        for movie, score, algorithm in ranked[:limit]
+    ]
+    if len(recommendations) >= 5:
+        seen_genres = {genre for rec in recommendations[:5] for genre in rec.movie.genres}
+        if len(seen_genres) <= 3:
+            for rec in recommendations[5:]:
+                if set(rec.movie.genres) - seen_genres:
+                    recommendations.remove(rec)
+                    recommendations.insert(4, rec)
+                    break
+    return recommendations
+
+def rerank_candidates(backend, size: int, seed: int = 0) -> List[tuple]:
+    """`size` popular movies as an ensemble candidate list, scores descending"""
+    cols = backend.CATALOG.columns
+    rows = cols.popularity_rows[:size]
+    scores = np.sort(np.random.default_rng(seed).random(len(rows)))[::-1]
+    return [(cols.movie(row), float(score), "content_based") for row, score in zip(rows, scores)]
+
+def micro_benchmarks(backend, iterations: int, seed: int = 0) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    engine = backend.RecommendationEngine
+    user_ids = list(backend.USER_PROFILES)[:100_000] or [1]
+    genres = sorted(backend.CATALOG.genres())
+    moods = list(backend.MOOD_GENRE_MAP)
+    movie_ids = [movie.id for movie in backend.CATALOG.query(limit=1000)]
+    titles = [backend.CATALOG.get(movie_id).title.split()[0] for movie_id in movie_ids[:200]]
+    backend.search_indexes()  # built on first use, which would blow the request deadline
+
+    users = [rng.choice(user_ids) for _ in range(iterations + 5)]
+    genre_lists = [rng.sample(genres, min(2, len(genres))) for _ in range(iterations + 5)]
+    mood_list = [rng.choice(moods) for _ in range(iterations + 5)]
+    excludes = [rng.sample(movie_ids, min(10, len(movie_ids))) for _ in range(iterations + 5)]
+    queries = [rng.choice(titles) for _ in range(iterations + 5)]
+    ranked = rerank_candidates(backend, 1000, seed)
+
+    cases = {
+        "content_based_filter": lambda i: engine.content_based_filter(genre_lists[i], excludes[i], 20),
+        "collaborative_filter": lambda i: engine.collaborative_filter(users[i], excludes[i], 20),
+        "popularity_based": lambda i: engine.popularity_based(excludes[i], 20),
+        "factor_based": lambda i: engine.factor_based(users[i], excludes[i], 20),
+        "mood_based_filter": lambda i: engine.mood_based_filter(mood_list[i], excludes[i], 20),
+        "ensemble_recommend[user]": lambda i: engine.ensemble_recommend(user_id=users[i], limit=20),
+        "ensemble_recommend[mood]": lambda i: engine.ensemble_recommend(mood=mood_list[i], limit=20),
+        "ensemble_recommend[genres]": lambda i: engine.ensemble_recommend(genres=genre_lists[i], limit=20),
+        "search_movies": lambda i: run_coroutine(backend.search_movies(query=queries[i], limit=20)),
+        # Final re-rank of C=1000 candidates down to k=50
+        "rerank[mmr]": lambda i: engine.build_recommendations(ranked, 50, None, backend.MMR_LAMBDA, len(ranked)),
+        "rerank[swap]": lambda i: swap_rerank(backend, ranked, 50),
+    }
+    return {
+        "mode": "micro",
+        "environment": environment(backend),
+        "results": {name: time_calls(fn, iterations) for name, fn in cases.items()},
+    }
+
+# ============== Sharding ==============
+
+def time_concurrent(fn: Callable[[int], Any], iterations: int, concurrency: int, warmup: int = 5) -> Dict[str, float]:
+    """Call fn(i) `iterations` times from `concurrency` threads (after `warmup` untimed calls)"""
+    for i in range(warmup):
+        fn(i)
+    latencies = []
+
+    def timed(i: int) -> None:
+        call_started = time.perf_counter()
+        fn(i)
+        latencies.append(time.perf_counter() - call_started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(timed, range(iterations)))
+    return summarize(latencies, time.perf_counter() - started)
+
+def shard_benchmarks(backend, shard_counts: List[int], iterations: int, concurrency: int,
+                     seed: int = 0) -> Dict[str, Any]:
+    from shards import ShardPool
+
+    rng = random.Random(seed)
+    engine = backend.RecommendationEngine
+    cols = backend.CATALOG.columns
+    genres = sorted(backend.CATALOG.genres())
+    moods = list(backend.MOOD_GENRE_MAP)
+    movie_ids = [movie.id for movie in backend.CATALOG.query(limit=1000)]
+    titles = [backend.CATALOG.get(movie_id).title.split()[0] for movie_id in movie_ids[:200]]
+    backend.search_indexes()  # the unsharded run should not pay for building it
+
+    genre_lists = [rng.sample(genres, min(2, len(genres))) for _ in range(iterations + 5)]
+    mood_list = [rng.choice(moods) for _ in range(iterations + 5)]
+    excludes = [rng.sample(movie_ids, min(10, len(movie_ids))) for _ in range(iterations + 5)]
+    queries = [rng.choice(titles) for _ in range(iterations + 5)]
+
+    cases = {
+        "content_based_filter": lambda i: engine.content_based_filter(genre_lists[i], excludes[i], 100),
+        "popularity_based": lambda i: engine.popularity_based(excludes[i], 100),
+        "mood_based_filter": lambda i: engine.mood_based_filter(mood_list[i], excludes[i], 100),
+        "search": lambda i: backend.search_hits(queries[i], 20),
+    }
+    results = {}
+    for count in shard_counts:
+        backend.SHARDS = ShardPool(cols, count, backend.content_top_k, backend.popularity_top_k) if count else None
+        try:
+            for name, fn in cases.items():
+                results[f"{name}[shards={count}]"] = time_concurrent(fn, iterations, concurrency)
+        finally:
+            if backend.SHARDS is not None:
+                backend.SHARDS.close()
+            backend.SHARDS = None
+    return {
+        "mode": "shards",
+        "environment": dict(environment(backend), concurrency=concurrency, cpus=os.cpu_count()),
+        "results": results,
+    }
+
+# ============== Load Harness ==============
+
+def load_plan(backend, requests: int, seed: int = 0) -> Dict[str, List[tuple]]:
+    """Per endpoint, `requests` randomized (method, url, json body) calls"""
+    rng = random.Random(seed)
+    user_ids = list(backend.USER_PROFILES)[:100_000] or [1]
+    genres = sorted(backend.CATALOG.genres())
+    moods = list(backend.MOOD_GENRE_MAP)
+    movie_ids = [movie.id for movie in backend.CATALOG.query(limit=1000)]
+    titles = [backend.CATALOG.get(movie_id).title for movie_id in movie_ids[:200]]
+
+    def feedback(_):
+        return {"user_id": rng.choice(user_ids), "movie_id": rng.choice(movie_ids),
+                "feedback_type": rng.choice(["watch", "like", "skip"]), "rating": round(rng.uniform(1, 10), 1)}
+
+    def batch(_):
+        return {"requests": [{"user_id": rng.choice(user_ids), "limit": 20} for _ in range(16)]}
+
+    endpoints = {
+        "GET /movies": lambda _: ("GET", f"/movies?genre={rng.choice(genres)}&limit=50", None),
+        "GET /movies/{id}": lambda _: ("GET", f"/movies/{rng.choice(movie_ids)}", None),
+        "GET /movies/{id}/similar": lambda _: ("GET", f"/movies/{rng.choice(movie_ids)}/similar", None),
+        "GET /recommendations[user]": lambda _: ("GET", f"/recommendations?user_id={rng.choice(user_ids)}", None),
+        "GET /recommendations[mood]": lambda _: ("GET", f"/recommendations?mood={rng.choice(moods)}", None),
+        "GET /recommendations[genres]": lambda _: (
+            "GET", f"/recommendations?genres={','.join(rng.sample(genres, min(2, len(genres))))}", None
+        ),
+        "GET /trending": lambda _: ("GET", "/trending", None),
+        "GET /search": lambda _: ("GET", f"/search?query={rng.choice(titles).split()[0]}", None),
+        "GET /search/suggest": lambda _: ("GET", f"/search/suggest?query={rng.choice(titles)[:3]}", None),
+        "GET /genres": lambda _: ("GET", "/genres", None),
+        "POST /feedback": lambda i: ("POST", "/feedback", feedback(i)),
+        "POST /recommendations/batch": lambda i: ("POST", "/recommendations/batch", batch(i)),
+    }
+    return {name: [make(i) for i in range(requests)] for name, make in endpoints.items()}
+
+async def drive(client, calls: List[tuple], concurrency: int) -> Dict[str, float]:
+    """Send `calls` through `concurrency` concurrent clients and summarize them"""
+    latencies: List[float] = []
+    errors = 0
+    queue: asyncio.Queue = asyncio.Queue()
+    for call in calls:
+        queue.put_nowait(call)
+
+    async def worker():
+        nonlocal errors
+        while not queue.empty():
+            method, url, body = queue.get_nowait()
+            started = time.perf_counter()
+            response = await client.request(method, url, json=body)
+            await response.aread()
+            if response.status_code >= 400:
+                errors += 1
+            else:
+                latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, time.perf_counter() - started, errors)
+
+async def run_load(app, plan: Dict[str, List[tuple]], concurrency: int) -> Dict[str, Dict[str, float]]:
+    """
+    Start the app (startup hooks included) and load each endpoint on its own,
+    so its latency and throughput are not mixed with the others'; then the
+    whole plan shuffled together as "mixed".
+    """
+    results = {}
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            # Warm lazily built indexes and caches the way a running server would have
+            await drive(client, [calls[0] for calls in plan.values()], concurrency)
+            for name, calls in plan.items():
+                results[name] = await drive(client, calls, concurrency)
+            mixed = [call for calls in plan.values() for call in calls]
+            random.Random(0).shuffle(mixed)
+            results["mixed"] = await drive(client, mixed, concurrency)
+    return results
+
+def load_test(backend, concurrency: int, requests: int, seed: int = 0) -> Dict[str, Any]:
+    if httpx is None:
+        raise RuntimeError("The load harness needs httpx (pip install httpx)")
+    backend.search_indexes()  # as a server that had already answered a search would have
+    return {
+        "mode": "load",
+        "environment": dict(environment(backend), concurrency=concurrency),
+        "results": asyncio.run(run_load(backend.app, load_plan(backend, requests, seed), concurrency)),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the recommendation engine")
+    parser.add_argument("mode", choices=["micro", "load", "shards"])
+    parser.add_argument("--iterations", type=int, default=200, help="micro / shards: calls per method")
+    parser.add_argument("--concurrency", type=int, default=32, help="load: concurrent clients; shards: calling threads")
+    parser.add_argument("--shard-counts", type=int, nargs="+", default=[0, 1, 2, 4],
+                        help="shards: shard counts to compare (0 = unsharded)")
+    parser.add_argument("--requests", type=int, default=300, help="load: requests per endpoint")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", help="Write the report here as a baseline")
+    parser.add_argument("--baseline", help="Compare against this saved report")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed relative p95 growth / throughput drop before failing")
+    args = parser.parse_args()
+
+    import backend
+
+    if args.mode == "micro":
+        report = micro_benchmarks(backend, args.iterations, args.seed)
+    elif args.mode == "shards":
+        report = shard_benchmarks(backend, args.shard_counts, args.iterations, args.concurrency, args.seed)
+    else:
+        report = load_test(backend, args.concurrency, args.requests, args.seed)
+    print_report(report)
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved baseline -> {args.save}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%} of {args.baseline}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Packed row bitsets for the Movie Recommendation Engine
+
+A RowBitset marks catalog rows (dense indices 0..N-1 of a catalog snapshot),
+one bit per row, so "has this user seen / excluded it" costs O(1) per row in
+a Python loop and one gather for a whole candidate array, regardless of how
+long the user's history is. A 1M-movie catalog takes 125 KB per set.
+"""
+
+from typing import Iterable
+import numpy as np
+
+class RowBitset:
+    """Set of rows in [0, size) stored as little-endian packed bits"""
+    __slots__ = ("size", "_bytes", "bits")
+
+    def __init__(self, size: int, data: bytes = None):
+        self.size = size
+        self._bytes = bytearray(data) if data is not None else bytearray((size + 7) >> 3)
+        self.bits = np.frombuffer(self._bytes, dtype=np.uint8)  # shares memory with _bytes
+
+    @classmethod
+    def from_rows(cls, size: int, rows: Iterable[int]) -> "RowBitset":
+        bitset = cls(size)
+        bitset.add_rows(rows)
+        return bitset
+
+    def copy(self) -> "RowBitset":
+        return RowBitset(self.size, self._bytes)
+
+    def add(self, row: int) -> None:
+        self._bytes[row >> 3] |= 1 << (row & 7)
+
+    def add_rows(self, rows: Iterable[int]) -> None:
+        rows = np.unique(np.asarray(rows if isinstance(rows, np.ndarray) else list(rows), dtype=np.int64))
+        if len(rows):
+            # OR together the bits landing in the same byte, then one fancy-indexed update
+            positions = rows >> 3
+            values = np.left_shift(1, rows & 7).astype(np.uint8)
+            starts = np.flatnonzero(np.r_[True, positions[1:] != positions[:-1]])
+            self.bits[positions[starts]] |= np.bitwise_or.reduceat(values, starts)
+
+    def with_rows(self, rows: Iterable[int]) -> "RowBitset":
+        """A copy with `rows` added (this set is left unchanged)"""
+        bitset = self.copy()
+        bitset.add_rows(rows)
+        return bitset
+
+    def __contains__(self, row: int) -> bool:
+        return 0 <= row < self.size and (self._bytes[row >> 3] >> (row & 7)) & 1 == 1
+
+    def contains(self, rows: np.ndarray) -> np.ndarray:
+        """Vectorized membership; rows outside [0, size) (e.g. -1 for unknown) are not members"""
+        rows = np.asarray(rows, dtype=np.int64)
+        valid = (rows >= 0) & (rows < self.size)
+        safe = np.where(valid, rows, 0)
+        return valid & ((self.bits[safe >> 3] >> (safe & 7)) & 1).astype(bool)
+
+    def rows(self) -> np.ndarray:
+        """Member rows in ascending order (only non-zero bytes are unpacked)"""
+        nonzero = np.flatnonzero(self.bits)
+        offsets, bits = np.nonzero(np.unpackbits(self.bits[nonzero, None], axis=1, bitorder="little"))
+        return nonzero[offsets].astype(np.int64) * 8 + bits
+
+    def __len__(self) -> int:
+        return int(np.unpackbits(self.bits).sum())
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._bytes)
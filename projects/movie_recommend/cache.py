@@ -0,0 +1,246 @@
+"""
+Response cache for the Movie Recommendation Engine
+
+In-process LRU with TTL expiry and tag-based invalidation (one tag per user,
+so a feedback event drops only that user's entries). The storage backend is
+pluggable: `LocalCacheBackend` for a single worker, `RedisCacheBackend` for a
+Redis-compatible server shared by several workers.
+"""
+
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Set, Tuple
+import pickle
+import threading
+import time
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+_MISSING = object()
+
+# ============== Backends ==============
+
+class CacheBackend(ABC):
+    """Storage interface used by ResponseCache"""
+
+    @abstractmethod
+    def get(self, key: str) -> Any:
+        """Cached value, or the module's _MISSING sentinel"""
+
+    @abstractmethod
+    def set(self, key: str, value: Any, ttl: float, tags: Iterable[str] = ()) -> None:
+        """Store `value` for `ttl` seconds under `key`, tagged for invalidation"""
+
+    @abstractmethod
+    def invalidate_tag(self, tag: str) -> int:
+        """Drop every entry carrying `tag`; returns how many were removed"""
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Drop every entry"""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Number of stored entries"""
+
+
+class LocalCacheBackend(CacheBackend):
+    """
+    Size-bounded LRU with per-entry TTL, safe to share between threads.
+
+    Expired entries are dropped lazily when read; when full, the least
+    recently used entry is evicted.
+    """
+
+    def __init__(self, max_entries: int = 10_000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Any, Tuple[str, ...]]]" = OrderedDict()
+        self._tags: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return _MISSING
+            expires_at, value, _ = item
+            if expires_at < time.monotonic():
+                self._drop(key)
+                return _MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: float, tags: Iterable[str] = ()) -> None:
+        tags = tuple(tags)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + ttl, value, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate_tag(self, tag: str) -> int:
+        with self._lock:
+            keys = self._tags.pop(tag, set())
+            for key in keys:
+                self._drop(key)
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _drop(self, key: str) -> None:
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Redis-compatible backend (Redis, KeyDB, Dragonfly, ...) for multi-worker setups.
+
+    Values are pickled under `<prefix>v:<key>` with a server-side TTL; each tag
+    is a set of keys under `<prefix>t:<tag>`. Size is bounded by the server's
+    maxmemory / eviction policy.
+    """
+
+    def __init__(self, url: str = "redis://localhost:6379/0", prefix: str = "movierec:"):
+        if redis is None:
+            raise RuntimeError("RedisCacheBackend requires the redis package: pip install redis")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key: str) -> Any:
+        raw = self.client.get(self.prefix + "v:" + key)
+        return _MISSING if raw is None else pickle.loads(raw)
+
+    def set(self, key: str, value: Any, ttl: float, tags: Iterable[str] = ()) -> None:
+        pipe = self.client.pipeline()
+        pipe.set(self.prefix + "v:" + key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), px=int(ttl * 1000))
+        for tag in tags:
+            pipe.sadd(self.prefix + "t:" + tag, key)
+            pipe.pexpire(self.prefix + "t:" + tag, int(ttl * 1000))
+        pipe.execute()
+
+    def invalidate_tag(self, tag: str) -> int:
+        tag_key = self.prefix + "t:" + tag
+        keys = self.client.smembers(tag_key)
+        pipe = self.client.pipeline()
+        for key in keys:
+            pipe.delete(self.prefix + "v:" + key.decode())
+        pipe.delete(tag_key)
+        pipe.execute()
+        return len(keys)
+
+    def clear(self) -> None:
+        for key in self.client.scan_iter(self.prefix + "*"):
+            self.client.delete(key)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self.client.scan_iter(self.prefix + "v:*"))
+
+# ============== Response Cache ==============
+
+class ResponseCache:
+    """
+    Keyed result cache with hit/miss accounting in front of a backend.
+
+    A value computed while its tags were invalidated must not be stored, or
+    the cache would serve pre-invalidation results. `version(tags)` before
+    computing and `put(..., version=...)` after detect that through counters
+    bumped on every invalidation (striped by tag hash, so memory stays fixed;
+    a collision only skips a store).
+    """
+
+    VERSION_STRIPES = 4096
+
+    def __init__(self, backend: CacheBackend, ttl: float = 300.0):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.stale_puts = 0
+        self._clears = 0
+        self._tag_versions = [0] * self.VERSION_STRIPES
+
+    @staticmethod
+    def make_key(namespace: str, *parts: Hashable) -> str:
+        return namespace + ":" + repr(parts)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        value = self.backend.get(key)
+        if value is _MISSING:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def version(self, tags: Iterable[str] = ()) -> Tuple[int, ...]:
+        """Opaque token that changes whenever one of `tags` is invalidated or the cache is cleared"""
+        return (self._clears,) + tuple(self._tag_versions[hash(tag) % self.VERSION_STRIPES] for tag in tags)
+
+    def put(self, key: str, value: Any, tags: Iterable[str] = (), version: Tuple[int, ...] = None) -> bool:
+        """Store a value, unless `version` (taken before computing it) is out of date"""
+        tags = tuple(tags)
+        if version is not None and version != self.version(tags):
+            self.stale_puts += 1
+            return False
+        self.backend.set(key, value, self.ttl, tags)
+        return True
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any], tags: Iterable[str] = ()) -> Any:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            tags = tuple(tags)
+            version = self.version(tags)
+            value = compute()
+            self.put(key, value, tags, version)
+        return value
+
+    def invalidate_tag(self, tag: str) -> int:
+        self._tag_versions[hash(tag) % self.VERSION_STRIPES] += 1
+        removed = self.backend.invalidate_tag(tag)
+        self.invalidations += removed
+        return removed
+
+    def clear(self) -> None:
+        self._clears += 1
+        self.backend.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "entries": len(self.backend),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "stale_puts": self.stale_puts,
+            "ttl_seconds": self.ttl,
+        }
+
+
+def create_cache(backend: str = "local", url: Optional[str] = None, max_entries: int = 10_000,
+                 ttl: float = 300.0) -> ResponseCache:
+    """Factory used by the API, driven by environment configuration"""
+    if backend == "redis":
+        return ResponseCache(RedisCacheBackend(url or "redis://localhost:6379/0"), ttl)
+    if backend == "local":
+        return ResponseCache(LocalCacheBackend(max_entries), ttl)
+    raise ValueError(f"Unknown cache backend: {backend}")
@@ -0,0 +1,363 @@
+"""
+Columnar on-disk catalog for the Movie Recommendation Engine
+
+A catalog directory keeps one file per column, so a server memory-maps it
+instead of building Python objects for every title:
+- numeric fields: <field>.npy
+- string fields: <field>.offsets.npy (int64, N + 1) + <field>.blob.npy (UTF-8 bytes)
+- list fields: <field>.lists.npy (int64, N + 1) into a string column (cast) or
+  into dictionary codes <field>.codes.npy with the vocabulary in meta.json (genres)
+- optional precomputed scoring / query indexes: index/<name>.npy
+
+Rows are sorted by movie id.
+
+Usage:
+    python columnar.py --out data/catalog                      # built-in sample catalog
+    python columnar.py --out data/catalog --synthetic 1000000  # synthetic catalog for load tests
+"""
+
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+import argparse
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+# Field name -> storage kind, in Movie field order
+SCHEMA = {
+    "id": "int64",
+    "title": "str",
+    "year": "int32",
+    "genres": "list:code",
+    "rating": "float64",
+    "poster_url": "str",
+    "description": "str",
+    "director": "str",
+    "cast": "list:str",
+    "runtime": "int32",
+    "popularity": "float64",
+    "release_date": "str",
+}
+
+def _load(path: str, mmap_mode: Optional[str]) -> np.ndarray:
+    """np.load as a plain ndarray view (np.memmap's subclass hooks slow down small reads)"""
+    return np.asarray(np.load(path, mmap_mode=mmap_mode))
+
+def _ranges(starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Concatenation of arange(start, start + length) for every pair"""
+    ends = np.cumsum(lengths)
+    return np.repeat(starts - (ends - lengths), lengths) + np.arange(ends[-1] if len(ends) else 0)
+
+# ============== Columns ==============
+
+class StringColumn:
+    """Variable-length strings as an offsets array into one UTF-8 byte blob"""
+
+    def __init__(self, offsets: np.ndarray, blob: np.ndarray):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row: int) -> str:
+        return self.blob[self.offsets[row]:self.offsets[row + 1]].tobytes().decode("utf-8")
+
+    def slice(self, start: int, stop: int) -> List[str]:
+        return [self[row] for row in range(start, stop)]
+
+    @classmethod
+    def from_strings(cls, values: Iterable[str]) -> "StringColumn":
+        encoded = [value.encode("utf-8") for value in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        return cls(offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8).copy())
+
+    def take(self, rows: np.ndarray, chunk: int = 4096) -> "StringColumn":
+        """Gather rows into a new in-memory column (bounded scratch memory)"""
+        rows = np.asarray(rows, dtype=np.int64)
+        starts = self.offsets[rows]
+        lengths = self.offsets[rows + 1] - starts
+        offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        blob = np.empty(offsets[-1], dtype=np.uint8)
+        for begin in range(0, len(rows), chunk):
+            end = min(begin + chunk, len(rows))
+            blob[offsets[begin]:offsets[end]] = self.blob[_ranges(starts[begin:end], lengths[begin:end])]
+        return StringColumn(offsets, blob)
+
+    def concat(self, other: "StringColumn") -> "StringColumn":
+        offsets = np.concatenate([self.offsets, other.offsets[1:] + self.offsets[-1]])
+        return StringColumn(offsets, np.concatenate([self.blob, other.blob]))
+
+    def save(self, path: str, name: str) -> None:
+        np.save(os.path.join(path, f"{name}.offsets.npy"), np.asarray(self.offsets))
+        np.save(os.path.join(path, f"{name}.blob.npy"), np.asarray(self.blob))
+
+    @classmethod
+    def load(cls, path: str, name: str, mmap_mode: Optional[str]) -> "StringColumn":
+        return cls(
+            _load(os.path.join(path, f"{name}.offsets.npy"), mmap_mode),
+            _load(os.path.join(path, f"{name}.blob.npy"), mmap_mode)
+        )
+
+
+class CodeColumn:
+    """Dictionary-encoded strings: int32 codes into a small sorted vocabulary"""
+
+    def __init__(self, codes: np.ndarray, vocab: List[str]):
+        self.codes = codes
+        self.vocab = vocab
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, row: int) -> str:
+        return self.vocab[self.codes[row]]
+
+    def slice(self, start: int, stop: int) -> List[str]:
+        return [self.vocab[code] for code in self.codes[start:stop].tolist()]
+
+    @classmethod
+    def from_strings(cls, values: Iterable[str]) -> "CodeColumn":
+        values = list(values)
+        vocab = sorted(set(values))
+        pos = {value: i for i, value in enumerate(vocab)}
+        return cls(np.fromiter((pos[v] for v in values), dtype=np.int32, count=len(values)), vocab)
+
+    def take(self, rows: np.ndarray) -> "CodeColumn":
+        return CodeColumn(self.codes[rows], self.vocab)
+
+    def concat(self, other: "CodeColumn") -> "CodeColumn":
+        vocab = sorted(set(self.vocab) | set(other.vocab))
+        pos = {value: i for i, value in enumerate(vocab)}
+        remap = lambda column: np.array([pos[v] for v in column.vocab], dtype=np.int32)[column.codes] \
+            if len(column.codes) else np.empty(0, dtype=np.int32)
+        return CodeColumn(np.concatenate([remap(self), remap(other)]), vocab)
+
+    def save(self, path: str, name: str) -> None:
+        np.save(os.path.join(path, f"{name}.codes.npy"), np.asarray(self.codes))
+
+    @classmethod
+    def load(cls, path: str, name: str, mmap_mode: Optional[str], vocab: List[str]) -> "CodeColumn":
+        return cls(_load(os.path.join(path, f"{name}.codes.npy"), mmap_mode), vocab)
+
+
+class ListColumn:
+    """Per-row lists as an offsets array into a flat item column"""
+
+    def __init__(self, offsets: np.ndarray, items):
+        self.offsets = offsets
+        self.items = items
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row: int) -> List[str]:
+        return self.items.slice(int(self.offsets[row]), int(self.offsets[row + 1]))
+
+    @classmethod
+    def from_lists(cls, lists: Iterable[List[str]], item_type) -> "ListColumn":
+        lists = list(lists)
+        offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+        np.cumsum([len(items) for items in lists], out=offsets[1:])
+        return cls(offsets, item_type.from_strings(item for items in lists for item in items))
+
+    def take(self, rows: np.ndarray) -> "ListColumn":
+        rows = np.asarray(rows, dtype=np.int64)
+        starts = self.offsets[rows]
+        lengths = self.offsets[rows + 1] - starts
+        offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        return ListColumn(offsets, self.items.take(_ranges(starts, lengths)))
+
+    def concat(self, other: "ListColumn") -> "ListColumn":
+        offsets = np.concatenate([self.offsets, other.offsets[1:] + self.offsets[-1]])
+        return ListColumn(offsets, self.items.concat(other.items))
+
+# ============== Movie Table ==============
+
+class MovieTable:
+    """
+    Catalog columns in id order, in memory or memory-mapped from disk.
+
+    `indexes` holds optional precomputed arrays saved next to the columns
+    (scoring orders, query indexes); they are only trusted for the exact table
+    they were written with, so `take` / `concat` results carry none.
+    """
+
+    def __init__(self, columns: Dict[str, Any], indexes: Dict[str, np.ndarray] = None, path: str = None):
+        self.columns = columns
+        self.indexes = indexes or {}
+        self.path = path
+
+    def __len__(self) -> int:
+        return len(self.columns["id"])
+
+    def __getitem__(self, name: str):
+        return self.columns[name]
+
+    @property
+    def ids(self) -> np.ndarray:
+        return self.columns["id"]
+
+    def vocab(self, name: str) -> List[str]:
+        return self.columns[name].items.vocab
+
+    def row_of(self, movie_id: int) -> Optional[int]:
+        row = int(np.searchsorted(self.ids, movie_id))
+        return row if row < len(self) and self.ids[row] == movie_id else None
+
+    def record(self, row: int) -> Dict[str, Any]:
+        """One row as plain Python values, keyed like the Movie model"""
+        values = {}
+        for name in SCHEMA:
+            value = self.columns[name][row]
+            values[name] = value.item() if isinstance(value, np.generic) else value
+        return values
+
+    def records(self) -> Iterator[Dict[str, Any]]:
+        for row in range(len(self)):
+            yield self.record(row)
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict[str, Any]]) -> "MovieTable":
+        """Build an in-memory table (later records win on duplicate ids)"""
+        by_id = {record["id"]: record for record in records}
+        rows = [by_id[movie_id] for movie_id in sorted(by_id)]
+        columns = {}
+        for name, kind in SCHEMA.items():
+            values = [record[name] for record in rows]
+            if kind == "str":
+                columns[name] = StringColumn.from_strings(values)
+            elif kind == "list:str":
+                columns[name] = ListColumn.from_lists(values, StringColumn)
+            elif kind == "list:code":
+                columns[name] = ListColumn.from_lists(values, CodeColumn)
+            else:
+                columns[name] = np.array(values, dtype=kind)
+        return cls(columns)
+
+    def take(self, rows: np.ndarray) -> "MovieTable":
+        rows = np.asarray(rows, dtype=np.int64)
+        return MovieTable({name: column[rows] if isinstance(column, np.ndarray) else column.take(rows)
+                           for name, column in self.columns.items()})
+
+    def concat(self, other: "MovieTable") -> "MovieTable":
+        """Rows of both tables, re-sorted by id"""
+        merged = MovieTable({
+            name: np.concatenate([column, other.columns[name]]) if isinstance(column, np.ndarray)
+            else column.concat(other.columns[name])
+            for name, column in self.columns.items()
+        })
+        return merged.take(np.argsort(merged.ids, kind="stable"))
+
+    def save(self, path: str, indexes: Dict[str, np.ndarray] = None) -> None:
+        """
+        Write the table (and optional indexes) as a catalog directory.
+
+        Files go to a staging directory that is renamed into place once
+        complete, so a reader never opens a half-written catalog.
+        """
+        staging = f"{path.rstrip(os.sep)}.{os.getpid()}.tmp"
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(os.path.join(staging, "index"))
+        vocab = {}
+        for name, kind in SCHEMA.items():
+            column = self.columns[name]
+            if isinstance(column, np.ndarray):
+                np.save(os.path.join(staging, f"{name}.npy"), np.asarray(column))
+            elif isinstance(column, StringColumn):
+                column.save(staging, name)
+            else:
+                np.save(os.path.join(staging, f"{name}.lists.npy"), np.asarray(column.offsets))
+                column.items.save(staging, name)
+                if isinstance(column.items, CodeColumn):
+                    vocab[name] = column.items.vocab
+        for name, array in (indexes or {}).items():
+            np.save(os.path.join(staging, "index", f"{name}.npy"), np.asarray(array))
+        with open(os.path.join(staging, "meta.json"), "w") as f:
+            json.dump({"rows": len(self), "vocab": vocab, "indexes": sorted(indexes or {})}, f, indent=2)
+
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.rename(staging, path)
+
+    @classmethod
+    def open(cls, path: str, mmap: bool = True) -> "MovieTable":
+        """Open a catalog directory; columns stay on disk when mmap is set"""
+        mode = "r" if mmap else None
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        columns = {}
+        for name, kind in SCHEMA.items():
+            if kind == "str":
+                columns[name] = StringColumn.load(path, name, mode)
+            elif kind.startswith("list:"):
+                offsets = _load(os.path.join(path, f"{name}.lists.npy"), mode)
+                items = CodeColumn.load(path, name, mode, meta["vocab"][name]) if kind == "list:code" \
+                    else StringColumn.load(path, name, mode)
+                columns[name] = ListColumn(offsets, items)
+            else:
+                columns[name] = _load(os.path.join(path, f"{name}.npy"), mode)
+        indexes = {
+            name: _load(os.path.join(path, "index", f"{name}.npy"), mode)
+            for name in meta.get("indexes", [])
+        }
+        return cls(columns, indexes, path)
+
+# ============== CLI ==============
+
+def synthetic_records(templates: List[Dict[str, Any]], n: int, seed: int = 0) -> Iterator[Dict[str, Any]]:
+    """`n` movies varied from the given templates (random genres, ratings, years)"""
+    rng = np.random.default_rng(seed)
+    vocab = sorted({genre for template in templates for genre in template["genres"]})
+    for start in range(0, n, 65536):
+        size = min(65536, n - start)
+        genre_masks = rng.random((size, len(vocab))) < 0.18
+        ratings = np.round(rng.uniform(3.0, 9.5, size), 1)
+        popularity = np.round(rng.uniform(0.0, 100.0, size), 2)
+        years = rng.integers(1950, 2025, size)
+        picks = rng.integers(0, len(templates), size)
+        for i in range(size):
+            movie_id = start + i + 1
+            template = templates[picks[i]]
+            genres = [vocab[j] for j in np.flatnonzero(genre_masks[i])] or list(template["genres"])
+            yield {
+                **template,
+                "id": movie_id,
+                "title": f"{template['title']} {movie_id}",
+                "year": int(years[i]),
+                "genres": genres,
+                "rating": float(ratings[i]),
+                "popularity": float(popularity[i]),
+                "release_date": f"{years[i]}-01-01",
+            }
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a columnar movie catalog")
+    parser.add_argument("--out", default=os.environ.get("MOVIE_CATALOG_PATH", "data/catalog"))
+    parser.add_argument("--synthetic", type=int, default=0,
+                        help="Generate this many synthetic movies instead of the built-in catalog")
+    parser.add_argument("--no-indexes", action="store_true", help="Do not persist scoring / query indexes")
+    args = parser.parse_args()
+
+    # Always start from the built-in catalog, not one MOVIE_CATALOG_PATH points at
+    os.environ.pop("MOVIE_CATALOG_PATH", None)
+    # Only the catalog is needed: leave a running server's profiles and feedback log alone
+    os.environ.setdefault("MOVIE_PROFILE_DB", ":memory:")
+    os.environ.setdefault("MOVIE_FEEDBACK_READONLY", "1")
+    import backend
+
+    started = time.time()
+    templates = [movie.model_dump() for movie in backend.MOVIES_DB]
+    records = synthetic_records(templates, args.synthetic) if args.synthetic else templates
+    table = MovieTable.from_records(records)
+    indexes = None if args.no_indexes else backend.CatalogColumns(table).index_arrays()
+    table.save(args.out, indexes)
+    print(f"Wrote {len(table)} movies -> {args.out} in {time.time() - started:.1f}s")
+
+if __name__ == "__main__":
+    main()
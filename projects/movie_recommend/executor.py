@@ -0,0 +1,183 @@
+"""
+Off-loop execution for the Movie Recommendation Engine
+
+CPU-bound request work (ensemble scoring, search, filtered catalog pages)
+runs on a bounded thread pool instead of the event loop, so one slow call
+no longer stalls /health and every other in-flight request:
+- admission is bounded: with `max_pending` calls queued or running, `run`
+  raises Overloaded at once (the API answers 503) instead of piling up work
+- every call has a deadline: its waiter gets DeadlineExceeded (504) when it
+  passes, and work nobody waits for any more is dropped if not yet started
+- identical concurrent calls (same key) share one computation and its result
+  (single flight, a cache-stampede guard)
+
+State that the event loop mutates (feedback application) is guarded by a
+SharedExclusiveLock: pooled calls hold it shared, and the loop takes it
+exclusively without blocking while calls drain.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Callable, Dict, Hashable, Optional
+import asyncio
+import contextvars
+import threading
+
+class Overloaded(Exception):
+    """Too many calls pending; the caller should shed load"""
+
+class DeadlineExceeded(Exception):
+    """The call's deadline passed before its result was ready"""
+
+# ============== Shared / Exclusive Lock ==============
+
+class SharedExclusiveLock:
+    """
+    Many shared holders or one exclusive holder. A waiting exclusive holder
+    keeps new shared holders out, so a stream of reads cannot starve writes.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._shared = 0
+        self._exclusive = False
+        self._waiting = 0
+
+    @contextmanager
+    def shared(self):
+        with self._cond:
+            while self._exclusive or self._waiting:
+                self._cond.wait()
+            self._shared += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._shared -= 1
+                if not self._shared:
+                    self._cond.notify_all()
+
+    def acquire_exclusive(self) -> None:
+        with self._cond:
+            self._waiting += 1
+            try:
+                while self._exclusive or self._shared:
+                    self._cond.wait()
+            finally:
+                self._waiting -= 1
+            self._exclusive = True
+
+    def release_exclusive(self) -> None:
+        with self._cond:
+            self._exclusive = False
+            self._cond.notify_all()
+
+    @asynccontextmanager
+    async def exclusive(self):
+        """Exclusive hold for code on the event loop; waiting for shared holders happens off the loop"""
+        with self._cond:
+            acquired = not (self._exclusive or self._shared)
+            self._exclusive = self._exclusive or acquired
+        if not acquired:
+            waiting = asyncio.ensure_future(asyncio.to_thread(self.acquire_exclusive))
+            try:
+                await asyncio.shield(waiting)
+            except asyncio.CancelledError:
+                # The thread still acquires the lock; hand it straight back
+                waiting.add_done_callback(lambda f: f.cancelled() or f.exception() or self.release_exclusive())
+                raise
+        try:
+            yield
+        finally:
+            self.release_exclusive()
+
+# ============== Bounded Executor ==============
+
+class _Flight:
+    __slots__ = ("future", "waiters")
+
+    def __init__(self):
+        self.future: Optional[asyncio.Future] = None
+        self.waiters = 0
+
+class BoundedExecutor:
+    """Thread pool with bounded admission, per-call deadlines and single-flight coalescing"""
+
+    def __init__(self, workers: int = 4, max_pending: int = 64, lock: SharedExclusiveLock = None,
+                 name: str = "movie-executor"):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.lock = lock
+        self.pool = ThreadPoolExecutor(workers, thread_name_prefix=name)
+        self.pending = 0
+        self.completed = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.expired = 0
+        self.dropped = 0
+        self._flights: Dict[Hashable, _Flight] = {}
+
+    def _call(self, flight: _Flight, fn: Callable, args: tuple, context: contextvars.Context) -> Any:
+        if not flight.waiters:
+            self.dropped += 1
+            raise DeadlineExceeded("every waiter gave up before the call started")
+        if self.lock is None:
+            return context.run(fn, *args)
+        with self.lock.shared():
+            return context.run(fn, *args)
+
+    def _finish(self, key: Optional[Hashable], flight: _Flight) -> None:
+        self.pending -= 1
+        self.completed += 1
+        if key is not None and self._flights.get(key) is flight:
+            del self._flights[key]
+        if not flight.future.cancelled():
+            flight.future.exception()  # retrieved here, so an abandoned failure is not logged as unhandled
+
+    async def run(self, fn: Callable, *args, key: Hashable = None, timeout: float = None) -> Any:
+        """
+        fn(*args) on the pool. Calls with the same `key` that overlap share
+        one execution; the key must capture everything the result depends on.
+        """
+        flight = self._flights.get(key) if key is not None else None
+        if flight is not None:
+            self.coalesced += 1
+            flight.waiters += 1
+        else:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise Overloaded(f"{self.pending} calls pending")
+            flight = _Flight()
+            flight.waiters = 1  # counted before the pool can start it
+            # Stage timers and traces live in context variables, so the call runs in a copy of ours
+            flight.future = asyncio.wrap_future(
+                self.pool.submit(self._call, flight, fn, args, contextvars.copy_context())
+            )
+            self.pending += 1
+            flight.future.add_done_callback(lambda _: self._finish(key, flight))
+            if key is not None:
+                self._flights[key] = flight
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(flight.future), timeout)
+        except asyncio.TimeoutError:
+            self.expired += 1
+            raise DeadlineExceeded(f"no result within {timeout}s") from None
+        finally:
+            flight.waiters -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "in_flight_keys": len(self._flights),
+            "completed": self.completed,
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+            "deadline_exceeded": self.expired,
+            "dropped": self.dropped,
+        }
+
+    def shutdown(self) -> None:
+        self.pool.shutdown(wait=False, cancel_futures=True)
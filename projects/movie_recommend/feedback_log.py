@@ -0,0 +1,398 @@
+"""
+Durable feedback ingestion for the Movie Recommendation Engine
+
+`/feedback` only enqueues the event; FeedbackPipeline drains the queue in
+batches, appends each batch to a FeedbackLog with one write + fsync (group
+commit), then hands the logged records to an apply callback that updates
+profiles and models.
+
+FeedbackLog is a directory of segment files named by their first sequence
+number. Each record is framed as
+
+    <payload length: u32> <crc32 of payload: u32> <payload>
+
+with payload = seq, timestamp, user_id, movie_id, rating (NaN if absent),
+watch_time (-1 if absent), then the UTF-8 feedback type. A torn or corrupt
+tail (crash mid-write) is truncated when the log is reopened.
+"""
+
+from contextlib import asynccontextmanager
+from typing import Any, AsyncContextManager, Callable, Iterator, List, NamedTuple, Optional, Tuple
+import asyncio
+import math
+import os
+import struct
+import time
+import zlib
+
+FRAME = struct.Struct("<II")
+RECORD = struct.Struct("<Qdqqdq")
+SEGMENT_SUFFIX = ".log"
+
+class LogRecord(NamedTuple):
+    """One logged feedback event (attribute-compatible with FeedbackRequest)"""
+    seq: int
+    timestamp: float
+    user_id: int
+    movie_id: int
+    feedback_type: str
+    rating: Optional[float]
+    watch_time: Optional[int]
+
+def encode_record(record: LogRecord) -> bytes:
+    payload = RECORD.pack(
+        record.seq, record.timestamp, record.user_id, record.movie_id,
+        math.nan if record.rating is None else record.rating,
+        -1 if record.watch_time is None else record.watch_time
+    ) + record.feedback_type.encode("utf-8")
+    return FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+
+def iter_records(data: bytes) -> Iterator[Tuple[LogRecord, int]]:
+    """Each record framed in `data` with the offset just past it, up to the first torn or corrupt frame"""
+    offset = 0
+    while offset + FRAME.size <= len(data):
+        length, crc = FRAME.unpack_from(data, offset)
+        start, end = offset + FRAME.size, offset + FRAME.size + length
+        if length < RECORD.size or end > len(data) or zlib.crc32(data[start:end]) != crc:
+            break
+        seq, timestamp, user_id, movie_id, rating, watch_time = RECORD.unpack_from(data, start)
+        yield LogRecord(
+            seq, timestamp, user_id, movie_id, data[start + RECORD.size:end].decode("utf-8"),
+            None if math.isnan(rating) else rating, None if watch_time < 0 else watch_time
+        ), end
+        offset = end
+
+def decode_records(data: bytes) -> Tuple[List[LogRecord], int]:
+    """Records framed in `data`, plus the offset where the valid prefix ends"""
+    records, offset = [], 0
+    for record, offset in iter_records(data):
+        records.append(record)
+    return records, offset
+
+def list_segments(directory: str) -> List[Tuple[int, str]]:
+    """(first seq, path) of every segment in `directory`, oldest first"""
+    if not os.path.isdir(directory):
+        return []
+    names = (name for name in os.listdir(directory) if name.endswith(SEGMENT_SUFFIX))
+    return sorted((int(name[:-len(SEGMENT_SUFFIX)]), os.path.join(directory, name)) for name in names)
+
+# ============== Segmented Log ==============
+
+class FeedbackLog:
+    """
+    Append-only, checksummed, segmented event log.
+
+    `readonly` opens the log for replay only (e.g. an offline job next to the
+    server that owns it): nothing is created, truncated or appended.
+    """
+
+    def __init__(self, directory: str, segment_bytes: int = 64 << 20, fsync: bool = True,
+                 readonly: bool = False):
+        if not readonly:
+            os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self.readonly = readonly
+        self.last_seq = 0
+        self._file = None
+        self._size = 0
+
+        segments = self.segments()
+        if segments:
+            # Only the newest segment can hold a torn write
+            path = segments[-1][1]
+            with open(path, "rb") as f:
+                data = f.read()
+            records, valid = decode_records(data)
+            self.last_seq = records[-1].seq if records else segments[-1][0] - 1
+            if not readonly:
+                if valid < len(data):
+                    with open(path, "r+b") as f:
+                        f.truncate(valid)
+                self._file = open(path, "ab")
+                self._size = valid
+
+    def segments(self) -> List[Tuple[int, str]]:
+        """(first seq, path) of every segment, oldest first"""
+        return list_segments(self.directory)
+
+    @property
+    def first_seq(self) -> int:
+        """Oldest sequence number still on disk (last_seq + 1 when the log is empty)"""
+        segments = self.segments()
+        return segments[0][0] if segments else self.last_seq + 1
+
+    def advance_to(self, seq: int) -> None:
+        """Never hand out sequence numbers at or below `seq` (e.g. already applied elsewhere)"""
+        self.last_seq = max(self.last_seq, seq)
+
+    def _roll(self) -> None:
+        if self._file is not None:
+            self._file.close()
+        path = os.path.join(self.directory, f"{self.last_seq + 1:020d}{SEGMENT_SUFFIX}")
+        self._file = open(path, "ab")
+        self._size = 0
+
+    def append(self, events: List[Tuple[float, Any]]) -> List[LogRecord]:
+        """Assign sequence numbers to (timestamp, event) pairs and make them durable together"""
+        if self.readonly:
+            raise PermissionError(f"Feedback log {self.directory} is open read-only")
+        if self._file is None or self._size >= self.segment_bytes:
+            self._roll()
+        records = [
+            LogRecord(self.last_seq + i, timestamp, event.user_id, event.movie_id,
+                      event.feedback_type, event.rating, event.watch_time)
+            for i, (timestamp, event) in enumerate(events, start=1)
+        ]
+        data = b"".join([encode_record(record) for record in records])
+        self._file.write(data)
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self._size += len(data)
+        self.last_seq += len(records)
+        return records
+
+    def replay(self, after_seq: int = 0) -> Iterator[LogRecord]:
+        """Every valid record with seq > after_seq, in order"""
+        segments = self.segments()
+        for i, (first_seq, path) in enumerate(segments):
+            if i + 1 < len(segments) and segments[i + 1][0] <= after_seq + 1:
+                continue
+            with open(path, "rb") as f:
+                data = f.read()
+            # Decoded lazily: a full segment of records would stay in the allocator after replay
+            for record, _ in iter_records(data):
+                if record.seq > after_seq:
+                    yield record
+
+    def prune(self, upto_seq: int, before_time: float = math.inf) -> List[str]:
+        """Delete closed segments whose records are all <= upto_seq and older than before_time"""
+        segments = self.segments()
+        removed = []
+        for (first_seq, path), (next_seq, _) in zip(segments, segments[1:]):
+            if next_seq - 1 <= upto_seq and os.path.getmtime(path) < before_time:
+                os.remove(path)
+                removed.append(path)
+        return removed
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+# ============== Tailing ==============
+
+class LogTail:
+    """
+    Incremental reader over a log another process appends to.
+
+    It remembers the segment and byte offset it stopped at, so each `read`
+    only decodes what was appended since the last one; a write still in
+    progress ends the valid prefix and is picked up next time. Records past
+    `upto_seq` are held back, so a follower can stay behind what the writer
+    has finished applying.
+    """
+
+    def __init__(self, directory: str, after_seq: int = 0):
+        self.directory = directory
+        self.seq = after_seq
+        self._path: Optional[str] = None
+        self._offset = 0
+        self._held: List[LogRecord] = []
+
+    def read(self, upto_seq: float = math.inf) -> List[LogRecord]:
+        """New records with seq <= upto_seq, in order"""
+        while True:
+            segments = list_segments(self.directory)
+            if self._path is None:
+                # Segment holding the next record (the oldest one if it was pruned)
+                older = [path for first_seq, path in segments if first_seq <= self.seq + 1]
+                self._path = older[-1] if older else (segments[0][1] if segments else None)
+                self._offset = 0
+                if self._path is None:
+                    break
+            try:
+                with open(self._path, "rb") as f:
+                    f.seek(self._offset)
+                    data = f.read()
+            except FileNotFoundError:
+                self._path = None
+                continue
+            # Filtered while decoding: catching up from the start of a large
+            # segment would otherwise build every record only to drop it
+            valid = 0
+            for record, valid in iter_records(data):
+                if record.seq > self.seq:
+                    self._held.append(record)
+            self._offset += valid
+            # The writer finishes a segment before starting the next, so a newer
+            # segment listed before this read means this one is complete
+            later = [path for _, path in segments if path > self._path]
+            if not later:
+                break
+            self._path, self._offset = later[0], 0
+
+        ready = 0
+        while ready < len(self._held) and self._held[ready].seq <= upto_seq:
+            ready += 1
+        records, self._held = self._held[:ready], self._held[ready:]
+        if records:
+            self.seq = records[-1].seq
+        return records
+
+# ============== Ingestion Pipeline ==============
+
+class FeedbackHalted(RuntimeError):
+    """The writer stopped after a batch failed; nothing later is logged or applied until restart"""
+
+@asynccontextmanager
+async def _no_lock():
+    yield
+
+class FeedbackPipeline:
+    """
+    asyncio queue in front of the log.
+
+    `submit` is O(1) and never blocks the request. A single writer task takes
+    everything queued (up to `max_batch`), logs it off the event loop, then
+    runs `apply(records)` on a worker thread while holding `exclusive()` (an
+    async context manager), so readers that take the shared side never
+    observe a half-applied batch and the loop keeps serving meanwhile. Code
+    on the loop must therefore not read the state `apply` mutates. Events
+    arriving during an fsync or an apply form the next batch, so the commit
+    rate adapts to load.
+
+    `apply` must record how far it got (e.g. the last applied seq, committed
+    with the state it derived) only when it succeeds. If it raises, the
+    writer halts instead of moving on: later batches would record a seq past
+    the failed records, and a restart would never replay them. The failed
+    range stays in the log, `failed` / `error` say which it is, and
+    `submit` / `put` / `flush` refuse work until the process is restarted and
+    replays it.
+    """
+
+    def __init__(self, log: FeedbackLog, apply: Callable[[List[LogRecord]], None],
+                 max_batch: int = 4096, max_queue: int = 100_000,
+                 exclusive: Callable[[], AsyncContextManager] = None):
+        self.log = log
+        self.apply = apply
+        self.exclusive = exclusive or _no_lock
+        self.max_batch = max_batch
+        self.queue: asyncio.Queue = asyncio.Queue(max_queue)
+        self.events = 0
+        self.batches = 0
+        self.commit_seconds = 0.0
+        self.failed: Optional[Tuple[int, int]] = None  # (first seq, last seq) logged but not applied
+        self.error: Optional[str] = None
+        self.dropped = 0  # queued events discarded when the writer halted
+        self._task: Optional[asyncio.Task] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    def submit(self, event, timestamp: float = None) -> bool:
+        """Queue one event; False when the queue is full or the writer halted (caller should shed load)"""
+        if self.error is not None:
+            return False
+        try:
+            self.queue.put_nowait((time.time() if timestamp is None else timestamp, event))
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def put(self, event, timestamp: float = None) -> None:
+        """Queue one event, waiting for room (backpressure for events forwarded in bulk)"""
+        if self.error is not None:
+            raise FeedbackHalted(self.error)
+        await self.queue.put((time.time() if timestamp is None else timestamp, event))
+
+    def _take(self) -> List[Tuple[float, Any]]:
+        batch = []
+        while len(batch) < self.max_batch and not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        return batch
+
+    async def _commit(self, batch: List[Tuple[float, Any]]) -> None:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self.error is not None:
+                raise FeedbackHalted(self.error)
+            started = time.perf_counter()
+            records = []
+            try:
+                records = await asyncio.to_thread(self.log.append, batch)
+                async with self.exclusive():
+                    applying = asyncio.ensure_future(asyncio.to_thread(self.apply, records))
+                    try:
+                        await asyncio.shield(applying)
+                    except asyncio.CancelledError:
+                        # Keep the exclusive hold until the thread is done with the batch
+                        await asyncio.wait([applying])
+                        raise
+            except Exception as e:
+                if records:
+                    self.failed = (records[0].seq, records[-1].seq)
+                    self.error = f"applying records {self.failed[0]}-{self.failed[1]} failed: {e!r}"
+                else:
+                    self.error = f"logging {len(batch)} events failed: {e!r}"
+                self._halt()
+                raise FeedbackHalted(self.error) from e
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+            self.events += len(batch)
+            self.batches += 1
+            self.commit_seconds += time.perf_counter() - started
+
+    def _halt(self) -> None:
+        """Discard what is still queued, so nothing waits on a writer that stopped"""
+        while not self.queue.empty():
+            self.queue.get_nowait()
+            self.queue.task_done()
+            self.dropped += 1
+
+    async def run(self) -> None:
+        while True:
+            first = await self.queue.get()
+            batch = [first] + self._take()
+            await self._commit(batch)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def flush(self) -> None:
+        """Wait until everything submitted so far is logged and applied"""
+        if self.error is not None:
+            raise FeedbackHalted(self.error)
+        if self._task is None or self._task.done():
+            while not self.queue.empty():
+                await self._commit(self._take())
+        else:
+            await self.queue.join()
+            if self.error is not None:
+                raise FeedbackHalted(self.error)
+
+    async def stop(self) -> None:
+        try:
+            await self.flush()
+        except FeedbackHalted as e:
+            print(f"Feedback writer halted: {e}")
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self.log.close()
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queue.qsize(),
+            "events": self.events,
+            "batches": self.batches,
+            "mean_batch": self.events / self.batches if self.batches else 0.0,
+            "events_per_commit_second": self.events / self.commit_seconds if self.commit_seconds else 0.0,
+            "last_seq": self.log.last_seq,
+            "halted": self.error,
+            "failed_range": list(self.failed) if self.failed else None,
+            "dropped": self.dropped,
+        }
@@ -0,0 +1,268 @@
+"""
+Metrics for the Movie Recommendation Engine
+
+A small, dependency-free Prometheus client sized for the hot path:
+- Histogram: fixed buckets per label set, one bisect + two adds per observation
+- Callback: counters / gauges read from existing stats at scrape time
+  (cache hit counts, queue depth), so nothing is double-counted on the hot path
+- StageTimers: per-stage latency histogram fed by a decorator or `with` block
+- MetricsMiddleware: ASGI middleware timing every request by route template
+
+Sampled traces: when a request is sampled (MOVIE_TRACE_SAMPLE_RATE), every
+stage it runs is also recorded in a per-request trace, returned in a
+Server-Timing header and kept in a ring buffer of recent traces.
+
+Observations are not locked: the server mutates metrics from the event loop
+and executor threads, and a rare lost increment is acceptable for monitoring.
+Only adding a label set takes a lock, so a scrape never iterates a series map
+while another thread grows it.
+"""
+
+from bisect import bisect_left
+from collections import deque
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import math
+import random
+import threading
+import time
+
+# Seconds: 50us .. 10s
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+# ============== Metric Types ==============
+
+class Histogram:
+    """Cumulative-bucket histogram; observe(value, labels) with labels a tuple of label values"""
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> per-bucket counts (last slot is +Inf), then count and sum
+        self._series: Dict[tuple, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, labels: tuple = ()) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            with self._lock:
+                series = self._series.setdefault(labels, [0] * (len(self.buckets) + 1) + [0, 0.0])
+        series[bisect_left(self.buckets, value)] += 1
+        series[-2] += 1
+        series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted(self._series.items())
+        for labels, series in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (math.inf,), series[:-2]):
+                cumulative += n
+                le = 'le="' + _number(float(bound)) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {series[-2]}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(series[-1])}")
+        return lines
+
+class Callback:
+    """
+    Counter or gauge whose values are read at scrape time: `read()` returns a
+    number, or {label values tuple: number} for labelled metrics.
+    """
+
+    def __init__(self, name: str, help: str, read: Callable[[], Any], kind: str = "gauge",
+                 labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.read = read
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+
+    def render(self) -> List[str]:
+        try:
+            values = self.read()
+        except Exception:
+            return []
+        if not isinstance(values, dict):
+            values = {(): values}
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in sorted(values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}")
+        return lines
+
+class Registry:
+    """Named metrics rendered together in the Prometheus text exposition format"""
+
+    def __init__(self):
+        self.metrics: Dict[str, Any] = {}
+
+    def register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def callback(self, name: str, help: str, read: Callable[[], Any], kind: str = "gauge",
+                 labelnames: Sequence[str] = ()) -> Callback:
+        return self.register(Callback(name, help, read, kind, labelnames))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+# ============== Stage Timers & Traces ==============
+
+# Stage list of the sampled request being served in this context (None when not sampled)
+_TRACE: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("movie_trace", default=None)
+
+class _StageTimer:
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram: Histogram, stage: str):
+        self.histogram = histogram
+        self.labels = (stage,)
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.started
+        self.histogram.observe(elapsed, self.labels)
+        trace = _TRACE.get()
+        if trace is not None:
+            trace.append((self.labels[0], elapsed))
+        return False
+
+class _NoopTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NOOP = _NoopTimer()
+
+class StageTimers:
+    """
+    Hot-path stage latency: `@stages.timed("name")` on a function or
+    `with stages.time("name"):` around a block. Disabled timers add nothing
+    (the decorator returns the function itself).
+    """
+
+    def __init__(self, histogram: Histogram, enabled: bool = True):
+        self.histogram = histogram
+        self.enabled = enabled
+
+    def time(self, stage: str):
+        return _StageTimer(self.histogram, stage) if self.enabled else _NOOP
+
+    def timed(self, stage: str):
+        def decorate(fn):
+            if not self.enabled:
+                return fn
+            histogram, labels = self.histogram, (stage,)
+
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    elapsed = time.perf_counter() - started
+                    histogram.observe(elapsed, labels)
+                    trace = _TRACE.get()
+                    if trace is not None:
+                        trace.append((stage, elapsed))
+            return wrapper
+        return decorate
+
+# ============== Request Middleware ==============
+
+class MetricsMiddleware:
+    """
+    ASGI middleware: request latency by method, route template and status
+    (unmatched paths share one label so URLs cannot explode cardinality), and
+    per-request stage traces for a sampled fraction of requests.
+    """
+
+    def __init__(self, app, requests: Histogram, sample_rate: float = 0.0, traces: deque = None):
+        self.app = app
+        self.requests = requests
+        self.sample_rate = sample_rate
+        self.traces = traces if traces is not None else deque(maxlen=256)
+        self._routes: Optional[Dict[Any, str]] = None
+
+    def _route(self, scope) -> str:
+        if self._routes is None:
+            self._routes = {getattr(route, "endpoint", None): route.path for route in scope["app"].routes}
+        return self._routes.get(scope.get("endpoint"), "unmatched")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+        trace = [] if self.sample_rate and random.random() < self.sample_rate else None
+        token = _TRACE.set(trace)
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if trace:
+                    timing = ",".join(f"{stage};dur={elapsed * 1000:.3f}" for stage, elapsed in trace)
+                    message = dict(message, headers=list(message.get("headers", [])) + [
+                        (b"server-timing", timing.encode("latin-1"))
+                    ])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _TRACE.reset(token)
+            elapsed = time.perf_counter() - started
+            route = self._route(scope)
+            self.requests.observe(elapsed, (scope["method"], route, str(status)))
+            if trace is not None:
+                self.traces.append({
+                    "time": time.time(),
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "route": route,
+                    "status": status,
+                    "total_ms": elapsed * 1000,
+                    "stages": [{"stage": stage, "ms": seconds * 1000} for stage, seconds in trace],
+                })
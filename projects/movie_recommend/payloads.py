@@ -0,0 +1,76 @@
+"""
+Pre-encoded JSON payloads for the Movie Recommendation Engine
+
+Hot endpoints return bytes spliced together from cached, already-encoded
+movie objects instead of building pydantic models and running FastAPI's
+response_model validation and serialization on every call. Everything here
+encodes exactly like FastAPI's default JSONResponse does for the declared
+response models (json.dumps with ensure_ascii=False and compact separators,
+floats as repr), so clients see the same bytes.
+
+orjson is used for whole values and strings when it is installed and
+produces identical bytes for a probe of awkward inputs; otherwise the
+standard library encoder is used.
+"""
+
+from functools import lru_cache
+from typing import Any, Iterable, Optional
+import json
+import math
+
+from starlette.responses import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _std_dumps(value: Any) -> bytes:
+    return json.dumps(value, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+_PROBE = {
+    "text": ["plain", "Amélie — “quoted”", "tab\tnew\nline\r\"slash\\\u0001\u001f\u007f ", "\U0001f3ac"],
+    "floats": [0.0, 0.1, 1.0 / 3, 8.8, 95.0, 1e-05, 1e16, 123456789.123],
+    "ints": [0, -1, 2 ** 53, 2023],
+    "other": [None, True, False, [], {}],
+}
+FAST = orjson is not None and orjson.dumps(_PROBE) == _std_dumps(_PROBE)
+
+# ============== Encoders ==============
+
+def encode(value: Any) -> bytes:
+    """JSON bytes for plain Python data, identical to Starlette's JSONResponse.render"""
+    return orjson.dumps(value) if FAST else _std_dumps(value)
+
+@lru_cache(maxsize=8192)
+def encode_string(text: str) -> bytes:
+    """Encoded string (explanations, algorithms and tags repeat, so results are memoized)"""
+    return orjson.dumps(text) if FAST else _std_dumps(text)
+
+def encode_float(value: float) -> bytes:
+    """A float field as pydantic + json.dumps render it (non-finite values become null)"""
+    value = float(value)
+    return float.__repr__(value).encode("ascii") if math.isfinite(value) else b"null"
+
+def encode_optional_int(value: Optional[int]) -> bytes:
+    return b"null" if value is None else str(int(value)).encode("ascii")
+
+def array(items: Iterable[bytes]) -> bytes:
+    return b"[" + b",".join(items) + b"]"
+
+def recommendation(movie: bytes, score: float, explanation: str, algorithm: str, diversity_tag: str) -> bytes:
+    """One MovieRecommendation object around a pre-encoded movie"""
+    return b"".join((
+        b'{"movie":', movie,
+        b',"score":', encode_float(score),
+        b',"explanation":', encode_string(explanation),
+        b',"algorithm":', encode_string(algorithm),
+        b',"diversity_tag":', encode_string(diversity_tag),
+        b"}",
+    ))
+
+# ============== Response ==============
+
+class JSONBytesResponse(Response):
+    """Response whose body is already-encoded JSON (FastAPI skips response_model processing for it)"""
+    media_type = "application/json"
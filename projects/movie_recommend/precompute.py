@@ -0,0 +1,221 @@
+"""
+Offline top-N precompute for the Movie Recommendation Engine
+
+Runs the ensemble ranking for every known user (profile store plus the
+served factor set) across a process pool and writes a memory-mappable
+lookup table:
+- user_ids.npy: int64 (U,), sorted
+- movie_ids.npy: int64 (U, N), -1 padded
+- scores.npy: float64 (U, N), raw ensemble scores
+- algorithms.npy: int8 (U, N), codes into meta.json "algorithms"
+- lengths.npy: int16 (U,)
+- slots.npy: int32 direct-address index user_id - base -> row (-1 if absent),
+  written when user ids are dense enough
+- meta.json: N, feedback sequence number, factor version and catalog
+  fingerprint the table was computed at, build time
+
+The API serves /recommendations from the table and recomputes live only for
+users whose feedback is newer than the snapshot.
+
+Usage:
+    python precompute.py --out data/precomputed --top-n 50 --workers 4
+"""
+
+from typing import Dict, List, Optional, Tuple
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import time
+
+import numpy as np
+
+ALGORITHMS = ["collaborative", "content_based", "popularity", "mood", "matrix_factorization"]
+
+# ============== Lookup Table ==============
+
+class RecommendationTable:
+    """user_id -> best N (movie ids, scores, algorithms), as computed by the ensemble"""
+
+    def __init__(self, user_ids: np.ndarray, movie_ids: np.ndarray, scores: np.ndarray,
+                 algorithms: np.ndarray, lengths: np.ndarray, meta: Dict, slots: np.ndarray = None):
+        self.user_ids = user_ids
+        self.movie_ids = movie_ids
+        self.scores = scores
+        self.algorithms = algorithms
+        self.lengths = lengths
+        self.meta = meta
+        self.slots = slots
+        self.base = int(meta.get("slot_base", 0))
+        self.vocab: List[str] = meta.get("algorithms", ALGORITHMS)
+
+    def __len__(self) -> int:
+        return len(self.user_ids)
+
+    @property
+    def top_n(self) -> int:
+        return int(self.meta["top_n"])
+
+    @property
+    def feedback_seq(self) -> int:
+        return int(self.meta.get("feedback_seq", 0))
+
+    @property
+    def factor_version(self) -> Optional[str]:
+        return self.meta.get("factor_version")
+
+    def row_of(self, user_id: int) -> Optional[int]:
+        if self.slots is not None:
+            slot = user_id - self.base
+            if 0 <= slot < len(self.slots):
+                row = int(self.slots[slot])
+                return row if row >= 0 else None
+            return None
+        pos = int(np.searchsorted(self.user_ids, user_id))
+        return pos if pos < len(self.user_ids) and self.user_ids[pos] == user_id else None
+
+    def lookup(self, user_id: int) -> Optional[List[Tuple[int, float, str]]]:
+        """(movie_id, score, algorithm) best first, or None when the user is not in the table"""
+        row = self.row_of(user_id)
+        if row is None:
+            return None
+        n = int(self.lengths[row])
+        return list(zip(
+            self.movie_ids[row, :n].tolist(),
+            self.scores[row, :n].tolist(),
+            [self.vocab[code] for code in self.algorithms[row, :n].tolist()]
+        ))
+
+    @classmethod
+    def from_rankings(cls, rankings: Dict[int, List[Tuple[int, float, str]]], top_n: int,
+                      meta: Dict) -> "RecommendationTable":
+        user_ids = np.array(sorted(rankings), dtype=np.int64)
+        movie_ids = np.full((len(user_ids), top_n), -1, dtype=np.int64)
+        scores = np.zeros((len(user_ids), top_n), dtype=np.float64)
+        algorithms = np.zeros((len(user_ids), top_n), dtype=np.int8)
+        lengths = np.zeros(len(user_ids), dtype=np.int16)
+        codes = {name: i for i, name in enumerate(ALGORITHMS)}
+        for row, user_id in enumerate(user_ids.tolist()):
+            ranked = rankings[user_id][:top_n]
+            lengths[row] = len(ranked)
+            for col, (movie_id, score, algorithm) in enumerate(ranked):
+                movie_ids[row, col] = movie_id
+                scores[row, col] = score
+                algorithms[row, col] = codes[algorithm]
+
+        meta = dict(meta, top_n=top_n, users=len(user_ids), algorithms=ALGORITHMS)
+        slots = None
+        if len(user_ids):
+            span = int(user_ids[-1] - user_ids[0]) + 1
+            if span <= 4 * len(user_ids) + 1024:
+                slots = np.full(span, -1, dtype=np.int32)
+                slots[user_ids - user_ids[0]] = np.arange(len(user_ids), dtype=np.int32)
+                meta["slot_base"] = int(user_ids[0])
+        return cls(user_ids, movie_ids, scores, algorithms, lengths, meta, slots)
+
+    def save(self, path: str) -> None:
+        """Write through a staging directory renamed into place, so readers never see a partial table"""
+        staging = f"{path.rstrip(os.sep)}.{os.getpid()}.tmp"
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        arrays = {"user_ids": self.user_ids, "movie_ids": self.movie_ids, "scores": self.scores,
+                  "algorithms": self.algorithms, "lengths": self.lengths}
+        if self.slots is not None:
+            arrays["slots"] = self.slots
+        for name, array in arrays.items():
+            np.save(os.path.join(staging, f"{name}.npy"), np.asarray(array))
+        with open(os.path.join(staging, "meta.json"), "w") as f:
+            json.dump(self.meta, f, indent=2)
+
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.rename(staging, path)
+
+    @classmethod
+    def open(cls, path: str, mmap: bool = True) -> "RecommendationTable":
+        mode = "r" if mmap else None
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        arrays = {
+            name: np.asarray(np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode))
+            for name in ("user_ids", "movie_ids", "scores", "algorithms", "lengths")
+        }
+        slots_path = os.path.join(path, "slots.npy")
+        slots = np.asarray(np.load(slots_path, mmap_mode=mode)) if os.path.exists(slots_path) else None
+        return cls(meta=meta, slots=slots, **arrays)
+
+# ============== Precompute Job ==============
+
+_TOP_N = 50
+
+def _init_worker(top_n: int) -> None:
+    global _TOP_N
+    _TOP_N = top_n
+    import backend
+    backend.USER_PROFILES.reconnect()
+
+def score_users(user_ids: List[int]) -> Dict[int, List[Tuple[int, float, str]]]:
+    """Ensemble rankings (no mood / genres / exclusions) for a chunk of users"""
+    import backend
+    engine = backend.RecommendationEngine
+    shared = backend.SharedCandidates([backend.RecommendationQuery(user_id=user_id) for user_id in user_ids])
+    return {
+        user_id: [(movie.id, score, algorithm)
+                  for movie, score, algorithm in engine.ensemble_candidates(user_id=user_id, shared=shared)[:_TOP_N]]
+        for user_id in user_ids
+    }
+
+def precompute(user_ids: List[int], top_n: int = 50, workers: int = None,
+               chunk_size: int = 256) -> Dict[int, List[Tuple[int, float, str]]]:
+    """
+    Rank every user across a process pool. Workers are forked from a process
+    that already imported the backend, so they share its catalog and models
+    copy-on-write instead of rebuilding them.
+    """
+    chunks = [user_ids[i:i + chunk_size] for i in range(0, len(user_ids), chunk_size)]
+    rankings: Dict[int, List[Tuple[int, float, str]]] = {}
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(chunks) <= 1:
+        global _TOP_N
+        _TOP_N = top_n
+        for chunk in chunks:
+            rankings.update(score_users(chunk))
+        return rankings
+    method = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+    with multiprocessing.get_context(method).Pool(workers, initializer=_init_worker, initargs=(top_n,)) as pool:
+        for part in pool.imap_unordered(score_users, chunks):
+            rankings.update(part)
+    return rankings
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute top-N recommendations for every known user")
+    parser.add_argument("--out", default=os.environ.get("MOVIE_PRECOMPUTED_PATH", "data/precomputed"))
+    parser.add_argument("--top-n", type=int, default=50, help="Entries per user (the API's maximum limit)")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=256)
+    args = parser.parse_args()
+
+    # Read the feedback log without taking it over from a running server
+    os.environ.setdefault("MOVIE_FEEDBACK_READONLY", "1")
+    import backend
+
+    started = time.time()
+    backend.FACTOR_MODELS.reload()
+    model = backend.FACTOR_MODELS.model
+    user_ids = set(backend.USER_PROFILES)
+    if model is not None:
+        user_ids.update(model.user_ids.tolist())
+    meta = {
+        "feedback_seq": int(backend.USER_PROFILES.get_meta("feedback_seq", 0)),
+        "factor_version": model.version if model else None,
+        "catalog_rows": len(backend.CATALOG),
+        "catalog_fingerprint": backend.CATALOG.columns.fingerprint,
+        "created": time.time(),
+    }
+    rankings = precompute(sorted(user_ids), args.top_n, args.workers, args.chunk_size)
+    RecommendationTable.from_rankings(rankings, args.top_n, meta).save(args.out)
+    print(f"Precomputed {len(rankings)} users x top {args.top_n} -> {args.out} in {time.time() - started:.1f}s")
+
+if __name__ == "__main__":
+    main()
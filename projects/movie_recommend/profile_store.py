@@ -0,0 +1,366 @@
+"""
+Persistent user profile store for the Movie Recommendation Engine
+
+Profiles live in SQLite (WAL mode, one row per user) and the most recently
+used ones are kept in memory as CompactProfile objects:
+- watched / rated movie ids as sorted int32 arrays (binary-search membership)
+- ratings as a float64 array aligned with the rated ids
+- preferred genres as a fixed-width bitmask over the genre vocabulary, plus
+  their vocabulary positions in the order they were added
+Each profile keeps at most `max_items` distinct movies (oldest dropped first),
+so memory per user is bounded; the LRU bounds the number of users in memory.
+"""
+
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict, deque
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+import os
+import sqlite3
+import threading
+import time
+
+# ============== Compact Profile ==============
+
+class CompactProfile:
+    """One user's history, ratings and genre preferences in flat arrays"""
+
+    __slots__ = ("user_id", "vocab", "max_items", "genre_bits", "genre_order", "recent", "watched", "rated",
+                 "rating_values")
+
+    def __init__(self, user_id: int, vocab: List[str], max_items: int = 5000):
+        self.user_id = user_id
+        self.vocab = vocab
+        self.max_items = max_items
+        self.genre_bits = 0
+        self.genre_order = array("B")    # vocab positions of the set bits, first added first
+        self.recent = array("i")         # every movie touched, oldest first
+        self.watched = array("i")        # sorted
+        self.rated = array("i")          # sorted
+        self.rating_values = array("d")  # aligned with `rated`
+
+    @staticmethod
+    def _find(ids: array, movie_id: int) -> int:
+        """Index of movie_id in a sorted id array, or -1"""
+        i = bisect_left(ids, movie_id)
+        return i if i < len(ids) and ids[i] == movie_id else -1
+
+    def has_watched(self, movie_id: int) -> bool:
+        return self._find(self.watched, movie_id) >= 0
+
+    def rating_of(self, movie_id: int) -> Optional[float]:
+        i = self._find(self.rated, movie_id)
+        return self.rating_values[i] if i >= 0 else None
+
+    def _touch(self, movie_id: int) -> None:
+        """Record a movie in the recency list, evicting the oldest past max_items"""
+        if self.has_watched(movie_id) or self.rating_of(movie_id) is not None:
+            return
+        self.recent.append(movie_id)
+        while len(self.recent) > self.max_items:
+            self._forget(self.recent.pop(0))
+
+    def _forget(self, movie_id: int) -> None:
+        i = self._find(self.watched, movie_id)
+        if i >= 0:
+            del self.watched[i]
+        i = self._find(self.rated, movie_id)
+        if i >= 0:
+            del self.rated[i]
+            del self.rating_values[i]
+
+    def watch(self, movie_id: int) -> None:
+        if not self.has_watched(movie_id):
+            self._touch(movie_id)
+            self.watched.insert(bisect_left(self.watched, movie_id), movie_id)
+
+    def rate(self, movie_id: int, rating: float) -> None:
+        i = self._find(self.rated, movie_id)
+        if i >= 0:
+            self.rating_values[i] = rating
+            return
+        self._touch(movie_id)
+        i = bisect_left(self.rated, movie_id)
+        self.rated.insert(i, movie_id)
+        self.rating_values.insert(i, rating)
+
+    def add_genres(self, genres: Iterable[str]) -> None:
+        """Mark genres as preferred (genres outside the vocabulary are ignored)"""
+        for genre in genres:
+            if genre in self.vocab:
+                i = self.vocab.index(genre)
+                if not self.genre_bits >> i & 1:
+                    self.genre_bits |= 1 << i
+                    self.genre_order.append(i)
+
+    @property
+    def preferred_genres(self) -> List[str]:
+        """Preferred genres in the order they were first added"""
+        return [self.vocab[i] for i in self.genre_order]
+
+    @property
+    def watch_history(self) -> List[int]:
+        """Watched movie ids, oldest first"""
+        return [movie_id for movie_id in self.recent if self.has_watched(movie_id)]
+
+    @property
+    def ratings(self) -> Dict[int, float]:
+        return dict(zip(self.rated, self.rating_values))
+
+    def copy(self) -> "CompactProfile":
+        clone = CompactProfile(self.user_id, self.vocab, self.max_items)
+        clone.genre_bits, clone.genre_order = self.genre_bits, array("B", self.genre_order)
+        clone.recent, clone.watched = array("i", self.recent), array("i", self.watched)
+        clone.rated, clone.rating_values = array("i", self.rated), array("d", self.rating_values)
+        return clone
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Fields of the API's UserProfile model"""
+        return {
+            "user_id": self.user_id,
+            "preferred_genres": self.preferred_genres,
+            "watch_history": self.watch_history,
+            "ratings": self.ratings,
+        }
+
+    def nbytes(self) -> int:
+        arrays = (self.genre_order, self.recent, self.watched, self.rated, self.rating_values)
+        return sum(a.itemsize * len(a) for a in arrays)
+
+# ============== Profile Store ==============
+
+class ProfileStore(MutableMapping):
+    """
+    Dict-like user_id -> CompactProfile mapping backed by SQLite.
+
+    Reads go through an LRU of `cache_size` hot profiles; misses load the row
+    from SQLite and are timed (see `stats`). Assigning a profile writes it
+    through to the database, or once per `batch()` when inside one. A small
+    key/value meta table records bookkeeping such as the last applied feedback
+    sequence number, committed together with the profiles. Safe to share
+    between threads.
+    """
+
+    def __init__(self, path: str = ":memory:", vocab: List[str] = None, cache_size: int = 10_000,
+                 max_items: int = 5000):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.vocab = list(vocab or [])
+        self.cache_size = cache_size
+        self.max_items = max_items
+        self._cache: "OrderedDict[int, CompactProfile]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._load_seconds: deque = deque(maxlen=2048)
+        self.hits = 0
+        self.misses = 0
+        self._pending: Optional[Dict[int, CompactProfile]] = None
+        self._pending_meta: Dict[str, Any] = {}
+
+        self._db = self._connect()
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS profiles ("
+            " user_id INTEGER PRIMARY KEY, genre_bits INTEGER NOT NULL,"
+            " recent BLOB NOT NULL, watched BLOB NOT NULL, rated BLOB NOT NULL, rating_values BLOB NOT NULL,"
+            " genre_order BLOB NOT NULL DEFAULT x'')"
+        )
+        if "genre_order" not in {row[1] for row in db.execute("PRAGMA table_info(profiles)")}:
+            # Stores written before genre order was kept: _decode falls back to vocabulary order
+            db.execute("ALTER TABLE profiles ADD COLUMN genre_order BLOB NOT NULL DEFAULT x''")
+        db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value)")
+        return db
+
+    def reconnect(self) -> None:
+        """Open a fresh database connection (in a forked child; SQLite handles must not cross fork)"""
+        if self.path != ":memory:":
+            self._lock = threading.RLock()
+            self._db = self._connect()
+
+    def create(self, user_id: int) -> CompactProfile:
+        """Empty profile with this store's vocabulary and limits (not saved yet)"""
+        return CompactProfile(user_id, self.vocab, self.max_items)
+
+    def from_fields(self, user_id: int, preferred_genres: List[str], watch_history: List[int],
+                    ratings: Dict[int, float]) -> CompactProfile:
+        profile = self.create(user_id)
+        profile.add_genres(preferred_genres)
+        for movie_id in watch_history:
+            profile.watch(movie_id)
+        for movie_id, rating in ratings.items():
+            profile.rate(movie_id, rating)
+        return profile
+
+    def _decode(self, row: tuple) -> CompactProfile:
+        user_id, genre_bits, recent, watched, rated, rating_values, genre_order = row
+        profile = self.create(user_id)
+        profile.genre_bits = genre_bits
+        profile.genre_order.frombytes(genre_order)
+        if not genre_order:
+            profile.genre_order.extend(i for i in range(len(self.vocab)) if genre_bits >> i & 1)
+        profile.recent.frombytes(recent)
+        profile.watched.frombytes(watched)
+        profile.rated.frombytes(rated)
+        profile.rating_values.frombytes(rating_values)
+        return profile
+
+    @staticmethod
+    def _encode(profile: CompactProfile) -> tuple:
+        return (profile.user_id, profile.genre_bits, profile.recent.tobytes(), profile.watched.tobytes(),
+                profile.rated.tobytes(), profile.rating_values.tobytes(), profile.genre_order.tobytes())
+
+    def _remember(self, profile: CompactProfile) -> None:
+        self._cache[profile.user_id] = profile
+        self._cache.move_to_end(profile.user_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def __getitem__(self, user_id: int) -> CompactProfile:
+        with self._lock:
+            profile = self._cache.get(user_id)
+            if profile is not None:
+                self.hits += 1
+                self._cache.move_to_end(user_id)
+                return profile
+            if self._pending is not None:
+                # Written in this batch but evicted from the LRU since: still the latest copy
+                profile = self._pending.get(user_id)
+                if profile is not None:
+                    self.hits += 1
+                    self._remember(profile)
+                    return profile
+            self.misses += 1
+            started = time.perf_counter()
+            row = self._db.execute(
+                "SELECT user_id, genre_bits, recent, watched, rated, rating_values, genre_order"
+                " FROM profiles WHERE user_id = ?",
+                (user_id,)
+            ).fetchone()
+            if row is None:
+                raise KeyError(user_id)
+            profile = self._decode(row)
+            self._load_seconds.append(time.perf_counter() - started)
+            self._remember(profile)
+            return profile
+
+    def __setitem__(self, user_id: int, profile: CompactProfile) -> None:
+        with self._lock:
+            if self._pending is not None:
+                self._pending[user_id] = profile
+            else:
+                self._db.execute("INSERT OR REPLACE INTO profiles VALUES (?, ?, ?, ?, ?, ?, ?)", self._encode(profile))
+            self._remember(profile)
+
+    def __delitem__(self, user_id: int) -> None:
+        with self._lock:
+            self._cache.pop(user_id, None)
+            if self._db.execute("DELETE FROM profiles WHERE user_id = ?", (user_id,)).rowcount == 0:
+                raise KeyError(user_id)
+
+    def evict(self, user_ids: Iterable[int]) -> None:
+        """Drop cached copies (another process wrote newer ones); the next read loads them again"""
+        with self._lock:
+            for user_id in user_ids:
+                self._cache.pop(user_id, None)
+
+    def __contains__(self, user_id) -> bool:
+        with self._lock:
+            if user_id in self._cache or (self._pending is not None and user_id in self._pending):
+                return True
+            return self._db.execute(
+                "SELECT 1 FROM profiles WHERE user_id = ?", (user_id,)
+            ).fetchone() is not None
+
+    def __iter__(self) -> Iterator[int]:
+        with self._lock:
+            user_ids = [row[0] for row in self._db.execute("SELECT user_id FROM profiles ORDER BY user_id")]
+        return iter(user_ids)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM profiles").fetchone()[0]
+
+    def scan(self) -> Iterator[CompactProfile]:
+        """Every stored profile in user id order, without touching the LRU"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT user_id, genre_bits, recent, watched, rated, rating_values, genre_order"
+                " FROM profiles ORDER BY user_id"
+            ).fetchall()
+        for row in rows:
+            cached = self._cache.get(row[0])
+            yield cached if cached is not None else self._decode(row)
+
+    @contextmanager
+    def batch(self) -> Iterator["ProfileStore"]:
+        """
+        Group writes: profiles and meta values assigned inside the block are
+        written once each, in a single transaction, when it exits cleanly.
+        """
+        with self._lock:
+            self._pending, self._pending_meta = {}, {}
+            try:
+                yield self
+                self._db.execute("BEGIN")
+                try:
+                    self._db.executemany(
+                        "INSERT OR REPLACE INTO profiles VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        [self._encode(profile) for profile in self._pending.values()]
+                    )
+                    self._db.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)", list(self._pending_meta.items()))
+                    self._db.execute("COMMIT")
+                except BaseException:
+                    self._db.execute("ROLLBACK")
+                    raise
+            finally:
+                self._pending, self._pending_meta = None, {}
+
+    def get_meta(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            if key in self._pending_meta:
+                return self._pending_meta[key]
+            row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+            return default if row is None else row[0]
+
+    def set_meta(self, key: str, value: Any) -> None:
+        with self._lock:
+            if self._pending is not None:
+                self._pending_meta[key] = value
+            else:
+                self._db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, value))
+
+    def seed(self, profiles: Iterable[CompactProfile]) -> int:
+        """Insert initial profiles when the store is empty; returns how many were added"""
+        if len(self):
+            return 0
+        with self.batch():
+            for profile in profiles:
+                self[profile.user_id] = profile
+            added = len(self._pending)
+        return added
+
+    def stats(self) -> Dict[str, Any]:
+        loads = sorted(self._load_seconds)
+        pct = lambda q: loads[min(len(loads) - 1, int(q * len(loads)))] * 1000 if loads else 0.0
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "profiles": len(self),
+            "cached": len(self._cache),
+            "cache_size": self.cache_size,
+            "cached_bytes": sum(p.nbytes() for p in list(self._cache.values())),
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "misses": self.misses,
+            "load_ms_p50": pct(0.50),
+            "load_ms_p95": pct(0.95),
+            "load_ms_p99": pct(0.99),
+        }
+
+    def close(self) -> None:
+        self._db.close()
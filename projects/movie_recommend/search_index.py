@@ -0,0 +1,335 @@
+"""
+Full-text search index for the Movie Recommendation Engine
+
+Tokenized inverted index over movie title, cast, director and description,
+ranked with BM25F (per-field length normalisation and boosts). Queries only
+walk the posting lists of their terms, so latency follows posting list length
+instead of catalog size.
+"""
+
+from typing import Dict, Iterable, List, Tuple
+import bisect
+import heapq
+import math
+import re
+import unicodedata
+
+TOKEN_RE = re.compile(r"\w+")
+
+# Field order used for per-field term frequencies and lengths
+FIELDS = ("title", "cast", "director", "description")
+FIELD_BOOSTS = {"title": 3.0, "cast": 2.0, "director": 2.0, "description": 1.0}
+
+def normalize(text: str) -> str:
+    """Lowercase and strip accents so "Zoë" matches "zoe" """
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(normalize(text))
+
+# ============== BM25F Index ==============
+
+class SearchIndex:
+    """
+    Inverted index with BM25F scoring.
+
+    Postings map term -> {doc_id: per-field term frequencies}. Field lengths
+    are kept per document so average lengths stay exact as documents are added
+    or removed. The last query term also matches as a prefix, so partially
+    typed words still find results.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, boosts: Dict[str, float] = None):
+        self.k1 = k1
+        self.b = b
+        boosts = boosts or FIELD_BOOSTS
+        self.boosts = tuple(boosts[field] for field in FIELDS)
+        self.postings: Dict[str, Dict[int, Tuple[int, ...]]] = {}
+        self.doc_lengths: Dict[int, Tuple[int, ...]] = {}
+        self.doc_terms: Dict[int, Tuple[str, ...]] = {}
+        self.total_lengths = [0] * len(FIELDS)
+        self.terms: List[str] = []  # sorted vocabulary for prefix lookups
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    @staticmethod
+    def document_fields(movie) -> Tuple[List[str], ...]:
+        return (
+            tokenize(movie.title),
+            [t for actor in movie.cast for t in tokenize(actor)],
+            tokenize(movie.director),
+            tokenize(movie.description),
+        )
+
+    def add(self, movie) -> None:
+        """Index (or re-index) one movie"""
+        for term in self._index(movie):
+            bisect.insort(self.terms, term)
+
+    def _index(self, movie) -> List[str]:
+        """Add a movie's postings; returns terms that are new to the vocabulary"""
+        if movie.id in self.doc_lengths:
+            self.remove(movie.id)
+        fields = self.document_fields(movie)
+        counts: Dict[str, List[int]] = {}
+        for f, tokens in enumerate(fields):
+            for token in tokens:
+                counts.setdefault(token, [0] * len(FIELDS))[f] += 1
+        new_terms = []
+        for term, tf in counts.items():
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = {}
+                new_terms.append(term)
+            postings[movie.id] = tuple(tf)
+
+        lengths = tuple(len(tokens) for tokens in fields)
+        self.doc_lengths[movie.id] = lengths
+        self.doc_terms[movie.id] = tuple(counts)
+        for f, length in enumerate(lengths):
+            self.total_lengths[f] += length
+        return new_terms
+
+    def remove(self, movie_id: int) -> None:
+        """Drop a movie from every posting list it appears in"""
+        lengths = self.doc_lengths.pop(movie_id, None)
+        if lengths is None:
+            return
+        for f, length in enumerate(lengths):
+            self.total_lengths[f] -= length
+        for term in self.doc_terms.pop(movie_id):
+            postings = self.postings[term]
+            del postings[movie_id]
+            if not postings:
+                del self.postings[term]
+                self.terms.pop(bisect.bisect_left(self.terms, term))
+
+    def expand(self, token: str, limit: int = 50) -> List[str]:
+        """Vocabulary terms starting with `token` (at most `limit`)"""
+        start = bisect.bisect_left(self.terms, token)
+        matches = []
+        for term in self.terms[start:start + limit]:
+            if not term.startswith(token):
+                break
+            matches.append(term)
+        return matches
+
+    def search(self, query: str, limit: int = 20) -> List[Tuple[int, float]]:
+        """Top `limit` (movie_id, score) pairs, best first"""
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens or not self.doc_lengths:
+            return []
+        terms, idfs, avg_lengths = query_weights(tokens, [self.stats(tokens)])
+        return self.score(terms, idfs, avg_lengths, limit)
+
+    def stats(self, tokens: List[str]) -> Dict:
+        """
+        What this index contributes to a query's collection statistics:
+        document count, field length totals, and document frequencies of the
+        tokens and of the last token's prefix completions
+        """
+        return {
+            "docs": len(self.doc_lengths),
+            "lengths": list(self.total_lengths),
+            "df": {t: len(self.postings[t]) for t in tokens if t in self.postings},
+            "expansions": {t: len(self.postings[t]) for t in self.expand(tokens[-1])},
+        }
+
+    def score(self, terms: List[str], idfs: List[float], avg_lengths: List[float],
+              limit: int) -> List[Tuple[int, float]]:
+        """BM25F top `limit` for the given terms and collection statistics (terms absent here are skipped)"""
+        scores: Dict[int, float] = {}
+        for term, idf in zip(terms, idfs):
+            postings = self.postings.get(term)
+            if postings is None:
+                continue
+            for doc_id, tfs in postings.items():
+                lengths = self.doc_lengths[doc_id]
+                weighted_tf = 0.0
+                for f, tf in enumerate(tfs):
+                    if tf:
+                        norm = 1.0 - self.b + self.b * lengths[f] / avg_lengths[f]
+                        weighted_tf += self.boosts[f] * tf / norm
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * weighted_tf / (self.k1 + weighted_tf)
+
+        return heapq.nsmallest(limit, scores.items(), key=lambda item: (-item[1], item[0]))
+
+    @classmethod
+    def build(cls, movies: Iterable, **params) -> "SearchIndex":
+        index = cls(**params)
+        for movie in movies:
+            index.terms.extend(index._index(movie))
+        index.terms.sort()
+        return index
+
+def query_weights(tokens: List[str], stats: List[Dict],
+                  expand_limit: int = 50) -> Tuple[List[str], List[float], List[float]]:
+    """
+    Terms to score, their idf and the average field lengths, from the
+    `stats` of every index holding part of the collection. Summing counts
+    across parts gives exactly the values a single index over all documents
+    would use, so partitioned scores equal unpartitioned ones.
+    """
+    n_docs = sum(part["docs"] for part in stats)
+    df: Dict[str, int] = {}
+    expansions: Dict[str, int] = {}
+    for part in stats:
+        for term, count in part["df"].items():
+            df[term] = df.get(term, 0) + count
+        for term, count in part["expansions"].items():
+            expansions[term] = expansions.get(term, 0) + count
+
+    # Exact terms, plus prefix completions for a partially typed last word
+    terms = [t for t in tokens if t in df]
+    if tokens[-1] not in df:
+        # Each part lists its first `expand_limit` completions, so the overall first ones are among them
+        terms.extend(sorted(expansions)[:expand_limit])
+    frequencies = [df.get(t) or expansions[t] for t in terms]
+    idfs = [math.log(1.0 + (n_docs - count + 0.5) / (count + 0.5)) for count in frequencies]
+    avg_lengths = [max(sum(part["lengths"][f] for part in stats) / max(n_docs, 1), 1e-9) for f in range(len(FIELDS))]
+    return terms, idfs, avg_lengths
+
+# ============== Autocomplete ==============
+
+class SuggestEntry:
+    """One suggestable string (a title or a person) and the movies behind it"""
+
+    __slots__ = ("text", "key", "kind", "movies", "weight")
+
+    def __init__(self, text: str, key: str, kind: str):
+        self.text = text
+        self.key = key
+        self.kind = kind
+        self.movies: Dict[int, float] = {}  # movie_id -> popularity
+        self.weight = 0.0
+
+    def refresh_weight(self) -> None:
+        self.weight = max(self.movies.values(), default=0.0)
+
+
+class _TrieNode:
+    __slots__ = ("children", "top")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.top: List[int] = []  # entry ids, most popular first
+
+
+def trigrams(key: str) -> List[str]:
+    padded = f"  {key} "
+    return list(dict.fromkeys(padded[i:i + 3] for i in range(len(padded) - 2)))
+
+
+class Suggester:
+    """
+    Prefix autocomplete over titles and people names.
+
+    Every word start of every entry is inserted into a character trie, and each
+    node caches its `node_k` most popular entries, so a lookup is a walk of
+    len(prefix) nodes with no scan below it. When the prefix finds too little
+    (typos such as "interstelar"), a character-trigram index supplies fuzzy
+    matches ranked by trigram overlap, then popularity.
+
+    Removing a movie only lowers or zeroes its entries' weights; node caches
+    drop dead entries at read time, so `node_k` should exceed the largest
+    suggestion limit served.
+    """
+
+    def __init__(self, node_k: int = 16, fuzzy_threshold: float = 0.5):
+        self.node_k = node_k
+        self.fuzzy_threshold = fuzzy_threshold
+        self.root = _TrieNode()
+        self.entries: List[SuggestEntry] = []
+        self.entry_ids: Dict[Tuple[str, str], int] = {}
+        self.movie_entries: Dict[int, List[int]] = {}
+        self.trigram_index: Dict[str, List[int]] = {}
+
+    @classmethod
+    def build(cls, movies: Iterable, **params) -> "Suggester":
+        suggester = cls(**params)
+        for movie in movies:
+            suggester.add(movie)
+        return suggester
+
+    def add(self, movie) -> None:
+        """Register a movie's title, director and cast as suggestions"""
+        if movie.id in self.movie_entries:
+            self.remove(movie.id)
+        names = [(movie.title, "title"), (movie.director, "person")]
+        names.extend((actor, "person") for actor in movie.cast)
+
+        touched = []
+        for text, kind in names:
+            key = " ".join(tokenize(text))
+            if not key:
+                continue
+            entry_id = self.entry_ids.get((kind, key))
+            if entry_id is None:
+                entry_id = self.entry_ids[(kind, key)] = len(self.entries)
+                self.entries.append(SuggestEntry(text, key, kind))
+                for gram in trigrams(key):
+                    self.trigram_index.setdefault(gram, []).append(entry_id)
+            entry = self.entries[entry_id]
+            entry.movies[movie.id] = movie.popularity
+            entry.refresh_weight()
+            self._promote(entry_id)
+            touched.append(entry_id)
+        self.movie_entries[movie.id] = touched
+
+    def remove(self, movie_id: int) -> None:
+        for entry_id in self.movie_entries.pop(movie_id, []):
+            entry = self.entries[entry_id]
+            entry.movies.pop(movie_id, None)
+            entry.refresh_weight()
+
+    def _promote(self, entry_id: int) -> None:
+        """Place an entry in the top lists of every node on its word-start paths"""
+        entry = self.entries[entry_id]
+        rank = lambda e: (-self.entries[e].weight, self.entries[e].key)
+        starts = [0] + [i + 1 for i, c in enumerate(entry.key) if c == " "]
+        for start in starts:
+            node = self.root
+            for char in entry.key[start:]:
+                node = node.children.setdefault(char, _TrieNode())
+                if entry_id not in node.top:
+                    if len(node.top) >= self.node_k and rank(entry_id) >= rank(node.top[-1]):
+                        continue
+                    node.top.append(entry_id)
+                node.top.sort(key=rank)
+                del node.top[self.node_k:]
+
+    def _prefix(self, key: str, limit: int) -> List[SuggestEntry]:
+        node = self.root
+        for char in key:
+            node = node.children.get(char)
+            if node is None:
+                return []
+        return [self.entries[e] for e in node.top if self.entries[e].weight > 0][:limit]
+
+    def _fuzzy(self, key: str, limit: int, skip: set) -> List[SuggestEntry]:
+        grams = trigrams(key)
+        shared: Dict[int, int] = {}
+        for gram in grams:
+            for entry_id in self.trigram_index.get(gram, ()):
+                shared[entry_id] = shared.get(entry_id, 0) + 1
+        minimum = self.fuzzy_threshold * len(grams)
+        scored = [
+            (count / len(grams), self.entries[e].weight, e)
+            for e, count in shared.items()
+            if count >= minimum and e not in skip and self.entries[e].weight > 0
+        ]
+        best = heapq.nlargest(limit, scored)
+        return [self.entries[e] for _, _, e in best]
+
+    def suggest(self, query: str, limit: int = 8) -> List[SuggestEntry]:
+        """Most popular prefix matches, topped up with typo-tolerant matches"""
+        key = " ".join(tokenize(query))
+        if not key:
+            return []
+        results = self._prefix(key, limit)
+        if len(results) < limit and len(key) >= 3:
+            skip = {self.entry_ids[(e.kind, e.key)] for e in results}
+            results.extend(self._fuzzy(key, limit - len(results), skip))
+        return results
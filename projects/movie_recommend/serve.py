@@ -0,0 +1,99 @@
+"""
+Multi-worker server for the Movie Recommendation Engine
+
+Starts one owner process and `--workers` uvicorn workers sharing its state
+(see shared.py): the owner replays the feedback log, trains the
+collaborative model, publishes the catalog and neighbour table to the shared
+directory and then runs the only feedback writer; workers memory-map the
+published arrays, so resident memory per extra worker stays small.
+
+Profiles must live in a file (MOVIE_PROFILE_DB) that every process can open.
+
+Usage:
+    python serve.py --workers 4 --port 8001
+    MOVIE_CATALOG_PATH=data/synthetic/catalog MOVIE_PROFILE_DB=data/synthetic/profiles.db python serve.py -w 8
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import queue
+import shutil
+import signal
+import tempfile
+
+def run_owner(shared_dir: str, publish_seconds: float, ready, stop) -> None:
+    """Owner process: the single writer, publishing shared state until `stop` is set"""
+    # Ctrl-C reaches the whole process group; the owner stops after the workers, via `stop`
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    os.environ["MOVIE_ROLE"] = "owner"
+    os.environ["MOVIE_SHARED_DIR"] = shared_dir
+    import backend
+    import shared
+
+    catalog_path = backend.publish_catalog()
+    published = backend.publish_similarity()
+
+    async def own():
+        nonlocal published
+        backend.FEEDBACK_PIPELINE.start()
+        server = await shared.serve_owner(os.path.join(shared_dir, "owner.sock"), backend.FEEDBACK_PIPELINE)
+        ready.put({"MOVIE_CATALOG_PATH": catalog_path})
+        waited = 0.0
+        while not await asyncio.to_thread(stop.wait, 0.25):
+            waited += 0.25
+            if waited >= publish_seconds:
+                waited = 0.0
+                version = f"{backend.USER_PROFILES.get_meta('feedback_seq', 0):020d}"
+                if version != published:
+                    published = backend.publish_similarity()
+        server.close()
+        await backend.FEEDBACK_PIPELINE.stop()
+
+    asyncio.run(own())
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the API on several worker processes with shared state")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--shared-dir", default=None,
+                        help="Directory for shared snapshots and the owner socket (default: a new one on /dev/shm)")
+    parser.add_argument("--publish-seconds", type=float,
+                        default=float(os.environ.get("MOVIE_SHARED_PUBLISH_SECONDS", "10")),
+                        help="How often the owner republishes the neighbour table after feedback")
+    args = parser.parse_args()
+
+    if os.environ.get("MOVIE_PROFILE_DB") == ":memory:":
+        parser.error("MOVIE_PROFILE_DB=:memory: cannot be shared between processes")
+    created = args.shared_dir is None
+    shared_dir = args.shared_dir or tempfile.mkdtemp(prefix="movie-", dir="/dev/shm" if os.path.isdir("/dev/shm") else None)
+    os.makedirs(shared_dir, exist_ok=True)
+
+    context = multiprocessing.get_context("spawn")
+    ready, stop = context.Queue(), context.Event()
+    owner = context.Process(target=run_owner, args=(shared_dir, args.publish_seconds, ready, stop), name="movie-owner")
+    owner.start()
+    try:
+        while True:
+            try:
+                worker_env = ready.get(timeout=1.0)
+                break
+            except queue.Empty:
+                if not owner.is_alive():
+                    raise SystemExit(f"Owner process exited with code {owner.exitcode} during startup")
+
+        os.environ.update(worker_env, MOVIE_ROLE="worker", MOVIE_SHARED_DIR=shared_dir)
+        import uvicorn
+        print(f"Starting Movie Recommendation Engine API on {args.workers} workers (shared state in {shared_dir})...")
+        uvicorn.run("backend:app", host=args.host, port=args.port, workers=args.workers,
+                    app_dir=os.path.dirname(os.path.abspath(__file__)))
+    finally:
+        stop.set()
+        owner.join()
+        if created:
+            shutil.rmtree(shared_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
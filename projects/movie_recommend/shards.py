@@ -0,0 +1,255 @@
+"""
+Sharded candidate generation for the Movie Recommendation Engine
+
+With MOVIE_SHARDS=N the catalog snapshot is split into N contiguous row
+ranges (rows are in id order, so each shard holds an id range), each
+indexed by its own worker process. Content / mood and popularity candidates
+and /search fan out to every shard at once, each shard returns its local
+top-k, and the coordinator merges them with a k-way heap merge. Results
+equal the unsharded engine's exactly:
+- a candidate's score only depends on the movie and the request, and every
+  shard orders ties by row like top_k_grouped, so merging by (score, row)
+  reproduces the single-index order
+- BM25 also needs collection statistics (document count, field lengths,
+  document frequencies): a first round collects each shard's counts, the
+  coordinator sums them (search_index.query_weights), and a second round
+  scores with the totals
+
+Shards are forked from the process that built the catalog and serve one
+catalog snapshot; once the catalog changes, callers go back to the local
+indexes (see backend.catalog_shards). The pool must be started before the
+server starts any threads, since a fork only copies the calling thread and
+locks held by others would stay held in the shard. There is no spawn
+fallback: a spawned shard would re-import backend (reopening its feedback
+log) to unpickle the columns, so without fork the pool raises ShardError.
+
+Shard protocol over a Pipe, one (method, args) message per call:
+    ("content", (genres, limit, excluded local rows))  ->  (True, [(global row, score), ...])
+    ("popularity", (limit, excluded local rows))        ->  (True, [(global row, score), ...])
+    ("search_stats", (tokens,))                         ->  (True, SearchIndex.stats)
+    ("search", (terms, idfs, avg_lengths, limit))       ->  (True, [(movie_id, score), ...])
+    None  ->  exit
+A failed call answers (False, error message).
+"""
+
+from itertools import islice
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import heapq
+import multiprocessing
+import signal
+import threading
+import time
+
+import numpy as np
+
+from bitset import RowBitset
+from search_index import SearchIndex, query_weights, tokenize
+
+class ShardError(RuntimeError):
+    """A shard failed a call or is gone"""
+
+def _best_first(item: tuple) -> tuple:
+    return -item[1], item[0]
+
+def merge_top_k(parts: List[List[tuple]], limit: int) -> List[tuple]:
+    """k-way merge of per-shard (key, score) lists, each best first, into the overall top `limit`"""
+    return list(islice(heapq.merge(*parts, key=_best_first), limit))
+
+# ============== Shard Worker ==============
+
+class CatalogShard:
+    """Rows [start, stop) of a catalog snapshot with their own scoring and search indexes"""
+
+    def __init__(self, columns, start: int, stop: int, content: Callable, popularity: Callable):
+        self.start = start
+        self.columns = type(columns)(columns.table.take(np.arange(start, stop)))
+        self._content = content
+        self._popularity = popularity
+        self._search: Optional[SearchIndex] = None
+
+    def _exclusion(self, rows: np.ndarray) -> Optional[RowBitset]:
+        return RowBitset.from_rows(len(self.columns.ids), rows) if len(rows) else None
+
+    def _global(self, top: List[tuple]) -> List[tuple]:
+        return [(row + self.start, score) for row, score in top]
+
+    def content(self, genres: List[str], limit: int, rows: np.ndarray) -> List[tuple]:
+        return self._global(self._content(self.columns, genres, limit, self._exclusion(rows)))
+
+    def popularity(self, limit: int, rows: np.ndarray) -> List[tuple]:
+        return self._global(self._popularity(self.columns, limit, self._exclusion(rows)))
+
+    @property
+    def search_index(self) -> SearchIndex:
+        if self._search is None:
+            cols = self.columns
+            self._search = SearchIndex.build(cols.movie(row) for row in range(len(cols.ids)))
+        return self._search
+
+    def search_stats(self, tokens: List[str]) -> Dict:
+        return self.search_index.stats(tokens)
+
+    def search(self, terms: List[str], idfs: List[float], avg_lengths: List[float], limit: int) -> List[tuple]:
+        return self.search_index.score(terms, idfs, avg_lengths, limit)
+
+def _serve(conn, columns, start: int, stop: int, content: Callable, popularity: Callable) -> None:
+    # Ctrl-C reaches the whole process group; the coordinator shuts shards down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    shard = CatalogShard(columns, start, stop, content, popularity)
+    shard.search_index
+    conn.send((True, stop - start))
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+        method, args = message
+        try:
+            conn.send((True, getattr(shard, method)(*args)))
+        except Exception as e:
+            conn.send((False, f"{type(e).__name__}: {e}"))
+    conn.close()
+
+# ============== Coordinator ==============
+
+class ShardPool:
+    """
+    Worker processes each serving one row range of `columns`.
+
+    A call goes to every shard before any reply is read, so the shards work
+    in parallel. Each shard has a lock held from send to reply; concurrent
+    callers take the locks in shard order, so they queue per shard without
+    deadlock and one caller's replies are never read by another.
+    """
+
+    def __init__(self, columns, shards: int, content: Callable, popularity: Callable):
+        self.columns = columns
+        size = len(columns.ids)
+        shards = max(1, min(shards, size or 1))
+        self.bounds = np.linspace(0, size, shards + 1).astype(np.int64)
+        self.calls = 0
+        self.call_seconds = 0.0
+        self.broken: Optional[str] = None
+        self._locks = [threading.Lock() for _ in range(shards)]
+        self._conns = []
+        self._processes = []
+
+        if "fork" not in multiprocessing.get_all_start_methods():
+            raise ShardError("catalog shards need the fork start method")
+        context = multiprocessing.get_context("fork")
+        try:
+            for start, stop in zip(self.bounds[:-1], self.bounds[1:]):
+                conn, child = context.Pipe()
+                process = context.Process(
+                    target=_serve, args=(child, columns, int(start), int(stop), content, popularity),
+                    name=f"movie-shard-{start}", daemon=True
+                )
+                process.start()
+                child.close()
+                self._conns.append(conn)
+                self._processes.append(process)
+            # Shards report once their indexes are built
+            for conn in self._conns:
+                self._reply(conn)
+        except BaseException:
+            self.close()
+            raise
+
+    def __len__(self) -> int:
+        return len(self._conns)
+
+    def _reply(self, conn) -> Any:
+        try:
+            ok, result = conn.recv()
+        except (EOFError, OSError) as e:
+            self.broken = f"shard exited: {e!r}"
+            raise ShardError(self.broken) from None
+        if not ok:
+            raise ShardError(result)
+        return result
+
+    def _fan_out(self, messages: List[Tuple[str, tuple]]) -> List[Any]:
+        """Send message i to shard i, then collect every reply"""
+        started = time.perf_counter()
+        sent = 0
+        try:
+            for lock, conn, message in zip(self._locks, self._conns, messages):
+                lock.acquire()
+                sent += 1
+                conn.send(message)
+            replies = []
+            for conn in self._conns:
+                # Every reply is read, even after a failure, so the next caller's replies line up
+                try:
+                    replies.append(self._reply(conn))
+                except ShardError as e:
+                    replies.append(e)
+        except (OSError, ValueError) as e:
+            # Replies may no longer line up with calls; callers stop using the pool
+            self.broken = f"shard unreachable: {e!r}"
+            raise ShardError(self.broken) from None
+        finally:
+            for lock in self._locks[:sent]:
+                lock.release()
+        self.calls += 1
+        self.call_seconds += time.perf_counter() - started
+        for reply in replies:
+            if isinstance(reply, ShardError):
+                raise reply
+        return replies
+
+    def _local_rows(self, exclude: Optional[RowBitset]) -> List[np.ndarray]:
+        """Each shard's slice of the excluded rows, relative to its first row"""
+        rows = exclude.rows() if exclude is not None else np.empty(0, dtype=np.int64)
+        cuts = np.searchsorted(rows, self.bounds)
+        return [rows[lo:hi] - start for lo, hi, start in zip(cuts[:-1], cuts[1:], self.bounds)]
+
+    def content(self, genres: List[str], limit: int, exclude: RowBitset = None) -> List[tuple]:
+        """(row, score) of the best genre matches across shards, as backend.content_top_k"""
+        parts = self._fan_out([("content", (genres, limit, rows)) for rows in self._local_rows(exclude)])
+        return merge_top_k(parts, limit)
+
+    def popularity(self, limit: int, exclude: RowBitset = None) -> List[tuple]:
+        """(row, score) of the most popular movies across shards, as backend.popularity_top_k"""
+        parts = self._fan_out([("popularity", (limit, rows)) for rows in self._local_rows(exclude)])
+        return merge_top_k(parts, limit)
+
+    def search(self, query: str, limit: int = 20) -> List[tuple]:
+        """Top `limit` (movie_id, score) BM25 matches across shards, as SearchIndex.search"""
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+        stats = self._fan_out([("search_stats", (tokens,))] * len(self))
+        if not sum(part["docs"] for part in stats):
+            return []
+        terms, idfs, avg_lengths = query_weights(tokens, stats)
+        if not terms:
+            return []
+        parts = self._fan_out([("search", (terms, idfs, avg_lengths, limit))] * len(self))
+        return merge_top_k(parts, limit)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "shards": len(self),
+            "rows": np.diff(self.bounds).tolist(),
+            "alive": sum(process.is_alive() for process in self._processes),
+            "broken": self.broken,
+            "calls": self.calls,
+            "mean_call_ms": 1000 * self.call_seconds / self.calls if self.calls else 0.0,
+        }
+
+    def close(self) -> None:
+        for conn in self._conns:
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        for conn in self._conns:
+            conn.close()
+        self._conns, self._processes = [], []
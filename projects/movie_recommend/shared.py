@@ -0,0 +1,295 @@
+"""
+Multi-process serving for the Movie Recommendation Engine
+
+`uvicorn --workers N` on its own gives every worker a private copy of the
+catalog indexes and collaborative model and its own feedback writer, so
+memory grows with N and workers' state drifts apart. serve.py instead runs:
+- one owner process, the only writer: it runs the feedback pipeline (log,
+  profile store, collaborative model) and publishes read-mostly arrays as
+  versioned .npy snapshots in a shared directory (on /dev/shm by default)
+- N workers that memory-map those snapshots, so each page exists once no
+  matter how many workers serve it, forward /feedback to the owner over a
+  Unix socket, and follow the feedback log up to the sequence number the
+  owner has committed to the profile store to refresh their per-process
+  state (profile LRU, seen sets, trending, response cache)
+
+Owner protocol, one JSON object per line in each direction:
+    {"events": [[timestamp, user_id, movie_id, feedback_type, rating, watch_time], ...]}  ->  {"accepted": n}
+    {"flush": true}  ->  {"seq": last applied sequence number}
+"""
+
+from types import SimpleNamespace
+from typing import Any, AsyncContextManager, Callable, Dict, List, Optional, Tuple
+import asyncio
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+from feedback_log import FeedbackPipeline, LogRecord, LogTail
+
+CURRENT_FILE = "CURRENT"
+
+# ============== Snapshots ==============
+
+def publish_snapshot(root: str, version: str, arrays: Dict[str, np.ndarray], meta: Dict = None) -> str:
+    """
+    Write arrays as version `version` under `root` and point CURRENT at it.
+
+    Like factor versions (see als.py) the directory is complete before it is
+    renamed into place and CURRENT is swapped atomically, so a worker never
+    maps a partial snapshot.
+    """
+    os.makedirs(root, exist_ok=True)
+    target = os.path.join(root, version)
+    if not os.path.isdir(target):
+        staging = os.path.join(root, f".{version}.{os.getpid()}.tmp")
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        for name, array in arrays.items():
+            np.save(os.path.join(staging, f"{name}.npy"), np.asarray(array))
+        with open(os.path.join(staging, "meta.json"), "w") as f:
+            json.dump({"version": version, "arrays": sorted(arrays), **(meta or {})}, f, indent=2)
+        os.rename(staging, target)
+    pointer = os.path.join(root, f".{CURRENT_FILE}.{os.getpid()}.tmp")
+    with open(pointer, "w") as f:
+        f.write(version)
+    os.replace(pointer, os.path.join(root, CURRENT_FILE))
+    return version
+
+def current_snapshot(root: str) -> Optional[str]:
+    """Version CURRENT points at, or None before the first publish"""
+    try:
+        with open(os.path.join(root, CURRENT_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def open_snapshot(root: str, version: str = None) -> Optional[Dict[str, Any]]:
+    """Memory-map every array of one version (CURRENT by default), plus its "meta" """
+    version = version or current_snapshot(root)
+    if not version:
+        return None
+    path = os.path.join(root, version)
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    arrays = {name: np.asarray(np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")) for name in meta["arrays"]}
+    arrays["meta"] = meta
+    return arrays
+
+def prune_snapshots(root: str, keep: int = 3) -> List[str]:
+    """Delete all but the newest `keep` versions (workers still mapping one keep their pages)"""
+    current = current_snapshot(root)
+    versions = sorted(name for name in os.listdir(root) if not name.startswith(".") and name != CURRENT_FILE)
+    removed = [v for v in versions[:-keep] if v != current] if keep > 0 else []
+    for version in removed:
+        shutil.rmtree(os.path.join(root, version), ignore_errors=True)
+    return removed
+
+# ============== Owner Channel ==============
+
+async def serve_owner(path: str, pipeline: FeedbackPipeline) -> asyncio.AbstractServer:
+    """Accept feedback forwarded by workers on a Unix socket and queue it on the owner's pipeline"""
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                if message.get("flush"):
+                    await pipeline.flush()
+                    reply = {"seq": pipeline.log.last_seq}
+                else:
+                    # Waiting for room here stalls the worker's forwarder, whose own
+                    # queue then fills and sheds load with 503s
+                    for timestamp, user_id, movie_id, feedback_type, rating, watch_time in message["events"]:
+                        await pipeline.put(SimpleNamespace(user_id=user_id, movie_id=movie_id, feedback_type=feedback_type,
+                                                           rating=rating, watch_time=watch_time), timestamp)
+                    reply = {"accepted": len(message["events"])}
+                writer.write(json.dumps(reply).encode() + b"\n")
+                await writer.drain()
+        except (ConnectionError, ValueError, KeyError) as e:
+            print(f"Worker connection dropped: {e}")
+        finally:
+            writer.close()
+
+    if os.path.exists(path):
+        os.remove(path)
+    return await asyncio.start_unix_server(handle, path)
+
+class OwnerClient:
+    """
+    A worker's stand-in for FeedbackPipeline: same `submit` / `flush` /
+    `stats` surface, but batches go to the owner process instead of a local
+    log.
+
+    `submit` is O(1) and never blocks the request; a forwarder task sends
+    everything queued (up to `max_batch`) as one message. Delivery is
+    at-least-once: a batch whose acknowledgement is lost is sent again after
+    reconnecting. `flush` waits until the owner has applied everything
+    submitted so far and the follower has caught up with it, so a worker
+    reads its own writes.
+    """
+
+    def __init__(self, path: str, follower: "FeedbackFollower", max_batch: int = 4096,
+                 max_queue: int = 100_000, retry_seconds: float = 0.5):
+        self.path = path
+        self.follower = follower
+        self.max_batch = max_batch
+        self.retry_seconds = retry_seconds
+        self.queue: asyncio.Queue = asyncio.Queue(max_queue)
+        self.events = 0
+        self.batches = 0
+        self.reconnects = 0
+        self._task: Optional[asyncio.Task] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._stream: Optional[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = None
+
+    def submit(self, event) -> bool:
+        """Queue one event; False when the queue is full (owner slow or unreachable)"""
+        try:
+            self.queue.put_nowait((time.time(), event))
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def _call(self, message: Dict) -> Dict:
+        """Send one message and wait for its reply, reconnecting until the owner answers"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        data = json.dumps(message).encode() + b"\n"
+        async with self._lock:
+            while True:
+                try:
+                    if self._stream is None:
+                        self._stream = await asyncio.open_unix_connection(self.path, limit=1 << 20)
+                    reader, writer = self._stream
+                    writer.write(data)
+                    await writer.drain()
+                    line = await reader.readline()
+                    if not line:
+                        raise ConnectionResetError("owner closed the connection")
+                    return json.loads(line)
+                except (OSError, ValueError) as e:
+                    if self._stream is not None:
+                        self._stream[1].close()
+                        self._stream = None
+                    self.reconnects += 1
+                    print(f"Owner at {self.path} unavailable ({e}), retrying")
+                    await asyncio.sleep(self.retry_seconds)
+
+    async def _forward(self, batch: List[Tuple[float, Any]]) -> None:
+        try:
+            await self._call({"events": [
+                [timestamp, event.user_id, event.movie_id, event.feedback_type, event.rating, event.watch_time]
+                for timestamp, event in batch
+            ]})
+        finally:
+            for _ in batch:
+                self.queue.task_done()
+        self.events += len(batch)
+        self.batches += 1
+
+    async def run(self) -> None:
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < self.max_batch and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            await self._forward(batch)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def flush(self) -> None:
+        """Wait until everything submitted so far is applied by the owner and followed here"""
+        if self._task is None or self._task.done():
+            while not self.queue.empty():
+                batch = [self.queue.get_nowait() for _ in range(min(self.max_batch, self.queue.qsize()))]
+                await self._forward(batch)
+        else:
+            await self.queue.join()
+        reply = await self._call({"flush": True})
+        await self.follower.wait_for(reply["seq"])
+
+    async def stop(self) -> None:
+        await self.flush()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._stream is not None:
+            self._stream[1].close()
+            self._stream = None
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queue.qsize(),
+            "events": self.events,
+            "batches": self.batches,
+            "mean_batch": self.events / self.batches if self.batches else 0.0,
+            "reconnects": self.reconnects,
+            "owner": self.path,
+            "last_seq": self.follower.tail.seq,
+        }
+
+# ============== Log Follower ==============
+
+class FeedbackFollower:
+    """
+    Applies the owner's feedback to this worker's in-memory state.
+
+    Every `interval` seconds it reads the log tail up to `committed()` (the
+    sequence number the owner recorded with the profiles it wrote, so the
+    profile store already reflects every record handed to `apply`).
+    """
+
+    def __init__(self, tail: LogTail, committed: Callable[[], int], apply: Callable[[List[LogRecord]], None],
+                 interval: float = 0.05, max_batch: int = 4096, exclusive: Callable[[], AsyncContextManager] = None):
+        self.tail = tail
+        self.committed = committed
+        self.apply = apply
+        self.exclusive = exclusive
+        self.interval = interval
+        self.max_batch = max_batch
+        self.events = 0
+        self._task: Optional[asyncio.Task] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    def _read(self) -> List[LogRecord]:
+        return self.tail.read(self.committed())
+
+    async def poll(self) -> int:
+        """Apply everything committed since the last poll; returns the number of records"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            records = await asyncio.to_thread(self._read)
+            for start in range(0, len(records), self.max_batch):
+                if self.exclusive is None:
+                    self.apply(records[start:start + self.max_batch])
+                    continue
+                async with self.exclusive():
+                    self.apply(records[start:start + self.max_batch])
+            self.events += len(records)
+            return len(records)
+
+    async def wait_for(self, seq: int) -> None:
+        while self.tail.seq < seq:
+            if not await self.poll():
+                await asyncio.sleep(self.interval / 10)
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.poll()
+            except Exception as e:
+                print(f"Following the feedback log failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run())
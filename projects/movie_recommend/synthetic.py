@@ -0,0 +1,192 @@
+"""
+Synthetic catalogs and interaction logs for the Movie Recommendation Engine
+
+The built-in 36 movies / 4 users hide every scaling problem, so load tests
+and benchmarks run on generated data shaped like a real service:
+- movie popularity is Zipf-distributed (a few titles take most views); the
+  catalog's `popularity` field follows the same ranking
+- user activity is log-normal (most users watch a little, a few a lot)
+- ratings center on each movie's catalog rating, and ~60% of watches are rated
+- preferred genres come from the first movies a user watched
+
+Output directory:
+- catalog/: columnar catalog (see columnar.py)
+- profiles.db: profile store (see profile_store.py)
+- feedback/: optionally, the same interactions as a feedback log (see feedback_log.py)
+
+Usage:
+    python synthetic.py --out data/synthetic --movies 100000 --users 100000 --ratings 5000000
+    MOVIE_CATALOG_PATH=data/synthetic/catalog MOVIE_PROFILE_DB=data/synthetic/profiles.db python backend.py
+"""
+
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List, Tuple
+import argparse
+import itertools
+import os
+import shutil
+import time
+
+import numpy as np
+
+from columnar import MovieTable, synthetic_records
+from feedback_log import FeedbackLog
+from profile_store import ProfileStore
+
+# ============== Distributions ==============
+
+def zipf_weights(n: int, exponent: float = 1.0, seed: int = 0) -> np.ndarray:
+    """Probability of each movie (by row) being picked; popularity rank is a random permutation"""
+    rng = np.random.default_rng(seed)
+    ranks = rng.permutation(n) + 1
+    weights = 1.0 / ranks.astype(np.float64) ** exponent
+    return weights / weights.sum()
+
+def user_activity(n_users: int, n_ratings: int, sigma: float = 1.2, seed: int = 0) -> np.ndarray:
+    """Interactions per user: log-normal, at least one each, summing to about n_ratings"""
+    rng = np.random.default_rng(seed)
+    raw = rng.lognormal(0.0, sigma, n_users)
+    return np.maximum(1, np.round(raw / raw.sum() * n_ratings)).astype(np.int64)
+
+# ============== Generators ==============
+
+def synthetic_catalog(templates: List[Dict[str, Any]], n: int, weights: np.ndarray,
+                      seed: int = 0) -> Iterator[Dict[str, Any]]:
+    """`n` movies from columnar.synthetic_records with popularity (0-100) following `weights`"""
+    log_weights = np.log(weights)
+    lo, hi = log_weights.min(), log_weights.max()
+    popularity = np.round(100.0 * (log_weights - lo) / max(hi - lo, 1e-12), 2)
+    for row, record in enumerate(synthetic_records(templates, n, seed)):
+        record["popularity"] = float(popularity[row])
+        yield record
+
+def synthetic_interactions(
+    movie_ratings: np.ndarray,
+    weights: np.ndarray,
+    n_users: int,
+    n_ratings: int,
+    rated_fraction: float = 0.6,
+    seed: int = 0
+) -> Iterator[Tuple[int, np.ndarray, np.ndarray]]:
+    """
+    Per user (user_id, watched catalog rows in watch order, ratings aligned
+    with them, NaN where the watch was not rated). Users are generated in
+    chunks so memory stays flat up to tens of millions of interactions.
+    """
+    rng = np.random.default_rng(seed + 1)
+    counts = np.minimum(user_activity(n_users, n_ratings, seed=seed), len(movie_ratings))
+    cumulative = np.cumsum(weights)
+    for start in range(0, n_users, 4096):
+        chunk = counts[start:start + 4096]
+        picks = np.searchsorted(cumulative, rng.random(int(chunk.sum())) * cumulative[-1])
+        picks = np.minimum(picks, len(movie_ratings) - 1)
+        noise = rng.normal(0.0, 1.2, len(picks))
+        rated = rng.random(len(picks)) < rated_fraction
+        offset = 0
+        for i, count in enumerate(chunk.tolist()):
+            span = slice(offset, offset + count)
+            offset += count
+            # Drop repeats, keeping first-watch order
+            _, first = np.unique(picks[span], return_index=True)
+            keep = np.sort(first)
+            rows = picks[span][keep]
+            ratings = np.clip(np.round(movie_ratings[rows] + noise[span][keep], 1), 1.0, 10.0)
+            ratings[~rated[span][keep]] = np.nan
+            yield start + i + 1, rows, ratings
+
+# ============== Writers ==============
+
+def write_dataset(out: str, templates: List[Dict[str, Any]], vocab: List[str], n_movies: int, n_users: int,
+                  n_ratings: int, exponent: float = 1.0, seed: int = 0, indexes_for=None,
+                  feedback_log: bool = False) -> Dict[str, Any]:
+    """Generate and write catalog, profile store and (optionally) feedback log; returns counts"""
+    os.makedirs(out, exist_ok=True)
+    weights = zipf_weights(n_movies, exponent, seed)
+    table = MovieTable.from_records(synthetic_catalog(templates, n_movies, weights, seed))
+    table.save(os.path.join(out, "catalog"), indexes_for(table) if indexes_for else None)
+
+    db_path = os.path.join(out, "profiles.db")
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+    store = ProfileStore(db_path, vocab=vocab, cache_size=0)
+    log = None
+    if feedback_log:
+        shutil.rmtree(os.path.join(out, "feedback"), ignore_errors=True)
+        log = FeedbackLog(os.path.join(out, "feedback"), fsync=False)
+
+    genres = table["genres"]
+    movie_ids = table.ids
+    users = synthetic_interactions(np.asarray(table["rating"], dtype=np.float64), weights,
+                                   n_users, n_ratings, seed=seed)
+    now = time.time()
+    interactions = 0
+    while True:
+        chunk = list(itertools.islice(users, 10_000))
+        if not chunk:
+            break
+        events: List[Tuple[float, Any]] = []
+        with store.batch():
+            for user_id, rows, ratings in chunk:
+                rated = ~np.isnan(ratings)
+                watched = movie_ids[rows].tolist()
+                store[user_id] = store.from_fields(
+                    user_id,
+                    [genre for row in rows[:3].tolist() for genre in genres[row]],
+                    watched,
+                    dict(zip(movie_ids[rows[rated]].tolist(), ratings[rated].tolist()))
+                )
+                interactions += len(watched)
+                if log is not None:
+                    # Spread over the last 30 days, in watch order
+                    stamps = np.sort(now - np.random.default_rng(user_id).random(len(watched)) * 30 * 86400)
+                    events.extend(
+                        (stamp, SimpleNamespace(user_id=user_id, movie_id=movie_id, feedback_type="watch",
+                                                rating=None if rating != rating else rating, watch_time=None))
+                        for movie_id, rating, stamp in zip(watched, ratings.tolist(), stamps.tolist())
+                    )
+            if log is not None:
+                log.append(events)
+                # Profiles already include the logged events: replay must not apply them again
+                store.set_meta("feedback_seq", log.last_seq)
+    if log is not None:
+        log.close()
+    store.close()
+    return {"movies": len(table), "users": n_users, "interactions": interactions}
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic catalog and interaction log")
+    parser.add_argument("--out", default="data/synthetic")
+    parser.add_argument("--movies", type=int, default=10_000, help="1K - 1M")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--ratings", type=int, default=500_000, help="Interactions to draw (up to ~10M); repeats per user are dropped")
+    parser.add_argument("--zipf", type=float, default=1.0, help="Popularity skew exponent")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--feedback-log", action="store_true", help="Also write the interactions as a feedback log")
+    parser.add_argument("--no-indexes", action="store_true", help="Do not persist catalog scoring / query indexes")
+    args = parser.parse_args()
+
+    # Templates and genre vocabulary come from the built-in catalog
+    os.environ.pop("MOVIE_CATALOG_PATH", None)
+    os.environ.setdefault("MOVIE_PROFILE_DB", ":memory:")
+    os.environ.setdefault("MOVIE_FEEDBACK_READONLY", "1")
+    import backend
+
+    started = time.time()
+    counts = write_dataset(
+        args.out,
+        templates=[movie.model_dump() for movie in backend.MOVIES_DB],
+        vocab=[genre.value for genre in backend.Genre],
+        n_movies=args.movies,
+        n_users=args.users,
+        n_ratings=args.ratings,
+        exponent=args.zipf,
+        seed=args.seed,
+        indexes_for=None if args.no_indexes else lambda table: backend.CatalogColumns(table).index_arrays(),
+        feedback_log=args.feedback_log
+    )
+    print(f"Wrote {counts['movies']} movies, {counts['users']} users, {counts['interactions']} interactions "
+          f"-> {args.out} in {time.time() - started:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from feedback_log import FRAME, FeedbackLog, LogTail
+
+NOW = 1_700_000_000.0
+
+
+def event(user_id, movie_id, feedback_type="watch", rating=None, watch_time=None):
+    return NOW + user_id, SimpleNamespace(
+        user_id=user_id, movie_id=movie_id, feedback_type=feedback_type, rating=rating, watch_time=watch_time
+    )
+
+
+def newest_segment(log):
+    return log.segments()[-1][1]
+
+
+@pytest.fixture
+def log_dir(tmp_path):
+    return str(tmp_path / "feedback")
+
+
+def test_replay_returns_every_field(log_dir):
+    log = FeedbackLog(log_dir, fsync=False)
+    log.append([event(1, 10, "rating", rating=7.5), event(2, 20, "watch", watch_time=90)])
+    log.close()
+
+    records = list(FeedbackLog(log_dir, readonly=True).replay())
+    assert [(r.seq, r.user_id, r.movie_id, r.feedback_type) for r in records] == [
+        (1, 1, 10, "rating"), (2, 2, 20, "watch")
+    ]
+    assert (records[0].rating, records[0].watch_time) == (7.5, None)
+    assert (records[1].rating, records[1].watch_time) == (None, 90)
+    assert records[0].timestamp == NOW + 1
+
+
+def test_replay_after_seq_across_segments(log_dir):
+    log = FeedbackLog(log_dir, segment_bytes=1, fsync=False)
+    for user_id in range(1, 6):
+        log.append([event(user_id, 100 + user_id)])
+    assert len(log.segments()) == 5
+
+    assert [r.seq for r in log.replay(3)] == [4, 5]
+    assert [r.seq for r in log.replay()] == [1, 2, 3, 4, 5]
+
+
+def test_reopen_continues_the_sequence(log_dir):
+    log = FeedbackLog(log_dir, fsync=False)
+    log.append([event(1, 10), event(2, 20)])
+    log.close()
+
+    log = FeedbackLog(log_dir, fsync=False)
+    assert log.last_seq == 2
+    assert [r.seq for r in log.append([event(3, 30)])] == [3]
+    assert [r.seq for r in log.replay()] == [1, 2, 3]
+
+
+def test_torn_tail_is_truncated_on_reopen(log_dir):
+    log = FeedbackLog(log_dir, fsync=False)
+    log.append([event(1, 10), event(2, 20)])
+    log.close()
+    path = newest_segment(log)
+    intact = os.path.getsize(path)
+    with open(path, "ab") as f:
+        f.write(FRAME.pack(64, 0) + b"half a rec")  # crash mid-write
+
+    assert [r.seq for r in FeedbackLog(log_dir, readonly=True).replay()] == [1, 2]
+    assert os.path.getsize(path) > intact  # read-only never truncates
+
+    log = FeedbackLog(log_dir, fsync=False)
+    assert os.path.getsize(path) == intact
+    assert log.last_seq == 2
+    log.append([event(3, 30)])
+    assert [r.seq for r in log.replay()] == [1, 2, 3]
+
+
+def test_corrupt_record_ends_the_valid_prefix(log_dir):
+    log = FeedbackLog(log_dir, fsync=False)
+    log.append([event(1, 10)])
+    boundary = os.path.getsize(newest_segment(log))
+    log.append([event(2, 20), event(3, 30)])
+    log.close()
+    path = newest_segment(log)
+    with open(path, "r+b") as f:
+        f.seek(boundary + FRAME.size + 4)  # inside record 2's payload
+        byte = f.read(1)
+        f.seek(-1, os.SEEK_CUR)
+        f.write(bytes([byte[0] ^ 0xFF]))
+
+    assert [r.seq for r in FeedbackLog(log_dir, readonly=True).replay()] == [1]
+    log = FeedbackLog(log_dir, fsync=False)
+    assert log.last_seq == 1
+    assert os.path.getsize(path) == boundary
+
+
+def test_readonly_log_refuses_appends(log_dir):
+    FeedbackLog(log_dir, fsync=False).close()
+    with pytest.raises(PermissionError):
+        FeedbackLog(log_dir, readonly=True).append([event(1, 10)])
+
+
+def test_prune_keeps_the_open_segment_and_unapplied_records(log_dir):
+    log = FeedbackLog(log_dir, segment_bytes=1, fsync=False)
+    for user_id in range(1, 5):
+        log.append([event(user_id, 10)])
+
+    removed = log.prune(2)
+    assert len(removed) == 2
+    assert log.first_seq == 3
+    assert [r.seq for r in log.replay()] == [3, 4]
+    log.prune(10)
+    assert [r.seq for r in log.replay()] == [4]
+
+
+def test_tail_reads_increments_and_holds_back_past_upto(log_dir):
+    log = FeedbackLog(log_dir, segment_bytes=1, fsync=False)
+    tail = LogTail(log_dir)
+    assert tail.read() == []
+
+    log.append([event(1, 10), event(2, 20)])
+    log.append([event(3, 30)])
+    assert [r.seq for r in tail.read(upto_seq=2)] == [1, 2]
+    assert [r.seq for r in tail.read()] == [3]
+    log.append([event(4, 40)])
+    assert [r.seq for r in tail.read()] == [4]
+    assert tail.seq == 4
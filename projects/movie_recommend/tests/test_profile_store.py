@@ -0,0 +1,110 @@
+import sqlite3
+
+import pytest
+
+from profile_store import CompactProfile, ProfileStore
+
+VOCAB = ["Action", "Comedy", "Drama", "Sci-Fi", "Thriller"]
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ProfileStore(str(tmp_path / "profiles.db"), VOCAB, cache_size=2)
+    yield store
+    store.close()
+
+
+def make_profile(store, user_id, watched, genres=()):
+    return store.from_fields(user_id, list(genres), watched, {})
+
+
+def apply_watch(store, user_id, movie_id):
+    """What backend.apply_feedback does: read (or create), mutate, assign"""
+    profile = store.get(user_id)
+    profile = profile.copy() if profile is not None else store.create(user_id)
+    profile.watch(movie_id)
+    store[user_id] = profile
+
+
+def test_roundtrip_through_sqlite(store):
+    profile = make_profile(store, 1, [10, 11], ["Drama", "Action"])
+    profile.rate(12, 8.5)
+    store[1] = profile
+    store.evict([1])
+    loaded = store[1]
+    assert loaded.watch_history == [10, 11]
+    assert loaded.ratings == {12: 8.5}
+    assert loaded.preferred_genres == ["Drama", "Action"]
+    assert store.misses == 1
+
+
+def test_preferred_genres_keep_insertion_order(store):
+    profile = make_profile(store, 1, [], ["Thriller", "Action"])
+    profile.add_genres(["Sci-Fi", "Action", "Unknown"])
+    assert profile.preferred_genres == ["Thriller", "Action", "Sci-Fi"]
+    assert profile.copy().preferred_genres == ["Thriller", "Action", "Sci-Fi"]
+
+
+def test_rows_without_genre_order_load_in_vocabulary_order(tmp_path):
+    path = str(tmp_path / "legacy.db")
+    db = sqlite3.connect(path)
+    db.execute(
+        "CREATE TABLE profiles (user_id INTEGER PRIMARY KEY, genre_bits INTEGER NOT NULL,"
+        " recent BLOB NOT NULL, watched BLOB NOT NULL, rated BLOB NOT NULL, rating_values BLOB NOT NULL)"
+    )
+    db.execute("INSERT INTO profiles VALUES (1, ?, x'', x'', x'', x'')", (0b10001,))
+    db.commit()
+    db.close()
+    store = ProfileStore(path, VOCAB)
+    try:
+        assert store[1].preferred_genres == ["Action", "Thriller"]
+        store[2] = make_profile(store, 2, [], ["Thriller", "Action"])
+        store.evict([2])
+        assert store[2].preferred_genres == ["Thriller", "Action"]
+    finally:
+        store.close()
+
+
+def test_batch_with_more_users_than_the_cache(store):
+    store.seed(make_profile(store, user_id, [10 * user_id, 10 * user_id + 1]) for user_id in (1, 2, 3))
+    store.evict([1, 2, 3])
+
+    with store.batch():
+        for user_id, movie_id in ((1, 101), (2, 102), (3, 103), (1, 104)):
+            apply_watch(store, user_id, movie_id)
+
+    store.evict([1, 2, 3])
+    assert store[1].watch_history == [10, 11, 101, 104]
+    assert store[2].watch_history == [20, 21, 102]
+    assert store[3].watch_history == [30, 31, 103]
+
+
+def test_batch_is_written_once_at_exit(store):
+    with store.batch():
+        store[1] = make_profile(store, 1, [5])
+        store.set_meta("feedback_seq", 7)
+        assert store.get_meta("feedback_seq") == 7
+        assert 1 in store
+    assert store.get_meta("feedback_seq") == 7
+    assert len(store) == 1
+
+
+def test_failed_batch_is_rolled_back(store):
+    store[1] = make_profile(store, 1, [5])
+    with pytest.raises(RuntimeError):
+        with store.batch():
+            store[2] = make_profile(store, 2, [6])
+            store.set_meta("feedback_seq", 3)
+            raise RuntimeError("apply failed")
+    assert list(store) == [1]
+    assert store.get_meta("feedback_seq") is None
+
+
+def test_profile_keeps_at_most_max_items():
+    profile = CompactProfile(1, VOCAB, max_items=3)
+    for movie_id in (1, 2, 3, 4):
+        profile.watch(movie_id)
+    profile.rate(2, 9.0)
+    assert profile.watch_history == [2, 3, 4]
+    assert not profile.has_watched(1)
+    assert profile.ratings == {2: 9.0}
@@ -0,0 +1,63 @@
+import importlib
+import random
+
+import pytest
+
+from bitset import RowBitset
+from shards import ShardPool, merge_top_k
+
+
+@pytest.fixture(scope="module")
+def backend(tmp_path_factory):
+    """The service module, importing against throwaway state"""
+    tmp = tmp_path_factory.mktemp("backend")
+    with pytest.MonkeyPatch.context() as env:
+        env.setenv("MOVIE_PROFILE_DB", ":memory:")
+        env.setenv("MOVIE_FEEDBACK_LOG_DIR", str(tmp / "feedback"))
+        env.setenv("MOVIE_PRECOMPUTED_PATH", str(tmp / "precomputed"))
+        env.setenv("MOVIE_MODEL_DIR", str(tmp / "models"))
+        env.delenv("MOVIE_SHARDS", raising=False)
+        yield importlib.import_module("backend")
+
+
+def cases(backend, count=40, seed=0):
+    cols = backend.CATALOG.columns
+    rows = len(cols.ids)
+    rng = random.Random(seed)
+    genres = cols.genres()
+    for i in range(count):
+        exclude_ids = [int(cols.ids[rng.randrange(rows)]) for _ in range(rng.randint(0, 10))]
+        exclude = RowBitset.from_rows(rows, [rng.randrange(rows) for _ in range(rng.randint(1, 20))]) if i % 2 else None
+        yield rng.sample(genres, rng.randint(1, 3)), exclude_ids, exclude, rng.choice([1, 5, 20, 100])
+
+
+def results(backend):
+    engine = backend.RecommendationEngine
+    out = []
+    for genres, exclude_ids, exclude, limit in cases(backend):
+        out.append([(m.id, score) for m, score, _ in engine.content_based_filter(
+            genres, exclude_ids=exclude_ids, limit=limit, exclude=exclude)])
+        out.append([(m.id, score) for m, score, _ in engine.popularity_based(
+            exclude_ids=exclude_ids, limit=limit, exclude=exclude)])
+    for query in ("the", "dark knight", "love", "zzzz"):
+        out.append(backend.search_hits(query, 20))
+    return out
+
+
+def test_merge_top_k_orders_by_score_then_key():
+    parts = [[(0, 0.9), (2, 0.5)], [(1, 0.9), (3, 0.7)], []]
+    assert merge_top_k(parts, 3) == [(0, 0.9), (1, 0.9), (3, 0.7)]
+    assert merge_top_k(parts, 10) == [(0, 0.9), (1, 0.9), (3, 0.7), (2, 0.5)]
+
+
+@pytest.mark.parametrize("shards", [1, 2, 3])
+def test_sharded_candidates_match_the_unsharded_engine(backend, shards):
+    unsharded = results(backend)
+    cols = backend.CATALOG.columns
+    backend.SHARDS = ShardPool(cols, shards, backend.content_top_k, backend.popularity_top_k)
+    try:
+        assert backend.catalog_shards(cols) is backend.SHARDS
+        assert results(backend) == unsharded
+    finally:
+        backend.SHARDS.close()
+        backend.SHARDS = None
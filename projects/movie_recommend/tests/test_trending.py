@@ -0,0 +1,44 @@
+import pytest
+
+from trending import SketchCounter, SlidingWindowCounter, TrendingEngine
+
+NOW = 1_700_000_000.0
+
+
+@pytest.fixture(params=["window", "sketch"])
+def engine(request):
+    if request.param == "window":
+        counter = SlidingWindowCounter(half_life=3600.0)
+    else:
+        counter = SketchCounter(width=1024, capacity=10, half_life=3600.0)
+    return TrendingEngine(counter, k=5)
+
+
+def test_top_serves_the_last_snapshot(engine):
+    engine.record(1, "watch", NOW)
+    engine.record(2, "like", NOW)
+    assert engine.top(5) == []  # nothing ranked until the next refresh
+
+    engine.refresh(NOW)
+    assert [movie_id for movie_id, _ in engine.top(5)] == [2, 1]
+    engine.record(1, "like", NOW)
+    engine.record(1, "like", NOW)
+    assert [movie_id for movie_id, _ in engine.top(5)] == [2, 1]
+
+    engine.refresh(NOW)
+    assert [movie_id for movie_id, _ in engine.top(1)] == [1]
+
+
+def test_read_copy_is_not_affected_by_later_events(engine):
+    engine.record(1, "watch", NOW)
+    frozen = engine.counter.read_copy()
+    engine.record(1, "like", NOW)
+    engine.record(2, "watch", NOW)
+    assert [movie_id for movie_id, _ in frozen.top(5, NOW)] == [1]
+    assert [movie_id for movie_id, _ in engine.counter.top(5, NOW)] == [1, 2]
+
+
+def test_unknown_feedback_is_not_counted(engine):
+    assert not engine.record(1, "dislike", NOW)
+    engine.refresh(NOW)
+    assert engine.top(5) == []
@@ -0,0 +1,217 @@
+"""
+Real-time trending for the Movie Recommendation Engine
+
+Feedback events (watches, likes) are folded into exponentially decayed
+counters. Two counters are available:
+- SlidingWindowCounter: exact per-movie counts in fixed time buckets, for
+  catalogs where the set of recently active movies fits in memory.
+- SketchCounter: count-min sketch plus a bounded heavy-hitters set, for large
+  catalogs where memory must not grow with the number of active titles.
+TrendingEngine materializes a top-K snapshot periodically, so serving
+/trending costs O(K).
+"""
+
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+import copy
+import heapq
+import math
+import threading
+import time
+
+import numpy as np
+
+# ============== Counters ==============
+
+class SlidingWindowCounter:
+    """
+    Per-movie counts in `buckets` time buckets of `bucket_seconds` each.
+
+    Buckets older than the window are dropped as time advances. A bucket's
+    counts are weighted by 0.5 ** (age / half_life) when scores are read.
+    """
+
+    def __init__(self, bucket_seconds: float = 300.0, buckets: int = 288, half_life: float = 6 * 3600.0):
+        self.bucket_seconds = bucket_seconds
+        self.max_buckets = buckets
+        self.half_life = half_life
+        self.buckets: Deque[Tuple[int, Dict[int, float]]] = deque()
+
+    def add(self, movie_id: int, weight: float, timestamp: float) -> None:
+        slot = int(timestamp // self.bucket_seconds)
+        if not self.buckets or self.buckets[-1][0] < slot:
+            self.buckets.append((slot, {}))
+        counts = self.buckets[-1][1] if self.buckets[-1][0] == slot else self._bucket_for(slot)
+        if counts is not None:
+            counts[movie_id] = counts.get(movie_id, 0.0) + weight
+        self._expire(slot)
+
+    def _bucket_for(self, slot: int) -> Optional[Dict[int, float]]:
+        """Bucket for a late (out-of-order) event, if still inside the window"""
+        for bucket_slot, counts in reversed(self.buckets):
+            if bucket_slot == slot:
+                return counts
+            if bucket_slot < slot:
+                break
+        return None
+
+    def _expire(self, current_slot: int) -> None:
+        while self.buckets and self.buckets[0][0] <= current_slot - self.max_buckets:
+            self.buckets.popleft()
+
+    def read_copy(self) -> "SlidingWindowCounter":
+        """Copy of the counts that `top` can scan while `add` keeps writing to this one"""
+        clone = copy.copy(self)
+        clone.buckets = deque((slot, dict(counts)) for slot, counts in self.buckets)
+        return clone
+
+    def top(self, k: int, now: float) -> List[Tuple[int, float]]:
+        self._expire(int(now // self.bucket_seconds))
+        scores: Dict[int, float] = {}
+        for slot, counts in self.buckets:
+            age = max(0.0, now - (slot + 1) * self.bucket_seconds)
+            decay = 0.5 ** (age / self.half_life)
+            for movie_id, count in counts.items():
+                scores[movie_id] = scores.get(movie_id, 0.0) + count * decay
+        return heapq.nsmallest(k, scores.items(), key=lambda item: (-item[1], item[0]))
+
+
+class SketchCounter:
+    """
+    Count-min sketch with forward exponential decay plus heavy hitters.
+
+    An event at time t adds weight * exp((t - landmark) / tau), so stored
+    values never need decaying and rank the same at any read time; reads scale
+    them back by exp(-(now - landmark) / tau). The landmark moves forward
+    before values overflow. Candidates for the top list are the `capacity`
+    movies with the largest estimates, kept in a min-heap.
+    """
+
+    def __init__(self, width: int = 1 << 16, depth: int = 4, capacity: int = 1000,
+                 half_life: float = 6 * 3600.0, seed: int = 7):
+        self.width = width
+        self.depth = depth
+        self.capacity = capacity
+        self.tau = half_life / math.log(2)
+        self.table = np.zeros((depth, width), dtype=np.float64)
+        rng = np.random.default_rng(seed)
+        self._hash_a = rng.integers(1, (1 << 31) - 1, depth, dtype=np.int64)
+        self._hash_b = rng.integers(0, (1 << 31) - 1, depth, dtype=np.int64)
+        self.landmark: Optional[float] = None
+        self.heavy: Dict[int, float] = {}
+        self._heap: List[Tuple[float, int]] = []
+
+    def _columns(self, movie_id: int) -> np.ndarray:
+        return ((self._hash_a * movie_id + self._hash_b) % ((1 << 31) - 1)) % self.width
+
+    def estimate(self, movie_id: int) -> float:
+        return float(self.table[np.arange(self.depth), self._columns(movie_id)].min())
+
+    def add(self, movie_id: int, weight: float, timestamp: float) -> None:
+        if self.landmark is None:
+            self.landmark = timestamp
+        exponent = (timestamp - self.landmark) / self.tau
+        if exponent > 500:
+            self._rescale(timestamp)
+            exponent = 0.0
+        rows = np.arange(self.depth)
+        cols = self._columns(movie_id)
+        self.table[rows, cols] += weight * math.exp(exponent)
+        self._offer(movie_id, float(self.table[rows, cols].min()))
+
+    def _offer(self, movie_id: int, estimate: float) -> None:
+        if movie_id in self.heavy or len(self.heavy) < self.capacity:
+            self.heavy[movie_id] = estimate
+            heapq.heappush(self._heap, (estimate, movie_id))
+        elif estimate > self._min_heavy():
+            _, evicted = heapq.heappop(self._heap)
+            del self.heavy[evicted]
+            self.heavy[movie_id] = estimate
+            heapq.heappush(self._heap, (estimate, movie_id))
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(score, m) for m, score in self.heavy.items()]
+            heapq.heapify(self._heap)
+
+    def _min_heavy(self) -> float:
+        """Smallest current heavy-hitter estimate (drops stale heap entries)"""
+        while self._heap:
+            score, movie_id = self._heap[0]
+            if self.heavy.get(movie_id) == score:
+                return score
+            heapq.heappop(self._heap)
+        return 0.0
+
+    def _rescale(self, timestamp: float) -> None:
+        factor = math.exp(-(timestamp - self.landmark) / self.tau)
+        self.table *= factor
+        self.heavy = {m: score * factor for m, score in self.heavy.items()}
+        self._heap = [(score, m) for m, score in self.heavy.items()]
+        heapq.heapify(self._heap)
+        self.landmark = timestamp
+
+    def read_copy(self) -> "SketchCounter":
+        """Copy of the heavy hitters that `top` can scan while `add` keeps writing to this one"""
+        clone = copy.copy(self)  # `top` only reads `heavy` and the landmark, so the sketch is shared
+        clone.heavy = dict(self.heavy)
+        return clone
+
+    def top(self, k: int, now: float) -> List[Tuple[int, float]]:
+        if self.landmark is None:
+            return []
+        scale = math.exp(-(now - self.landmark) / self.tau)
+        best = heapq.nsmallest(k, self.heavy.items(), key=lambda item: (-item[1], item[0]))
+        return [(movie_id, score * scale) for movie_id, score in best]
+
+# ============== Trending Engine ==============
+
+EVENT_WEIGHTS = {"watch": 1.0, "like": 2.0}
+
+class TrendingEngine:
+    """
+    Streams feedback into a decayed counter and serves a materialized top-K.
+
+    `refresh` rebuilds the snapshot and is called every `snapshot_interval`
+    from a background thread; `top` only slices the current snapshot. The lock
+    guards the counter: `refresh` holds it just long enough to copy what it
+    ranks, so `record` is never blocked by a scan.
+    """
+
+    def __init__(self, counter, k: int = 100, snapshot_interval: float = 10.0):
+        self.counter = counter
+        self.k = k
+        self.snapshot_interval = snapshot_interval
+        self.events = 0
+        self._snapshot: List[Tuple[int, float]] = []
+        self._lock = threading.Lock()
+
+    def record(self, movie_id: int, feedback_type: str, timestamp: float = None) -> bool:
+        weight = EVENT_WEIGHTS.get(feedback_type)
+        if weight is None:
+            return False
+        with self._lock:
+            self.counter.add(movie_id, weight, time.time() if timestamp is None else timestamp)
+            self.events += 1
+        return True
+
+    def refresh(self, now: float = None) -> List[Tuple[int, float]]:
+        now = time.time() if now is None else now
+        with self._lock:
+            counter = self.counter.read_copy()
+        snapshot = counter.top(self.k, now)
+        with self._lock:
+            self._snapshot = snapshot
+        return snapshot
+
+    def top(self, limit: int) -> List[Tuple[int, float]]:
+        return self._snapshot[:limit]
+
+
+def create_trending(mode: str = "window", half_life: float = 6 * 3600.0, k: int = 100,
+                    snapshot_interval: float = 10.0) -> TrendingEngine:
+    if mode == "sketch":
+        counter = SketchCounter(half_life=half_life, capacity=max(10 * k, 1000))
+    elif mode == "window":
+        counter = SlidingWindowCounter(half_life=half_life)
+    else:
+        raise ValueError(f"Unknown trending mode: {mode}")
+    return TrendingEngine(counter, k, snapshot_interval)